@@ -0,0 +1,77 @@
+"""JWT authentication that serves users from the cache.
+
+``JWTAuthentication`` loads the user row on every request. Here the user is
+cached per id together with a per-user version that is bumped whenever the
+row is saved or deleted (see ``accounts.signals``), so a deactivated user
+or changed password takes effect on the next request. Both are read with a
+single cache round trip. Updates that bypass ``save()`` (``QuerySet.update``)
+are only picked up once the entry expires after
+``ACCOUNTS_USER_CACHE_TIMEOUT`` seconds.
+
+Only the fields authentication and permission checks need are cached, never
+the password hash. The user is rebuilt with the other fields deferred, so
+reading one of them loads it from the database.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+CACHED_USER_FIELDS = ("id", "email", "is_active", "is_staff", "is_superuser")
+
+
+def _user_key(user_id):
+    return f"accounts:user-fields:{user_id}"
+
+
+def _version_key(user_id):
+    return f"accounts:user-version:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Make the next request by this user reload it from the database."""
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Seed with a timestamp so a lost counter cannot revive old entries.
+        cache.add(key, time.time_ns(), timeout=None)
+        cache.incr(key)
+
+
+def _from_cache(values):
+    """Rebuild a user from its cached fields, deferring all the others."""
+    model = get_user_model()
+    names = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            return super().get_user(validated_token)
+
+        user_key, version_key = _user_key(user_id), _version_key(user_id)
+        cached = cache.get_many([user_key, version_key])
+        version = cached.get(version_key)
+        if version is None:
+            cache.add(version_key, time.time_ns(), timeout=None)
+            version = cache.get(version_key)
+        elif user_key in cached and cached[user_key][0] == version:
+            return _from_cache(cached[user_key][1])
+
+        user = super().get_user(validated_token)
+        values = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+        cache.set(user_key, (version, values), settings.ACCOUNTS_USER_CACHE_TIMEOUT)
+        return user
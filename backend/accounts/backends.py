@@ -0,0 +1,135 @@
+"""Model permissions served from the cache.
+
+``ModelBackend`` runs two queries per request and user: the user's own
+permissions and those of their groups. Users share a handful of groups, so
+here each group's permission set is cached under a global permissions
+version, in process memory and in the shared cache. The user's group ids and
+own permissions are cached per user under the same version plus the user's
+cache version from ``accounts.authentication``. ``accounts.signals`` bumps
+the versions when groups, permissions or memberships change, so with a warm
+cache a permission check costs one cache round trip and no query.
+
+Membership rows written directly through the ``through`` models (e.g. with
+``bulk_create``) send no signal; they show up once the user's entry expires
+after ``ACCOUNTS_USER_CACHE_TIMEOUT`` seconds.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+
+from accounts.authentication import _version_key
+
+PERMISSIONS_VERSION_KEY = "accounts:permissions-version"
+
+# (version, {group id: permission names}) of this process.
+_groups = (None, {})
+
+
+def _user_permissions_key(user_id):
+    return f"accounts:user-permissions:{user_id}"
+
+
+def _group_permissions_key(version, group_id):
+    return f"accounts:group-permissions:{version}:{group_id}"
+
+
+def invalidate_permissions():
+    """Drop every cached permission set, e.g. after a group's changed."""
+    try:
+        cache.incr(PERMISSIONS_VERSION_KEY)
+    except ValueError:
+        cache.add(PERMISSIONS_VERSION_KEY, time.time_ns(), timeout=None)
+        cache.incr(PERMISSIONS_VERSION_KEY)
+
+
+def _names(rows):
+    return frozenset(f"{app_label}.{codename}" for app_label, codename in rows)
+
+
+def load_group_permissions(group_ids, version):
+    """Permission names of ``group_ids``, loading missing groups in one query."""
+    global _groups
+    if _groups[0] != version:
+        _groups = (version, {})
+    local = _groups[1]
+
+    missing = [group_id for group_id in group_ids if group_id not in local]
+    if missing:
+        keys = {_group_permissions_key(version, pk): pk for pk in missing}
+        for key, names in cache.get_many(keys).items():
+            local[keys[key]] = names
+        missing = [group_id for group_id in missing if group_id not in local]
+    if missing:
+        loaded = {group_id: set() for group_id in missing}
+        rows = Permission.objects.filter(group__in=missing).values_list(
+            "group", "content_type__app_label", "codename"
+        )
+        for group_id, app_label, codename in rows:
+            loaded[group_id].add(f"{app_label}.{codename}")
+        loaded = {group_id: frozenset(names) for group_id, names in loaded.items()}
+        cache.set_many(
+            {
+                _group_permissions_key(version, pk): names
+                for pk, names in loaded.items()
+            },
+            settings.ACCOUNTS_PERMISSION_CACHE_TIMEOUT,
+        )
+        local.update(loaded)
+
+    return frozenset().union(*(local[group_id] for group_id in group_ids))
+
+
+def get_permissions(user):
+    """Return the user's own and their groups' permission names."""
+    user_key = _user_permissions_key(user.pk)
+    version_keys = [_version_key(user.pk), PERMISSIONS_VERSION_KEY]
+    cached = cache.get_many([user_key, *version_keys])
+    for key in version_keys:
+        if key not in cached:
+            cache.add(key, time.time_ns(), timeout=None)
+            cached[key] = cache.get(key)
+    versions = tuple(cached[key] for key in version_keys)
+
+    entry = cached.get(user_key)
+    if entry is not None and entry[0] == versions:
+        _, group_ids, user_permissions = entry
+    else:
+        group_ids = list(user.groups.values_list("pk", flat=True))
+        user_permissions = _names(
+            Permission.objects.filter(user=user).values_list(
+                "content_type__app_label", "codename"
+            )
+        )
+        cache.set(
+            user_key,
+            (versions, group_ids, user_permissions),
+            settings.ACCOUNTS_USER_CACHE_TIMEOUT,
+        )
+    return user_permissions, load_group_permissions(group_ids, versions[1])
+
+
+class CachedPermissionBackend(ModelBackend):
+    """``ModelBackend`` that resolves permissions through the cache."""
+
+    def _get_cached_permissions(self, user_obj):
+        if not hasattr(user_obj, "_cached_permissions"):
+            user_obj._cached_permissions = get_permissions(user_obj)
+        return user_obj._cached_permissions
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if user_obj.is_superuser:
+            return super().get_user_permissions(user_obj, obj)
+        return set(self._get_cached_permissions(user_obj)[0])
+
+    def get_group_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if user_obj.is_superuser:
+            return super().get_group_permissions(user_obj, obj)
+        return set(self._get_cached_permissions(user_obj)[1])
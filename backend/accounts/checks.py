@@ -0,0 +1,40 @@
+"""System checks for the user and permission caches."""
+
+from decouple import config
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries are only seen by the process that wrote them.
+LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Cached users and permissions are invalidated through the cache, so
+    every worker process has to share it.
+
+    ``gunicorn.conf.py`` runs the checks with the real worker count. Outside
+    DEBUG the caches are assumed to serve several processes while they are on.
+    """
+    if settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS:
+        return []
+    workers = config("gunicorn_workers", default=1, cast=int)
+    cached = (
+        settings.ACCOUNTS_USER_CACHE_TIMEOUT > 0
+        or settings.ACCOUNTS_PERMISSION_CACHE_TIMEOUT > 0
+    )
+    if workers > 1 or (cached and not settings.DEBUG):
+        return [
+            Error(
+                "Cached users and permissions need a cache shared by all "
+                "worker processes.",
+                hint="Set cache_backend to a shared backend such as Redis, or "
+                "set user_cache_timeout and permission_cache_timeout to 0 and "
+                "run a single worker.",
+                id="accounts.E001",
+            )
+        ]
+    return []
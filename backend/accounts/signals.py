@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import Group
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
+from accounts.authentication import invalidate_user
+from accounts.backends import invalidate_permissions
+
 User = get_user_model()
 
 
@@ -14,3 +18,52 @@ def assign_member_group(sender, instance, created, **kwargs):
     member_group = Group.objects.filter(name="Member").first()
     if member_group:
         instance.groups.add(member_group)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Covers deactivation and password changes, which both save the user.
+    # Bump again on commit: a request in between may have cached the old row
+    # under the new version.
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+def forget_users(user_ids):
+    user_ids = list(user_ids)
+
+    def invalidate():
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def forget_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    # A user's groups and own permissions are cached with the user's version.
+    if not reverse:
+        if action.startswith("post_"):
+            forget_users([instance.pk])
+    elif action == "pre_clear":
+        # Clearing from the group or permission side passes no user ids.
+        forget_users(instance.user_set.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        forget_users(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_group_permissions(sender, action, **kwargs):
+    if action.startswith("post_"):
+        forget_permissions(sender)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def forget_permissions(sender, **kwargs):
+    invalidate_permissions()
+    transaction.on_commit(invalidate_permissions)
@@ -1,3 +1,118 @@
-from django.test import TestCase
+import os
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import CachedJWTAuthentication
+from accounts.checks import check_shared_cache
+from accounts.models import User
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    client_class = APIClient
+    url = "/api/v1/auth/users/me/"
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="member@example.com", password="secret-pass-1", first_name="Ada"
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"JWT {AccessToken.for_user(self.user)}"
+        )
+
+    def test_user_served_from_cache_until_saved(self):
+        token = AccessToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            CachedJWTAuthentication().get_user(token)
+        with self.assertNumQueries(0):
+            user = CachedJWTAuthentication().get_user(token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_active)
+        # The password hash never goes into the cache.
+        self.assertIn("password", user.get_deferred_fields())
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()["first_name"], "Ada")
+
+        self.user.first_name = "Grace"
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).json()["first_name"], "Grace")
+
+    def test_deactivation_applies_immediately(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.user.set_password("another-pass-2")
+        self.user.save(update_fields=["password"])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class CachedPermissionBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name="Librarian")
+        self.group.permissions.add(self.permission("add_book"))
+        self.user = User.objects.create_user(email="librarian@example.com")
+        self.user.groups.add(self.group)
+
+    @staticmethod
+    def permission(codename):
+        return Permission.objects.get(codename=codename)
+
+    def has_perm(self, perm):
+        # A fresh instance, as every request gets.
+        return User.objects.get(pk=self.user.pk).has_perm(perm)
+
+    def test_permissions_served_from_cache(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(3):
+            self.assertTrue(user.has_perm("library.add_book"))
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("library.add_book"))
+            self.assertFalse(user.has_perm("library.delete_book"))
+
+    def test_group_and_membership_changes_apply_immediately(self):
+        self.assertFalse(self.has_perm("library.delete_book"))
+        self.group.permissions.add(self.permission("delete_book"))
+        self.assertTrue(self.has_perm("library.delete_book"))
+
+        self.user.user_permissions.add(self.permission("change_author"))
+        self.assertTrue(self.has_perm("library.change_author"))
+
+        self.group.user_set.clear()
+        self.assertFalse(self.has_perm("library.add_book"))
+        self.user.groups.add(self.group)
+        self.assertTrue(self.has_perm("library.add_book"))
+
+        self.group.delete()
+        self.assertFalse(self.has_perm("library.add_book"))
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    shared = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+
+    @override_settings(DEBUG=True)
+    def test_local_cache_needs_one_worker(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with mock.patch.dict(os.environ, {"gunicorn_workers": "3"}):
+            self.assertEqual(check_shared_cache(None)[0].id, "accounts.E001")
+            with override_settings(CACHES=self.shared):
+                self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(DEBUG=False)
+    def test_local_cache_rejected_outside_debug_while_caching(self):
+        self.assertEqual(check_shared_cache(None)[0].id, "accounts.E001")
+        with override_settings(
+            ACCOUNTS_USER_CACHE_TIMEOUT=0, ACCOUNTS_PERMISSION_CACHE_TIMEOUT=0
+        ):
+            self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,336 @@
+"""Per-endpoint request metrics in the Prometheus text format.
+
+:class:`MetricsMiddleware` records request latency, response size, database
+queries and database time, and serializer time. Each metric is labelled with
+the URL name, method and status code. Samples are kept in memory per process.
+When ``METRICS_DIR`` is set, every process also writes its samples to
+``<pid>.json`` in that directory at most every ``METRICS_FLUSH_SECONDS``, and
+:func:`render` adds up the files of all workers.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from library.cache import cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+LABELS = ("view", "method", "status")
+
+
+@dataclass(frozen=True)
+class Metric:
+    help: str
+    buckets: tuple
+
+
+METRICS = {
+    "http_request_duration_seconds": Metric(
+        "Time spent handling the request.", LATENCY_BUCKETS
+    ),
+    "http_response_size_bytes": Metric(
+        "Size of the response body; streamed responses are skipped.", SIZE_BUCKETS
+    ),
+    "http_request_db_queries": Metric(
+        "Database queries run while handling the request.", QUERY_BUCKETS
+    ),
+    "http_request_db_duration_seconds": Metric(
+        "Time spent waiting on database queries.", LATENCY_BUCKETS
+    ),
+    "http_serializer_duration_seconds": Metric(
+        "Time spent turning objects into response data.", LATENCY_BUCKETS
+    ),
+}
+
+
+@dataclass
+class RequestMetrics:
+    """Database and serializer work of one request.
+
+    Besides the totals it keeps what :mod:`api.querymonitor` inspects: how
+    often each SQL template ran and the statements slower than
+    ``QUERY_MONITOR_SLOW_QUERY_SECONDS``.
+    """
+
+    queries: int = 0
+    db_seconds: float = 0.0
+    serializer_seconds: float = 0.0
+    serialized: bool = False
+    shapes: Counter = field(default_factory=Counter)
+    slow: list = field(default_factory=list)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += duration
+            self.shapes[sql] += 1
+            if duration >= settings.QUERY_MONITOR_SLOW_QUERY_SECONDS and not many:
+                alias = context["connection"].alias
+                self.slow.append((duration, sql, params, alias))
+
+
+_current = ContextVar("request_metrics", default=None)
+
+
+def current_metrics():
+    """Return the :class:`RequestMetrics` of the request being handled."""
+    return _current.get()
+
+
+class Registry:
+    """Histogram samples of one process.
+
+    A series is a list of per-bucket counts, the ``+Inf`` overflow count and
+    the sum of observed values, so merging series is element-wise addition.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pid = os.getpid()
+        self.samples = {}
+        self.flushed_at = 0.0
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name].buckets
+        with self.lock:
+            self.check_fork()
+            series = self.samples.setdefault(name, {}).get(labels)
+            if series is None:
+                series = self.samples[name][labels] = [0] * (len(buckets) + 2)
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def check_fork(self):
+        # A forked worker must not report what its parent recorded.
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.samples = {}
+            self.flushed_at = 0.0
+
+    def snapshot(self):
+        with self.lock:
+            self.check_fork()
+            return {
+                name: {labels: list(series) for labels, series in values.items()}
+                for name, values in self.samples.items()
+            }
+
+    def path(self):
+        return Path(settings.METRICS_DIR) / f"{self.pid}.json"
+
+    def flush(self, force=False):
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < settings.METRICS_FLUSH_SECONDS:
+            return
+        if not self.flush_lock.acquire(blocking=False):
+            return  # Another thread is writing the file right now.
+        try:
+            self.flushed_at = now
+            self.write()
+        finally:
+            self.flush_lock.release()
+
+    def write(self):
+        data = {
+            name: [[list(labels), series] for labels, series in values.items()]
+            for name, values in self.snapshot().items()
+        }
+        path = self.path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(data))
+        temporary.replace(path)
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True))
+
+
+def merge(target, samples):
+    for name, values in samples.items():
+        merged = target.setdefault(name, {})
+        for labels, series in values.items():
+            current = merged.get(labels)
+            if current is None:
+                merged[labels] = list(series)
+            else:
+                merged[labels] = [a + b for a, b in zip(current, series)]
+
+
+def collect():
+    """Samples of this process plus the files written by the other workers."""
+    samples, own_samples = {}, registry.snapshot()
+    if settings.METRICS_DIR:
+        own = registry.path()
+        for path in Path(settings.METRICS_DIR).glob("*.json"):
+            if path == own:
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            merge(
+                samples,
+                {
+                    name: {tuple(labels): series for labels, series in values}
+                    for name, values in data.items()
+                    if name in METRICS
+                },
+            )
+    merge(samples, own_samples)
+    return samples
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs)
+
+
+def render():
+    lines = []
+    samples = collect()
+    for name, metric in METRICS.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, series in sorted(samples.get(name, {}).items()):
+            pairs = list(zip(LABELS, labels))
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, "+Inf"), series):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{{{_labels([*pairs, ('le', bound)])}}} {cumulative}"
+                )
+            lines.append(f"{name}_sum{{{_labels(pairs)}}} {series[-1]}")
+            lines.append(f"{name}_count{{{_labels(pairs)}}} {cumulative}")
+
+    name = "library_cache_requests_total"
+    lines.append(f"# HELP {name} Response cache lookups, shared by all workers.")
+    lines.append(f"# TYPE {name} counter")
+    for namespace in settings.METRICS_CACHE_NAMESPACES:
+        stats = cache_stats(namespace)
+        for outcome, key in (("hit", "hits"), ("miss", "misses")):
+            pairs = [("namespace", namespace), ("outcome", outcome)]
+            lines.append(f"{name}{{{_labels(pairs)}}} {stats[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def timed_serializer(serializer):
+    """Count the time ``serializer`` spends in ``to_representation``."""
+    to_representation = serializer.to_representation
+
+    def timed(*args, **kwargs):
+        with measure_serialization():
+            return to_representation(*args, **kwargs)
+
+    serializer.to_representation = timed
+    return serializer
+
+
+@contextmanager
+def measure_serialization():
+    """Add the duration of the block to the current request's serializer time."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current = _current.get()
+        if current is not None:
+            current.serializer_seconds += time.perf_counter() - started
+            current.serialized = True
+
+
+def wrap_connections(wrapper):
+    """Install ``wrapper`` on every database connection of this thread.
+
+    Connections belong to a thread, so under ASGI call this through
+    ``sync_to_async`` to reach the thread the request's queries run in.
+    Closing the returned stack removes the wrappers again.
+    """
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+class MetricsMiddleware:
+    """Record per-route metrics for every request. Keep it first."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current = RequestMetrics()
+        token = _current.set(current)
+        started = time.perf_counter()
+        try:
+            with wrap_connections(current):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, current, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        current = RequestMetrics()
+        token = _current.set(current)
+        started = time.perf_counter()
+        try:
+            stack = await sync_to_async(wrap_connections)(current)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        self.record(request, response, current, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, current, duration):
+        match = request.resolver_match
+        labels = (
+            match.view_name if match else "unmatched",
+            request.method,
+            str(response.status_code),
+        )
+        registry.observe("http_request_duration_seconds", labels, duration)
+        registry.observe("http_request_db_queries", labels, current.queries)
+        registry.observe("http_request_db_duration_seconds", labels, current.db_seconds)
+        if current.serialized:
+            registry.observe(
+                "http_serializer_duration_seconds", labels, current.serializer_seconds
+            )
+        if not response.streaming:
+            registry.observe("http_response_size_bytes", labels, len(response.content))
+        registry.flush()
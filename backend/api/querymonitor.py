@@ -0,0 +1,203 @@
+"""Flag requests that run too many or too slow database queries.
+
+:class:`QueryMonitorMiddleware` logs one JSON object to the
+``api.querymonitor`` logger for every request that goes over its query
+budget: too many queries, too much database time, or the same SQL repeated
+often enough to suggest an N+1 pattern. The queries are those counted by
+:class:`api.metrics.MetricsMiddleware`, which must come before it. A sample
+of the slowest flagged statements is run through ``EXPLAIN`` and its plan
+logged along with it; the event is logged once the response has been sent,
+so the extra query never delays it. Only SQL templates and query parameter
+names are logged, never parameter values.
+
+The defaults come from the ``QUERY_MONITOR_*`` settings; a view can tighten
+or relax them with a ``query_budget`` class attribute, and a viewset per
+action with ``query_budgets``, where ``None`` exempts the action::
+
+    class BookViewSet(viewsets.ModelViewSet):
+        query_budget = QueryBudget(max_queries=10)
+        query_budgets = {"list": QueryBudget(max_queries=5), "export": None}
+"""
+
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+from api.metrics import current_metrics
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """Limits for one view; ``None`` falls back to the project default."""
+
+    max_queries: int | None = None
+    max_seconds: float | None = None
+    max_repeats: int | None = None
+
+    def resolve(self):
+        defaults = {
+            "max_queries": settings.QUERY_MONITOR_MAX_QUERIES,
+            "max_seconds": settings.QUERY_MONITOR_MAX_SECONDS,
+            "max_repeats": settings.QUERY_MONITOR_MAX_REPEATS,
+        }
+        return QueryBudget(
+            **{
+                name: default if getattr(self, name) is None else getattr(self, name)
+                for name, default in defaults.items()
+            }
+        )
+
+
+def sql_shape(sql):
+    """Collapse ``IN`` lists so queries differing only in list size match."""
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def repeated_queries(shapes, max_repeats):
+    """Return the SQL shapes of ``shapes`` that ran more than ``max_repeats`` times."""
+    counts = Counter()
+    for sql, count in shapes.items():
+        counts[sql_shape(sql)] += count
+    return [
+        {"sql": sql, "count": count}
+        for sql, count in counts.most_common()
+        if count > max_repeats
+    ]
+
+
+def explain(sql, params, alias):
+    """Return the plan of a SELECT statement, or ``None`` if unavailable."""
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return None
+    connection = connections[alias]
+    json_format = "JSON" in connection.features.supported_explain_formats
+    prefix = connection.ops.explain_query_prefix(format="json" if json_format else None)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}", params)
+            rows = cursor.fetchall()
+    except DatabaseError as error:
+        return {"error": str(error)}
+    if json_format:
+        plan = rows[0][0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    return [row[-1] for row in rows]
+
+
+class QueryMonitorMiddleware:
+    """Log requests that go over their query budget.
+
+    List it right after :class:`api.metrics.MetricsMiddleware`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_MONITOR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.inspect(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.inspect(request, response, time.perf_counter() - started)
+        return response
+
+    def inspect(self, request, response, duration):
+        log = current_metrics()
+        if log is None:
+            return
+        problems = self.check(request, log)
+        if problems:
+            # The server closes the response after sending it, in the
+            # request's database thread, so EXPLAIN runs off the request path.
+            response._resource_closers.append(
+                partial(self.report, request, response, log, duration, *problems)
+            )
+
+    @staticmethod
+    def get_budget(request):
+        """Return the budget of the request's view, or ``None`` if exempt."""
+        # Read after the response rather than in process_view, which ASGI
+        # would run in a thread because it is synchronous.
+        match = request.resolver_match
+        view_func = match.func if match else None
+        view_class = getattr(view_func, "cls", None) or getattr(
+            view_func, "view_class", None
+        )
+        actions = getattr(view_func, "actions", None) or {}
+        action = actions.get(request.method.lower())
+        budgets = getattr(view_class, "query_budgets", None) or {}
+        if action in budgets:
+            return budgets[action]
+        return getattr(view_class, "query_budget", None) or QueryBudget()
+
+    def check(self, request, log):
+        """Return ``(budget, problems, repeated)``, or ``None`` if within budget."""
+        budget = self.get_budget(request)
+        if budget is None:
+            return None
+        budget = budget.resolve()
+        problems = []
+        if log.queries > budget.max_queries:
+            problems.append("too_many_queries")
+        if log.db_seconds > budget.max_seconds:
+            problems.append("slow_database")
+        repeated = repeated_queries(log.shapes, budget.max_repeats)
+        if repeated:
+            problems.append("repeated_queries")
+        if problems:
+            return budget, problems, repeated
+        return None
+
+    def report(self, request, response, log, duration, budget, problems, repeated):
+        slow = sorted(log.slow, key=lambda item: item[0], reverse=True)
+        statements = []
+        for index, (seconds, sql, params, alias) in enumerate(slow[:5]):
+            statement = {"sql": sql, "seconds": round(seconds, 6), "database": alias}
+            if index == 0 and random.random() < settings.QUERY_MONITOR_EXPLAIN_RATE:
+                statement["plan"] = explain(sql, params, alias)
+            statements.append(statement)
+
+        match = request.resolver_match
+        event = {
+            "event": "query_budget_exceeded",
+            "problems": problems,
+            "method": request.method,
+            "path": request.path,
+            "params": sorted(request.GET),
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "duration": round(duration, 6),
+            "queries": log.queries,
+            "db_seconds": round(log.db_seconds, 6),
+            "budget": asdict(budget),
+            "repeated": repeated[:5],
+            "slow": statements,
+        }
+        logger.warning(json.dumps(event, default=str))
@@ -1,3 +1,143 @@
-from django.test import TestCase
+import json
+import tempfile
+from collections import Counter
+from pathlib import Path
 
-# Create your tests here.
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from api.metrics import MetricsMiddleware, registry
+from api.querymonitor import QueryMonitorMiddleware, repeated_queries
+from library.models import Author, Category
+
+
+class MetricsTests(TestCase):
+    client_class = APIClient
+    series = 'view="author-list",method="GET",status="200"'
+
+    def setUp(self):
+        registry.samples = {}
+        user = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_authenticate(user)
+        Author.objects.create(name="Ursula K. Le Guin")
+
+    def scrape(self, **headers):
+        response = self.client.get("/metrics", **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        self.client.get("/api/v1/authors/")
+        body = self.scrape()
+        self.assertIn(f"http_request_duration_seconds_count{{{self.series}}} 1", body)
+        self.assertIn(
+            f"http_serializer_duration_seconds_count{{{self.series}}} 1", body
+        )
+        queries = f'http_request_db_queries_bucket{{{self.series},le="0"}} 0'
+        self.assertIn(queries, body)
+        self.assertIn('library_cache_requests_total{namespace="books"', body)
+
+    def test_worker_files_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = {
+                "http_request_duration_seconds": [
+                    [["author-list", "GET", "200"], [1] + [0] * 11 + [0.002]]
+                ]
+            }
+            Path(directory, "1.json").write_text(json.dumps(other))
+            with override_settings(METRICS_DIR=directory):
+                self.client.get("/api/v1/authors/")
+                self.assertTrue(registry.path().exists())
+                body = self.scrape()
+        self.assertIn(f"http_request_duration_seconds_count{{{self.series}}} 2", body)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.scrape(HTTP_AUTHORIZATION="Bearer scrape-secret")
+
+    def test_internal_ips_only_without_token(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(response.status_code, 403)
+
+
+class QueryMonitorTests(TestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        user = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_authenticate(user)
+        Author.objects.create(name="Ursula K. Le Guin")
+
+    def logged_event(self, url):
+        with self.assertLogs("api.querymonitor", "WARNING") as logs:
+            self.client.get(url)
+        return json.loads(logs.records[0].getMessage())
+
+    @override_settings(
+        QUERY_MONITOR_MAX_QUERIES=1,
+        QUERY_MONITOR_SLOW_QUERY_SECONDS=0,
+        QUERY_MONITOR_EXPLAIN_RATE=1,
+    )
+    def test_request_over_budget_is_logged_with_plan(self):
+        event = self.logged_event("/api/v1/authors/?name=Le")
+        self.assertEqual(event["problems"], ["too_many_queries"])
+        self.assertEqual(event["view"], "author-list")
+        self.assertEqual(event["params"], ["name"])
+        self.assertNotIn("Le", json.dumps(event["params"]))
+        self.assertGreater(event["queries"], 1)
+        self.assertTrue(event["slow"][0]["plan"])
+        self.assertNotIn("plan", event["slow"][1])
+
+    @override_settings(QUERY_MONITOR_MAX_QUERIES=1)
+    def test_viewset_budget_overrides_default(self):
+        with self.assertNoLogs("api.querymonitor", "WARNING"):
+            self.client.get("/api/v1/books/")
+
+    @override_settings(QUERY_MONITOR_MAX_QUERIES=1)
+    def test_actions_can_be_exempt(self):
+        book = {
+            "title": "Dune",
+            "category": Category.objects.create(name="Fiction").pk,
+            "author": [str(Author.objects.get().pk)],
+            "total_copies": 1,
+            "available_copies": 1,
+        }
+        with self.assertNoLogs("api.querymonitor", "WARNING"):
+            response = self.client.post(
+                "/api/v1/books/bulk/",
+                [{**book, "isbn": "9780000000001"}],
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        with self.assertLogs("api.querymonitor", "WARNING"):
+            response = self.client.post(
+                "/api/v1/books/", {**book, "isbn": "9780000000002"}
+            )
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(QUERY_MONITOR_MAX_QUERIES=0)
+    def test_logged_once_the_response_is_closed(self):
+        def view(request):
+            Author.objects.count()
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(QueryMonitorMiddleware(view))
+        with self.assertNoLogs("api.querymonitor", "WARNING"):
+            response = middleware(RequestFactory().get("/"))
+        # As the test client does, keep the test's connection open.
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        with self.assertLogs("api.querymonitor", "WARNING"):
+            response.close()
+
+    def test_repeated_shapes_are_grouped(self):
+        sql = 'SELECT "name" FROM "library_author" WHERE "id" IN ({})'
+        shapes = Counter(sql.format(", ".join(["%s"] * size)) for size in range(1, 5))
+        expected = [{"sql": sql.format("..."), "count": 4}]
+        self.assertEqual(repeated_queries(shapes, 3), expected)
+        self.assertEqual(repeated_queries(shapes, 4), [])
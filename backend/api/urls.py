@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 
 from rest_framework.routers import DefaultRouter
@@ -5,6 +6,8 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 
 from library import views
+from library.async_views import async_read_urls
+from reports.views import ReportViewSet
 
 
 router = DefaultRouter()
@@ -12,12 +15,16 @@ router.register("authors", views.AuthorViewSet, basename="author")
 router.register("categories", views.CategoryViewSet, basename="category")
 router.register("books", views.BookViewSet, basename="book")
 router.register("users", views.UserViewSet, basename="user")
+router.register("reports", ReportViewSet, basename="report")
 
 
 books_router = routers.NestedDefaultRouter(router, "books", lookup="book")
 books_router.register(
     "borrow-records", views.BorrowRecordViewSet, basename="book-borrow-record"
 )
+books_router.register(
+    "reservations", views.ReservationViewSet, basename="book-reservation"
+)
 
 users_router = routers.NestedDefaultRouter(router, "users", lookup="user")
 users_router.register(
@@ -25,10 +32,15 @@ users_router.register(
 )
 
 
+router_urls = router.urls
+if settings.LIBRARY_ASYNC_READS:
+    router_urls = async_read_urls(router_urls)
+
+
 urlpatterns = [
     path("auth/", include("djoser.urls")),
     path("auth/", include("djoser.urls.jwt")),
-    path("", include(router.urls)),
+    path("", include(router_urls)),
     path("", include(books_router.urls)),
     path("", include(users_router.urls)),
 ]
@@ -1,3 +1,24 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from .metrics import render
+
+
+@require_GET
+def metrics(request):
+    """Serve request and cache metrics in the Prometheus text format.
+
+    Scrapers authenticate with ``METRICS_TOKEN``; without one configured only
+    clients in ``INTERNAL_IPS`` are served.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode(), expected.encode()):
+            return HttpResponseForbidden()
+    elif request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4")
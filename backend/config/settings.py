@@ -1,7 +1,7 @@
 from datetime import timedelta
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "drf_yasg",
     "django_filters",
     "rest_framework",
@@ -29,18 +30,22 @@ INSTALLED_APPS = [
     "api",
     "accounts.apps.AccountsConfig",
     "library",
+    "reports",
 ]
 
 
 AUTH_USER_MODEL = "accounts.User"
 
 MIDDLEWARE = [
+    "api.metrics.MetricsMiddleware",
+    "api.querymonitor.QueryMonitorMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "api.static.AsyncWhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "library.replicas.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -81,9 +86,68 @@ else:
             "PASSWORD": config("password"),
             "HOST": config("host"),
             "PORT": config("port"),
+            # Keep connections open across requests instead of reconnecting
+            # every time; health checks replace ones the server dropped.
+            # Under ASGI every request queries from a new thread, so kept
+            # connections would pile up; use db_pool_max_size there instead.
+            "CONN_MAX_AGE": config(
+                "db_conn_max_age",
+                default=0 if config("gunicorn_asgi", default=False, cast=bool) else 60,
+                cast=int,
+            ),
+            "CONN_HEALTH_CHECKS": config(
+                "db_conn_health_checks", default=True, cast=bool
+            ),
         }
     }
 
+    # Django's native connection pool (needs psycopg 3 with psycopg_pool). A
+    # worker thread holds at most one connection per database, so size the
+    # pool to the worker's threads: workers * db_pool_max_size (times the
+    # number of databases) must stay below PostgreSQL's max_connections.
+    DB_POOL_MAX_SIZE = config("db_pool_max_size", default=0, cast=int)
+    if DB_POOL_MAX_SIZE:
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": config("db_pool_min_size", default=1, cast=int),
+                "max_size": DB_POOL_MAX_SIZE,
+                "timeout": config("db_pool_timeout", default=10, cast=int),
+            }
+        }
+
+# Read replicas of the primary, by host. Reads of list/retrieve endpoints are
+# spread over them; see library.replicas.
+for index, host in enumerate(config("replica_hosts", default="", cast=Csv()), 1):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+LIBRARY_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+LIBRARY_REPLICA_STICKY_SECONDS = config("replica_sticky_seconds", default=5, cast=int)
+DATABASE_ROUTERS = ["library.replicas.ReplicaRouter"]
+
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "cache_backend", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("cache_location", default="library"),
+    }
+}
+# Outside DEBUG every worker process must share the cache: catalog versions,
+# conditional-GET validators and the replica sticky window live there (checks
+# library.E001 and library.E002). The local-memory default is for development.
+
+LIBRARY_CACHE_TIMEOUT = 300
+
+# Serve plain list and detail reads of the catalog with the async ORM. Only
+# useful when running under ASGI (gunicorn_asgi=True).
+LIBRARY_ASYNC_READS = config("async_reads", default=False, cast=bool)
+
+AUTHENTICATION_BACKENDS = ["accounts.backends.CachedPermissionBackend"]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -124,10 +188,71 @@ INTERNAL_IPS = ["127.0.0.1"]
 REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.CachedJWTAuthentication",
     ),
 }
 
+LIBRARY_LOAN_PERIOD_DAYS = 14
+
+# Maximum concurrent loans per group name; members of several groups get the
+# highest limit. Users in none of them fall back to the default (None: no cap).
+LIBRARY_LOAN_LIMITS = {"Member": config("member_loan_limit", default=5, cast=int)}
+LIBRARY_DEFAULT_LOAN_LIMIT = None
+
+# Days a returned copy stays set aside for the member at the head of the
+# hold queue before the expire_reservations sweep passes it on.
+LIBRARY_HOLD_DAYS = 3
+
+# Seconds an authenticated user is served from the cache; saving the user
+# invalidates it right away. Like the permission cache below, it needs a
+# cache_backend shared by every worker process (check accounts.E001).
+ACCOUNTS_USER_CACHE_TIMEOUT = config("user_cache_timeout", default=60, cast=int)
+# Seconds a group's permission set stays in the shared cache; changes to
+# groups and permissions invalidate it right away (see accounts.backends).
+ACCOUNTS_PERMISSION_CACHE_TIMEOUT = config(
+    "permission_cache_timeout", default=3600, cast=int
+)
+
+# Request metrics served at /metrics. With several worker processes, point
+# metrics_dir at a directory they share so every scrape covers all of them.
+METRICS_DIR = config("metrics_dir", default="")
+METRICS_FLUSH_SECONDS = config("metrics_flush_seconds", default=1.0, cast=float)
+# When set, /metrics requires "Authorization: Bearer <metrics_token>";
+# otherwise it only answers clients in INTERNAL_IPS.
+METRICS_TOKEN = config("metrics_token", default="")
+METRICS_CACHE_NAMESPACES = ["books"]
+
+# Requests over these limits are logged as JSON by api.querymonitor; views
+# override them with a query_budget attribute. Statements slower than
+# QUERY_MONITOR_SLOW_QUERY_SECONDS are listed, and a QUERY_MONITOR_EXPLAIN_RATE
+# share of flagged requests also log the plan of their slowest one.
+QUERY_MONITOR = config("query_monitor", default=True, cast=bool)
+QUERY_MONITOR_MAX_QUERIES = config("query_monitor_max_queries", default=30, cast=int)
+QUERY_MONITOR_MAX_SECONDS = config("query_monitor_max_seconds", default=0.5, cast=float)
+QUERY_MONITOR_MAX_REPEATS = config("query_monitor_max_repeats", default=5, cast=int)
+QUERY_MONITOR_SLOW_QUERY_SECONDS = config(
+    "query_monitor_slow_query_seconds", default=0.1, cast=float
+)
+QUERY_MONITOR_EXPLAIN_RATE = config(
+    "query_monitor_explain_rate", default=0.1, cast=float
+)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"message": {"format": "%(message)s"}},
+    "handlers": {
+        "json": {"class": "logging.StreamHandler", "formatter": "message"},
+    },
+    "loggers": {
+        "api.querymonitor": {
+            "handlers": ["json"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
 SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("JWT",),
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
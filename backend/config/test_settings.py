@@ -0,0 +1,19 @@
+"""Settings for ``manage.py test``: the regular ones plus a stand-in replica."""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# A second, separate database standing in for a read replica; it is migrated
+# but never receives the primary's rows. Tests route reads to it with
+# override_settings(LIBRARY_REPLICAS=["replica"]); see ReplicaRoutingTests.
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "TEST": {
+        "MIRROR": None,
+        "NAME": None if "sqlite" in DATABASES["default"]["ENGINE"] else "test_replica",
+    },
+}
+LIBRARY_REPLICAS = []
+
+# Tests run in a single process on the local-memory cache.
+SILENCED_SYSTEM_CHECKS = ["accounts.E001", "library.E001"]
@@ -7,6 +7,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from api.views import metrics
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Library Management System - API Doc",
@@ -27,6 +29,7 @@ urlpatterns = [
         name="schema-swagger-ui",
     ),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
+    path("metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG:
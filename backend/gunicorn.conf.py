@@ -0,0 +1,55 @@
+"""Gunicorn settings, loaded automatically when started from this directory.
+
+Every worker thread keeps at most one open connection per database (see
+db_conn_max_age and db_pool_max_size in config/settings.py), so the number of
+PostgreSQL connections is about workers * threads per database. Keep it
+below the server's max_connections, leaving room for management commands.
+
+With gunicorn_asgi=True the workers run config.asgi instead. Each request
+then queries from a short-lived thread of its own, so connections come from
+the pool: workers * db_pool_max_size per database.
+"""
+
+import multiprocessing
+import os
+from pathlib import Path
+
+import decouple
+
+bind = decouple.config("gunicorn_bind", default="0.0.0.0:8000")
+workers = decouple.config(
+    "gunicorn_workers", default=multiprocessing.cpu_count() * 2 + 1, cast=int
+)
+threads = decouple.config("gunicorn_threads", default=1, cast=int)
+if decouple.config("gunicorn_asgi", default=False, cast=bool):
+    # One event loop per worker serving up to worker_connections requests at
+    # once; pair it with async_reads=True and db_pool_max_size.
+    wsgi_app = "config.asgi:application"
+    worker_class = "asgi"
+    worker_connections = decouple.config(
+        "gunicorn_worker_connections", default=1000, cast=int
+    )
+else:
+    wsgi_app = "config.wsgi:application"
+    worker_class = "gthread" if threads > 1 else "sync"
+timeout = decouple.config("gunicorn_timeout", default=30, cast=int)
+# Recycle workers now and then so a leaking worker cannot grow forever.
+max_requests = decouple.config("gunicorn_max_requests", default=1000, cast=int)
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    """Run the system checks for this worker count and drop metrics files
+    left by the workers of a previous run."""
+    import django
+    from django.core.management import call_command
+
+    os.environ["gunicorn_workers"] = str(server.cfg.workers)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+    call_command("check")
+
+    directory = decouple.config("metrics_dir", default="")
+    if directory:
+        for path in Path(directory).glob("*.json"):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,257 @@
+"""Async ``list`` and ``retrieve`` for the catalog viewsets.
+
+DRF views are synchronous, so under ASGI every request holds a worker thread
+while it waits on the database. :func:`async_read_view` wraps a router view
+in a coroutine that answers plain JSON ``GET`` requests for ``list`` and
+``retrieve`` with the async ORM and hands everything else to the original
+view. That covers filters, ``expand``, ``fields``, cursors, the browsable
+API and writes. The async path still goes through the view's ``initial()``
+(authentication, permissions, throttling, content negotiation, versioning),
+``handle_exception()`` and ``finalize_response()``, so responses are
+identical to the synchronous path: same body, headers, validators, cache
+entries and 304 handling.
+
+Enabled with ``LIBRARY_ASYNC_READS`` for viewsets with ``async_reads = True``;
+only worth it under ASGI.
+"""
+
+import math
+from functools import update_wrapper
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.urls import URLPattern
+from rest_framework.exceptions import APIException
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.metrics import measure_serialization
+
+from .mixins import CachedResponseMixin, ConditionalGetMixin, FastReadMixin
+from .serializers import ValuesSerializer
+
+ASYNC_ACTIONS = {"list", "retrieve"}
+ASYNC_QUERY_PARAMS = {"page", "page_size"}
+JSON_ACCEPT = {"", "*/*", "application/json"}
+
+
+class Fallback(Exception):
+    """The request needs the view's synchronous handler."""
+
+
+def async_read_view(sync_view):
+    """Return a coroutine view serving plain reads of ``sync_view`` async."""
+    delegate = sync_to_async(sync_view)
+    read_action = sync_view.actions.get("get")
+    if read_action not in ASYNC_ACTIONS:
+        return sync_view
+
+    async def view(request, *args, **kwargs):
+        if is_plain_read(request):
+            return await AsyncRead(sync_view, request, args, kwargs).respond()
+        return await delegate(request, *args, **kwargs)
+
+    # Keeps cls, actions and initkwargs for the schema and the middleware.
+    update_wrapper(view, sync_view)
+    return markcoroutinefunction(view)
+
+
+def async_read_urls(patterns):
+    """Swap in :func:`async_read_view` for viewsets that set ``async_reads``."""
+    return [
+        (
+            URLPattern(
+                pattern.pattern,
+                async_read_view(pattern.callback),
+                pattern.default_args,
+                pattern.name,
+            )
+            if getattr(getattr(pattern.callback, "cls", None), "async_reads", False)
+            else pattern
+        )
+        for pattern in patterns
+    ]
+
+
+def is_plain_read(request):
+    return (
+        request.method == "GET"
+        and set(request.GET) <= ASYNC_QUERY_PARAMS
+        and request.headers.get("Accept", "") in JSON_ACCEPT
+    )
+
+
+class AsyncRead:
+    """One async ``list`` or ``retrieve`` on a set-up instance of the viewset."""
+
+    def __init__(self, sync_view, request, args, kwargs):
+        # What the view function built by ViewSetMixin.as_view() does.
+        view = sync_view.cls(**sync_view.initkwargs)
+        view.action_map = sync_view.actions
+        for method, action in sync_view.actions.items():
+            setattr(view, method, getattr(view, action))
+        view.head = view.get
+        view.args, view.kwargs = args, kwargs
+        view.format_kwarg = None
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        self.view = view
+        self.request = request
+
+    async def respond(self):
+        """Dispatch the request like ``APIView.dispatch()`` does."""
+        view, request = self.view, self.view.request
+        try:
+            if "Authorization" in self.request.headers or view.throttle_classes:
+                # Token checks and throttles may read the cache or the database.
+                await sync_to_async(view.initial)(request, *view.args, **view.kwargs)
+            else:
+                view.initial(request, *view.args, **view.kwargs)
+            try:
+                response = await self.read()
+            except Fallback:
+                handler = getattr(view, view.action)
+                response = await sync_to_async(handler)(
+                    request, *view.args, **view.kwargs
+                )
+        except Exception as exc:
+            response = await sync_to_async(view.handle_exception)(exc)
+        view.response = view.finalize_response(
+            request, response, *view.args, **view.kwargs
+        )
+        return view.response
+
+    async def read(self):
+        view = self.view
+        if isinstance(view, CachedResponseMixin):
+            pk = view.get_cache_pk() if view.action == "retrieve" else None
+            if view.action == "retrieve" and pk is None:
+                raise Fallback
+            key, cached = await sync_to_async(view.lookup_cache)(view.request, pk)
+            if cached is None:
+                cached = await self.build()
+                await cache.aset(key, cached, settings.LIBRARY_CACHE_TIMEOUT)
+        else:
+            cached = await self.build()
+
+        data, etag, last_modified = cached
+        if etag:
+            response = view.not_modified(self.request, etag, last_modified)
+            if response is not None:
+                return response
+        response = self.render(data)
+        if etag:
+            view.set_validators(response, etag, last_modified)
+        return response
+
+    def get_values_serializer(self):
+        if isinstance(self.view, FastReadMixin):
+            return self.view.get_values_serializer()
+        return ValuesSerializer.for_serializer(self.view.get_serializer_class())
+
+    async def build(self):
+        """Return ``(data, etag, last_modified)`` like the sync cache entry."""
+        view = self.view
+        try:
+            queryset = view.filter_queryset(view.get_queryset())
+            if view.action == "retrieve":
+                lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+                queryset = queryset.filter(
+                    **{view.lookup_field: view.kwargs[lookup_url_kwarg]}
+                )
+                return await self.build_detail(queryset)
+            return await self.build_list(queryset)
+        except (APIException, ValidationError):
+            raise Fallback
+
+    async def build_detail(self, queryset):
+        serializer = self.get_values_serializer()
+        conditional = isinstance(self.view, ConditionalGetMixin)
+        extra = ["updated_at"] if conditional else []
+        row = await serializer.get_values(queryset, extra).afirst()
+        if row is None:
+            raise Fallback  # The 404 comes from the sync view.
+        with measure_serialization():
+            data = (await serializer.ato_representation([row]))[0]
+        etag = last_modified = None
+        if conditional:
+            modified = row["updated_at"]
+            etag, last_modified = await self.get_validators(
+                modified, modified.isoformat()
+            )
+        return data, etag, last_modified
+
+    async def build_list(self, queryset):
+        paginator = self.view.paginator
+        size = self.get_page_size(paginator)
+        aggregate = (
+            await queryset.order_by()
+            .prefetch_related(None)
+            .aaggregate(last_modified=Max("updated_at"), count=Count("pk"))
+        )
+        count = aggregate["count"]
+        number = self.get_page_number(paginator, max(1, math.ceil(count / size)))
+
+        serializer = self.get_values_serializer()
+        offset = (number - 1) * size
+        rows = serializer.get_values(queryset)[offset : offset + size]
+        rows = [row async for row in rows]
+        with measure_serialization():
+            results = await serializer.ato_representation(rows)
+
+        url = self.request.build_absolute_uri()
+        param = paginator.page_query_param
+        previous = None
+        if number == 2:
+            previous = remove_query_param(url, param)
+        elif number > 2:
+            previous = replace_query_param(url, param, number - 1)
+        data = {
+            "count": count,
+            "next": (
+                replace_query_param(url, param, number + 1)
+                if offset + size < count
+                else None
+            ),
+            "previous": previous,
+            "results": results,
+        }
+
+        etag = last_modified = None
+        if isinstance(self.view, ConditionalGetMixin):
+            modified = aggregate["last_modified"]
+            etag, last_modified = await self.get_validators(
+                modified, f"{count}:{modified}"
+            )
+        return data, etag, last_modified
+
+    async def get_validators(self, last_modified, fingerprint):
+        """Validators matching the sync view's, from versions when it has them."""
+        if self.view.get_version_scopes() is not None:
+            return await sync_to_async(self.view.get_validators)(self.request)
+        return self.view.build_validators(self.request, last_modified, fingerprint)
+
+    def get_page_size(self, paginator):
+        return paginator.get_page_size(self.view.request)
+
+    def get_page_number(self, paginator, pages):
+        value = self.request.GET.get(paginator.page_query_param, "1")
+        if value in paginator.last_page_strings:
+            return pages
+        try:
+            number = int(value)
+        except ValueError:
+            raise Fallback
+        if not 1 <= number <= pages:
+            raise Fallback  # The sync view answers with "Invalid page".
+        return number
+
+    def render(self, data):
+        renderer = self.view.request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f"; charset={renderer.charset}"
+        return HttpResponse(renderer.render(data), content_type=content_type)
@@ -0,0 +1,130 @@
+"""Versioned response cache for the public catalog endpoints.
+
+Cached entries are never deleted explicitly. Every key embeds version
+numbers and writers bump those versions instead, so stale entries simply
+stop being addressed and age out of the backend:
+
+* the *catalog* version covers list responses and is bumped by any change
+  to books, authors, categories or book authorship;
+* each book has its own version covering its detail response;
+* the *related* version covers data a detail response borrows from authors
+  and categories.
+
+Each bump also records when it happened, which gives conditional GETs their
+``Last-Modified`` without a query.
+"""
+
+import hashlib
+import time
+from datetime import UTC, datetime
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+CATALOG = "catalog"
+RELATED = "related"
+
+# Models whose every write bumps the catalog version.
+CATALOG_MODELS = {"library.Author", "library.Book", "library.Category"}
+
+
+def _version_key(scope):
+    return f"library:version:{scope}"
+
+
+def _modified_key(scope):
+    return f"library:modified:{scope}"
+
+
+def _stats_key(namespace, outcome):
+    return f"library:cache:{namespace}:{outcome}"
+
+
+def _incr(key, initial):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key)
+
+
+def _new_version():
+    # Seed versions with a timestamp rather than 1 so an evicted or restarted
+    # counter can never address entries written before it vanished.
+    return time.time_ns()
+
+
+def get_versions(*scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_version_state(*scopes):
+    """Return the versions of ``scopes`` and when any of them last changed."""
+    keys = [_version_key(scope) for scope in scopes]
+    modified_keys = [_modified_key(scope) for scope in scopes]
+    state = cache.get_many(keys + modified_keys)
+    for key in keys:
+        if key not in state:
+            cache.add(key, _new_version(), timeout=None)
+            state[key] = cache.get(key)
+    for key in modified_keys:
+        if key not in state:
+            # Unknown: treat it as changed now, which only costs a refetch.
+            cache.add(key, time.time(), timeout=None)
+            state[key] = cache.get(key)
+    last_modified = max(state[key] for key in modified_keys)
+    return (
+        [state[key] for key in keys],
+        datetime.fromtimestamp(last_modified, UTC),
+    )
+
+
+def bump_versions(*scopes):
+    for scope in scopes:
+        _incr(_version_key(scope), _new_version())
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, timeout=None)
+
+
+def object_scope(namespace, pk):
+    return f"{namespace}:{pk}"
+
+
+def invalidate_books(book_ids=()):
+    """Invalidate list responses and the detail responses of ``book_ids``."""
+    bump_versions(CATALOG, *(object_scope("books", pk) for pk in book_ids))
+
+
+def invalidate_related():
+    """Invalidate every response that embeds author or category data."""
+    bump_versions(CATALOG, RELATED)
+
+
+def build_key(namespace, action, request, versions, pk=None):
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    # Pagination links are absolute, so the origin is part of the response.
+    origin = f"{request.scheme}://{request.get_host()}"
+    digest = hashlib.md5(f"{origin}?{urlencode(params)}".encode()).hexdigest()
+    version = ".".join(str(value) for value in versions)
+    return f"library:{namespace}:{action}:{pk or ''}:{version}:{digest}"
+
+
+def record(namespace, hit):
+    _incr(_stats_key(namespace, "hits" if hit else "misses"), 0)
+
+
+def cache_stats(namespace):
+    hits, misses = (
+        cache.get(_stats_key(namespace, outcome), 0) for outcome in ("hits", "misses")
+    )
+    return {"hits": hits, "misses": misses}
@@ -0,0 +1,33 @@
+"""System checks for the catalog cache."""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from accounts.checks import LOCAL_CACHE_BACKENDS
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Catalog versions, conditional-GET validators and the replica sticky
+    window live in the cache, so production needs one all workers share."""
+    if settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS:
+        return []
+    if settings.LIBRARY_REPLICAS:
+        return [
+            Error(
+                "replica_hosts needs a cache shared by all worker processes.",
+                hint="Set cache_backend to a shared backend such as Redis.",
+                id="library.E002",
+            )
+        ]
+    if not settings.DEBUG:
+        return [
+            Error(
+                "Production needs a cache shared by all worker processes; "
+                "otherwise catalog changes and ETag/Last-Modified validators "
+                "only reach the worker that made them.",
+                hint="Set cache_backend to a shared backend such as Redis.",
+                id="library.E001",
+            )
+        ]
+    return []
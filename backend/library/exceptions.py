@@ -0,0 +1,38 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class BookUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "No copies of this book are currently available."
+    default_code = "book_unavailable"
+
+
+class AlreadyReturned(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This borrow record has already been returned."
+    default_code = "already_returned"
+
+
+class LoanLimitExceeded(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "You have reached the maximum number of concurrent loans."
+    default_code = "loan_limit_exceeded"
+
+
+class CopiesAvailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Copies of this book are available; borrow one instead."
+    default_code = "copies_available"
+
+
+class AlreadyReserved(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "You already have an open reservation for this book."
+    default_code = "already_reserved"
+
+
+class ReservationClosed(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This reservation is no longer open."
+    default_code = "reservation_closed"
@@ -1,14 +1,20 @@
 from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
 
 from .models import Author, Book, BorrowRecord, Category
+from .search import search_authors, search_books
 
 
 class AuthorFilter(filters.FilterSet):
     name = filters.CharFilter(field_name="name", lookup_expr="icontains")
+    search = filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Author
-        fields = ["name"]
+        fields = ["name", "search"]
+
+    def filter_search(self, queryset, name, value):
+        return search_authors(queryset, value)
 
 
 class CategoryFilter(filters.FilterSet):
@@ -22,12 +28,26 @@ class CategoryFilter(filters.FilterSet):
 class BookFilter(filters.FilterSet):
     title = filters.CharFilter(field_name="title", lookup_expr="icontains")
     isbn = filters.CharFilter(field_name="isbn", lookup_expr="exact")
-    category_id = filters.UUIDFilter(field_name="category_id")
+    category_id = filters.NumberFilter(field_name="category_id")
     author_id = filters.UUIDFilter(field_name="author__id")
+    search = filters.CharFilter(method="filter_search")
+    times_borrowed = filters.RangeFilter(field_name="times_borrowed")
+    active_loans = filters.RangeFilter(field_name="active_loans")
 
     class Meta:
         model = Book
-        fields = ["title", "isbn", "category_id", "author_id"]
+        fields = [
+            "title",
+            "isbn",
+            "category_id",
+            "author_id",
+            "search",
+            "times_borrowed",
+            "active_loans",
+        ]
+
+    def filter_search(self, queryset, name, value):
+        return search_books(queryset, value)
 
 
 class BorrowRecordFilter(filters.FilterSet):
@@ -39,3 +59,16 @@ class BorrowRecordFilter(filters.FilterSet):
     class Meta:
         model = BorrowRecord
         fields = ["status", "user_id", "book_id", "due_date"]
+
+
+class StableOrderingFilter(OrderingFilter):
+    """``OrderingFilter`` that breaks ties on the primary key.
+
+    Without it, rows sharing a counter value could shift between pages.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {"pk", "-pk", "id", "-id"} & set(ordering):
+            ordering = [*ordering, "-pk"]
+        return ordering
@@ -0,0 +1,402 @@
+"""Streaming readers and a batched writer for bulk catalog imports.
+
+Readers yield one item at a time so input size never dictates memory use.
+Flat formats (JSON array, NDJSON, CSV, MARC-like text) yield catalog records
+of the form::
+
+    {"title": ..., "isbn": ..., "category": <name>, "authors": [<name>, ...],
+     "total_copies": ..., "available_copies": ...}
+
+A JSON array may instead hold Django fixture objects (``model``/``pk``/
+``fields``), as ``backend/fixtures/library_fixtures.json`` does.
+"""
+
+import csv
+import json
+import re
+
+from django.db import connection, transaction
+
+from .models import Author, Book, Category
+from .search import refresh_author_search, refresh_book_search
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_ISBN = re.compile(r"\d{9}[\dX]|\d{13}")
+
+
+def read_json(stream, read_size=1 << 16):
+    """Yield the items of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+    # What may come next: "[" to open the array, a "value" (or "]" right
+    # after "["), "," or "]" after a value, and nothing once it is closed.
+    expected = "["
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            if eof:
+                if expected == "end":
+                    return
+                raise ValueError("Unexpected end of JSON input")
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        char = buffer[position]
+        if expected == "end":
+            raise ValueError(f"Unexpected {char!r} after the JSON array")
+        if expected == "[":
+            if char != "[":
+                raise ValueError("Expected a JSON array")
+            expected, position = "first", position + 1
+            continue
+        if char == "]" and expected in ("first", "separator"):
+            expected, position = "end", position + 1
+            continue
+        if expected == "separator":
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' at {char!r}")
+            expected, position = "value", position + 1
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Most likely the item is cut off at the end of the buffer.
+            if eof:
+                raise
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if end == len(buffer) and not eof:
+            # A number may continue in the next chunk.
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        expected, position = "separator", end
+        yield item
+
+
+def read_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            raise ValueError(f"NDJSON parse error on line {number}: {exc}")
+
+
+def read_csv(stream):
+    """Read rows with the columns named in the module docstring.
+
+    ``authors`` holds names separated by ``|``; ``available_copies`` defaults
+    to ``total_copies``.
+    """
+    yield from csv.DictReader(stream)
+
+
+# MARC-like mnemonic text: one "=TAG  indicators$asubfield..." line per field
+# and a blank line between records. Only the tags below are read.
+MARC_TAGS = {
+    "020": "isbn",
+    "100": "authors",
+    "700": "authors",
+    "245": "title",
+    "650": "category",
+}
+
+
+def _marc_subfields(value):
+    return {part[0]: part[1:] for part in value.split("$")[1:] if part}
+
+
+def read_marc(stream):
+    """Read MARC-like ``.mrk`` records.
+
+    ``020$a`` is the ISBN, ``245$a`` the title, ``100$a``/``700$a`` the
+    authors, the first ``650$a`` the category and ``999$t``/``999$a`` the
+    total and available copies.
+    """
+    record = {}
+    for line in stream:
+        line = line.rstrip("\n")
+        if not line.strip():
+            if record:
+                yield record
+                record = {}
+            continue
+        if not line.startswith("="):
+            continue
+
+        tag, value = line[1:4], line[4:].strip()
+        subfields = _marc_subfields(value)
+        if tag == "999":
+            record["total_copies"] = subfields.get("t")
+            record["available_copies"] = subfields.get("a")
+        elif tag in MARC_TAGS and "a" in subfields:
+            field = MARC_TAGS[tag]
+            text = subfields["a"].strip().rstrip(" /:;,.")
+            if field == "authors":
+                record.setdefault("authors", []).append(text)
+            else:
+                record.setdefault(field, text)
+    if record:
+        yield record
+
+
+READERS = {
+    "json": read_json,
+    "ndjson": read_ndjson,
+    "csv": read_csv,
+    "mrk": read_marc,
+}
+
+
+def _copies(value, field):
+    try:
+        copies = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a whole number, not {value!r}")
+    if copies < 0:
+        raise ValueError(f"{field} cannot be negative")
+    return copies
+
+
+def _check_length(model, field, value):
+    max_length = model._meta.get_field(field).max_length
+    if not value or len(value) > max_length:
+        raise ValueError(
+            f"{model._meta.model_name} {field} must have 1 to {max_length} characters"
+        )
+
+
+def _check_book(book):
+    """Raise ``ValueError`` for values the database would reject."""
+    if not _ISBN.fullmatch(book.isbn):
+        raise ValueError(f"isbn {book.isbn!r} is not a 10 or 13 character ISBN")
+    _check_length(Book, "title", book.title)
+    book.total_copies = _copies(book.total_copies, "total_copies")
+    book.available_copies = _copies(book.available_copies, "available_copies")
+    if book.available_copies > book.total_copies:
+        raise ValueError("available_copies cannot exceed total_copies")
+
+
+def _text(raw, field):
+    value = raw[field]
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be text, not {value!r}")
+    return value.strip()
+
+
+def _clean_record(raw):
+    authors = raw.get("authors") or []
+    if isinstance(authors, str):
+        authors = authors.split("|")
+    total = raw.get("total_copies")
+    if total in (None, ""):
+        raise ValueError("total_copies is required")
+    available = raw.get("available_copies")
+    return {
+        "title": _text(raw, "title"),
+        "isbn": _text(raw, "isbn").replace("-", "").upper(),
+        "category": _text(raw, "category"),
+        "authors": [name.strip() for name in authors if name.strip()],
+        "total_copies": total,
+        "available_copies": total if available in (None, "") else available,
+    }
+
+
+class CatalogImporter:
+    """Collect catalog items and write them with ``bulk_create`` per chunk.
+
+    Authors are deduplicated by name and categories resolved by name through
+    in-memory maps seeded from the database. Books whose ISBN already exists
+    are skipped. Signals are bypassed, so the search index is refreshed per
+    chunk; callers should invalidate cached catalog responses when done.
+    """
+
+    def __init__(self, chunk_size=5000):
+        self.chunk_size = chunk_size
+        self.categories = {
+            category.name: category for category in Category.objects.only("pk", "name")
+        }
+        self.authors = {
+            name: pk for pk, name in Author.objects.values_list("pk", "name")
+        }
+        # Primary keys fixture objects may refer to.
+        self.category_ids = {category.pk for category in self.categories.values()}
+        self.author_ids = set(self.authors.values())
+        self.book_ids = set()
+        # Fixture primary keys that were mapped onto existing rows.
+        self.fixture_categories = {}
+        self.fixture_authors = {}
+        self.fixture_books = {}
+
+        self.new_categories = []
+        self.new_authors = []
+        self.pending_books = []
+        self.pending_links = []
+        self.created = 0
+        self.skipped = 0
+        self.ignored = 0
+        self.analyzed = False
+
+    def resolve_category(self, name, description=""):
+        """Return the category named ``name``; new ones are written on flush."""
+        if name not in self.categories:
+            category = Category(name=name, description=description)
+            self.categories[name] = category
+            self.new_categories.append(category)
+        return self.categories[name]
+
+    def resolve_author(self, name, pk=None, bio=""):
+        if name not in self.authors:
+            author = Author(name=name, bio=bio)
+            if pk is not None:
+                author.pk = pk
+            self.authors[name] = author.pk
+            self.author_ids.add(author.pk)
+            self.new_authors.append(author)
+        return self.authors[name]
+
+    def add(self, raw):
+        """Queue one flat catalog record; raise ``ValueError`` if it is invalid."""
+        record = _clean_record(raw)
+        book = Book(
+            title=record["title"],
+            isbn=record["isbn"],
+            total_copies=record["total_copies"],
+            available_copies=record["available_copies"],
+        )
+        _check_book(book)
+        _check_length(Category, "name", record["category"])
+        for name in record["authors"]:
+            _check_length(Author, "name", name)
+        book.category = self.resolve_category(record["category"])
+        author_ids = [self.resolve_author(name) for name in record["authors"]]
+        self._queue_book(book, author_ids, from_fixture=False)
+
+    def add_fixture(self, item):
+        """Queue one Django fixture object of a catalog model."""
+        model, pk, fields = item["model"], item.get("pk"), item["fields"]
+        uuid = Book._meta.pk.to_python
+        if model == "library.category":
+            self.fixture_categories[pk] = self.resolve_category(
+                fields["name"], fields.get("description", "")
+            )
+        elif model == "library.author":
+            self.fixture_authors[uuid(pk)] = self.resolve_author(
+                fields["name"], uuid(pk), fields.get("bio", "")
+            )
+        elif model == "library.book":
+            book = Book(
+                pk=uuid(pk),
+                title=fields["title"],
+                isbn=fields["isbn"],
+                total_copies=fields["total_copies"],
+                available_copies=fields["available_copies"],
+            )
+            _check_book(book)
+            category = fields["category"]
+            if category in self.fixture_categories:
+                book.category = self.fixture_categories[category]
+            elif category in self.category_ids:
+                book.category_id = category
+            else:
+                raise ValueError(f"book {pk}: category {category} does not exist")
+            author_ids = [
+                self.check_author(uuid(author), f"book {pk}")
+                for author in fields.get("author", [])
+            ]
+            self.book_ids.add(book.pk)
+            self._queue_book(book, author_ids, from_fixture=True)
+        elif model == "library.book_author":
+            book_id = uuid(fields["book"])
+            if book_id not in self.book_ids:
+                if not Book.objects.filter(pk=book_id).exists():
+                    raise ValueError(f"book_author: book {book_id} does not exist")
+                self.book_ids.add(book_id)
+            author_id = self.check_author(uuid(fields["author"]), "book_author")
+            self.pending_links.append((book_id, author_id))
+            if len(self.pending_links) >= self.chunk_size:
+                self.flush()
+        else:
+            self.ignored += 1
+
+    def check_author(self, pk, label):
+        """Map a fixture author pk onto its row; raise if there is none."""
+        author_id = self.fixture_authors.get(pk, pk)
+        if author_id not in self.author_ids:
+            raise ValueError(f"{label}: author {pk} does not exist")
+        return author_id
+
+    def _queue_book(self, book, author_ids, from_fixture):
+        self.pending_books.append((book, author_ids, from_fixture))
+        if len(self.pending_books) >= self.chunk_size:
+            self.flush()
+
+    def analyze(self):
+        # A freshly migrated database has no planner statistics, which turns
+        # the per-chunk search refresh into nested sequential scans.
+        self.analyzed = True
+        if connection.vendor != "postgresql":
+            return
+        tables = [Author._meta.db_table, Book._meta.db_table]
+        tables.append(Book.author.through._meta.db_table)
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+    def flush(self):
+        """Write everything queued so far and return the number of new books."""
+        unique = {}
+        for book, author_ids, from_fixture in self.pending_books:
+            unique.setdefault(book.isbn, (book, author_ids, from_fixture))
+        existing = dict(Book.objects.filter(isbn__in=unique).values_list("isbn", "pk"))
+        books = []
+        links = []
+        for isbn, (book, author_ids, from_fixture) in unique.items():
+            if isbn in existing:
+                if from_fixture:
+                    self.fixture_books[book.pk] = existing[isbn]
+                continue
+            books.append(book)
+            links += [(book.pk, author_id) for author_id in dict.fromkeys(author_ids)]
+        links += [
+            (self.fixture_books.get(book_id, book_id), author_id)
+            for book_id, author_id in self.pending_links
+        ]
+
+        through = Book.author.through
+        with transaction.atomic(savepoint=False):
+            if self.new_categories:
+                Category.objects.bulk_create(self.new_categories)
+                self.category_ids.update(c.pk for c in self.new_categories)
+            if self.new_authors:
+                Author.objects.bulk_create(self.new_authors)
+                refresh_author_search([author.pk for author in self.new_authors])
+            Book.objects.bulk_create(books)
+            through.objects.bulk_create(
+                (
+                    through(book_id=book_id, author_id=author_id)
+                    for book_id, author_id in links
+                ),
+                batch_size=self.chunk_size,
+                ignore_conflicts=True,
+            )
+            if not self.analyzed:
+                self.analyze()
+            refresh_book_search(
+                dict.fromkeys([book.pk for book in books] + [pk for pk, _ in links])
+            )
+
+        self.created += len(books)
+        self.skipped += len(self.pending_books) - len(books)
+        self.new_categories, self.new_authors = [], []
+        self.pending_books, self.pending_links = [], []
+        return len(books)
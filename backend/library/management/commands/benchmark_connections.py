@@ -0,0 +1,103 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+try:
+    import psycopg_pool
+except ImportError:  # pragma: no cover - pooling is optional
+    psycopg_pool = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request latency when every request opens a new database "
+        "connection, with persistent connections, and with Django's connection "
+        "pool (psycopg 3 only). Run it against PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument(
+            "--path",
+            default="/api/v1/authors/?page_size=10",
+            help="Endpoint to request as a superuser.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError(
+                "Connection setup is only worth measuring on PostgreSQL."
+            )
+
+        user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("Create a superuser first.")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        modes = [
+            ("new connection per request", {"CONN_MAX_AGE": 0}),
+            ("persistent connections", {"CONN_MAX_AGE": None}),
+        ]
+        if psycopg_pool is not None and connection.Database.__name__ == "psycopg":
+            pool = {"min_size": 1, "max_size": 1}
+            modes.append(
+                ("connection pool", {"CONN_MAX_AGE": 0, "OPTIONS": {"pool": pool}})
+            )
+        else:
+            self.stdout.write("Skipping the pool: it needs psycopg 3 and psycopg_pool.")
+
+        original = dict(connection.settings_dict)
+        try:
+            for name, overrides in modes:
+                opened = []
+
+                def count(sender, **kwargs):
+                    opened.append(sender)
+
+                connection_created.connect(count)
+                try:
+                    timings = self.measure(client, options, overrides)
+                finally:
+                    connection_created.disconnect(count)
+                timings.sort()
+                self.stdout.write(
+                    f"{name}: mean {statistics.fmean(timings):.2f} ms, "
+                    f"p50 {timings[len(timings) // 2]:.2f} ms, "
+                    f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms "
+                    f"(connection_created sent {len(opened)} times)"
+                )
+        finally:
+            connection.close()
+            connection.close_pool()
+            connection.settings_dict.clear()
+            connection.settings_dict.update(original)
+
+    @staticmethod
+    def measure(client, options, overrides):
+        connection.close()
+        connection.close_pool()
+        connection.settings_dict.update(
+            {**overrides, "OPTIONS": overrides.get("OPTIONS", {})}
+        )
+        for _ in range(5):
+            client.get(options["path"])
+
+        timings = []
+        for _ in range(options["requests"]):
+            started = time.perf_counter()
+            response = client.get(options["path"])
+            # The test client skips what the request_finished signal does in
+            # a real server: close or return the connection unless persistent.
+            close_old_connections()
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{options['path']} returned {response.status_code}")
+        return timings
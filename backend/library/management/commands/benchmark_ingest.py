@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from library.models import Author, Category
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/sec of single-item POST /books/ against POST /books/bulk/. "
+        "Everything runs in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+
+        with transaction.atomic():
+            user = User.objects.create_superuser(
+                email="benchmark-ingest@example.com", password=None
+            )
+            client = APIClient()
+            client.force_authenticate(user)
+            category = Category.objects.create(name="Benchmark")
+            authors = [
+                str(author.pk)
+                for author in Author.objects.bulk_create(
+                    Author(name=f"Benchmark Author {index}") for index in range(5)
+                )
+            ]
+
+            def payload(prefix, index):
+                return {
+                    "title": f"Benchmark Book {index}",
+                    "isbn": f"{prefix}{index:012d}",
+                    "category": category.pk,
+                    "author": authors[: index % len(authors) + 1],
+                    "total_copies": 3,
+                    "available_copies": 3,
+                }
+
+            started = time.perf_counter()
+            for index in range(rows):
+                response = client.post(
+                    reverse("book-list"), payload(1, index), format="json"
+                )
+                assert response.status_code == 201, response.content
+            single = time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = client.post(
+                reverse("book-bulk"),
+                [payload(2, index) for index in range(rows)],
+                format="json",
+            )
+            assert response.status_code == 200, response.content
+            bulk = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"single-item: {rows} rows in {single:.2f}s ({rows / single:.0f} rows/s)"
+        )
+        self.stdout.write(
+            f"bulk:        {rows} rows in {bulk:.2f}s ({rows / bulk:.0f} rows/s)"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Bulk path is {single / bulk:.1f}x faster.")
+        )
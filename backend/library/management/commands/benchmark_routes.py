@@ -0,0 +1,278 @@
+import json
+import statistics
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+from django.utils.regex_helper import normalize
+from rest_framework.test import APIClient
+
+from api.metrics import RequestMetrics
+from library.models import Book, BorrowRecord
+
+User = get_user_model()
+
+PASSWORD = "benchmark-routes-password"
+
+# Query strings benchmarked in addition to the bare route, by URL name.
+QUERY_VARIANTS = {
+    "book-list": [
+        "ordering=-times_borrowed",
+        "expand=author,category",
+        "cursor=&page_size=50",
+    ],
+    "book-borrow-record-list": ["status=Returned", "cursor="],
+    "user-borrow-record-list": ["status=Returned"],
+}
+
+
+def walk(patterns, prefix=""):
+    for pattern in patterns:
+        regex = prefix + pattern.pattern.regex.pattern.lstrip("^")
+        if isinstance(pattern, URLResolver):
+            yield from walk(pattern.url_patterns, regex)
+        else:
+            yield regex, pattern
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every GET route under /api/, including the nested borrow "
+        "record routes, as a JWT-authenticated superuser. Reports p50/p95/p99 "
+        "latency and queries per request; --writes adds borrow and return. "
+        "Runs in a transaction that is rolled back afterwards. Seed data with "
+        "seed_scale first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=30)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--auth-requests",
+            type=int,
+            default=5,
+            help="Token requests to time; each one hashes the password.",
+        )
+        parser.add_argument("--writes", action="store_true")
+        parser.add_argument(
+            "--path",
+            action="append",
+            default=[],
+            help="Extra GET path to benchmark, e.g. '/api/v1/books/?category=3'.",
+        )
+        parser.add_argument("--output", help="Save the results to this JSON file.")
+        parser.add_argument("--compare", help="Results file of an earlier run.")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            help="Fail when a route's p95 grew by more than this fraction.",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        baseline = None
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())["routes"]
+
+        with transaction.atomic():
+            User.objects.create_superuser(
+                email="benchmark-routes@example.com", password=PASSWORD
+            )
+            self.client = APIClient()
+            self.routes = self.discover()
+            self.results = {}
+            self.benchmark_auth()
+            for label, path in self.get_paths():
+                self.results[label] = self.measure("get", path, options["requests"])
+            if options["writes"]:
+                self.benchmark_writes()
+            transaction.set_rollback(True)
+
+        for label, result in self.results.items():
+            self.report(label, result, baseline and baseline.get(label))
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(
+                    {
+                        "created": timezone.now().isoformat(),
+                        "database": connection.vendor,
+                        "routes": self.results,
+                    },
+                    indent=2,
+                )
+            )
+            self.stdout.write(f"Saved results to {options['output']}.")
+        if baseline and options["max_regression"] is not None:
+            self.check_regressions(baseline, options["max_regression"])
+
+    def discover(self):
+        """Map each /api/ route to its URL name, format string and view."""
+        routes = {}
+        for regex, pattern in walk(get_resolver().url_patterns):
+            path, params = normalize(regex)[0]
+            if path.startswith("api/") and "format" not in params:
+                routes.setdefault(path, (pattern.name, params, pattern.callback))
+        return routes
+
+    def get_paths(self):
+        book = Book.objects.order_by("-times_borrowed", "-id").first()
+        if book is None:
+            raise CommandError("No books to benchmark; run seed_scale first.")
+        record = BorrowRecord.objects.filter(book=book).first()
+        parents = {
+            "book_pk": book.pk,
+            "user_pk": record.user_id if record else User.objects.first().pk,
+        }
+
+        for path, (name, params, callback) in self.routes.items():
+            actions = getattr(callback, "actions", None)
+            if actions is not None and "get" not in actions:
+                continue
+            view_class = getattr(callback, "cls", None)
+            if actions is None and not hasattr(view_class, "get"):
+                continue
+
+            values = {param: parents[param] for param in params if param in parents}
+            for param in set(params) - set(values):
+                values[param] = self.sample_pk(view_class, values)
+                if values[param] is None:
+                    self.stdout.write(f"Skipping /{path}: no data for {param}.")
+                    break
+            else:
+                label = "GET /" + path % {param: f"{{{param}}}" for param in params}
+                url = "/" + path % values
+                yield label, url
+                for query in QUERY_VARIANTS.get(name, []):
+                    yield f"{label}?{query}", f"{url}?{query}"
+
+        for path in self.options["path"]:
+            yield f"GET {path}", path
+
+    @staticmethod
+    def sample_pk(view_class, parents):
+        queryset = getattr(view_class, "queryset", None)
+        model = (
+            queryset.model
+            if queryset is not None
+            else view_class.serializer_class.Meta.model
+        )
+        filters = {name.removesuffix("_pk"): value for name, value in parents.items()}
+        return model.objects.filter(**filters).values_list("pk", flat=True).first()
+
+    def path_for(self, url_name, **values):
+        for path, (name, params, callback) in self.routes.items():
+            if name == url_name:
+                return "/" + path % values
+        raise CommandError(f"No route named {url_name}.")
+
+    def benchmark_auth(self):
+        credentials = {"email": "benchmark-routes@example.com", "password": PASSWORD}
+        create = self.path_for("jwt-create")
+        self.results[f"POST {create}"] = self.measure(
+            "post", create, self.options["auth_requests"], credentials, warmup=0
+        )
+        tokens = self.client.post(create, credentials, format="json").json()
+        for url_name, payload in (
+            ("jwt-refresh", {"refresh": tokens["refresh"]}),
+            ("jwt-verify", {"token": tokens["access"]}),
+        ):
+            path = self.path_for(url_name)
+            self.results[f"POST {path}"] = self.measure(
+                "post", path, self.options["requests"], payload
+            )
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {tokens['access']}")
+
+    def benchmark_writes(self):
+        book = Book.objects.order_by("-available_copies", "-id").first()
+        borrow = self.path_for("book-borrow-record-borrow", book_pk=book.pk)
+        borrow_label = "POST /api/v1/books/{book_pk}/borrow-records/borrow/"
+        return_label = "POST /api/v1/books/{book_pk}/borrow-records/{pk}/return/"
+        borrows, returns = [], []
+        for _ in range(self.options["requests"]):
+            response, *sample = self.timed("post", borrow, {})
+            if response.status_code != 201:
+                raise CommandError(f"Borrowing failed: {response.content!r}")
+            borrows.append(sample)
+            path = self.path_for(
+                "book-borrow-record-return", book_pk=book.pk, pk=response.json()["id"]
+            )
+            response, *sample = self.timed("post", path)
+            returns.append(sample)
+        self.results[borrow_label] = self.summarize(borrow, borrows, {201})
+        self.results[return_label] = self.summarize(path, returns, {200})
+
+    def timed(self, method, path, data=None):
+        """Return the response, its latency in ms and its query count."""
+        counter = RequestMetrics()
+        with ExitStack() as stack:
+            for alias_connection in connections.all():
+                stack.enter_context(alias_connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            if method == "get":
+                response = self.client.get(path)
+            else:
+                response = self.client.post(path, data, format="json")
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        return response, elapsed, counter.queries
+
+    def measure(self, method, path, requests, data=None, warmup=None):
+        for _ in range(self.options["warmup"] if warmup is None else warmup):
+            self.timed(method, path, data)
+        samples, statuses = [], set()
+        for _ in range(requests):
+            response, *sample = self.timed(method, path, data)
+            samples.append(sample)
+            statuses.add(response.status_code)
+        return self.summarize(path, samples, statuses)
+
+    @staticmethod
+    def summarize(path, samples, statuses):
+        timings = sorted(elapsed for elapsed, _ in samples)
+        queries = [count for _, count in samples]
+        return {
+            "path": path,
+            "requests": len(samples),
+            "status": sorted(statuses),
+            "p50": round(percentile(timings, 0.50), 3),
+            "p95": round(percentile(timings, 0.95), 3),
+            "p99": round(percentile(timings, 0.99), 3),
+            "queries": statistics.median(queries),
+            "max_queries": max(queries),
+        }
+
+    def report(self, label, result, previous):
+        line = (
+            f"{label}\n    p50 {result['p50']:8.2f} ms  p95 {result['p95']:8.2f} ms  "
+            f"p99 {result['p99']:8.2f} ms  queries {result['queries']:g} "
+            f"(max {result['max_queries']})  status {result['status']}"
+        )
+        if previous:
+            change = (result["p95"] - previous["p95"]) / previous["p95"]
+            line += f"  p95 {change:+.0%} vs baseline"
+        if any(status >= 400 for status in result["status"]):
+            line = self.style.WARNING(line)
+        self.stdout.write(line)
+
+    def check_regressions(self, baseline, max_regression):
+        regressed = [
+            label
+            for label, result in self.results.items()
+            if label in baseline
+            and result["p95"] > baseline[label]["p95"] * (1 + max_regression)
+        ]
+        if regressed:
+            raise CommandError(
+                f"p95 regressed by more than {max_regression:.0%}: "
+                + ", ".join(regressed)
+            )
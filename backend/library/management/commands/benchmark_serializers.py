@@ -0,0 +1,95 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from library.models import Author, Book, BorrowRecord, Category
+from library.renderers import FastJSONRenderer
+from library.serializers import (
+    BookSerializer,
+    BorrowRecordSerializer,
+    ValuesSerializer,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-page CPU time of ModelSerializer output against the "
+        "values() fast read path for books and borrow records. Sample data is "
+        "created in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--rounds", type=int, default=50)
+
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+
+        with transaction.atomic():
+            self.create_sample(page_size)
+            books = Book.objects.order_by("-created_at", "-id")
+            records = BorrowRecord.objects.order_by("-due_date", "-id")
+            cases = [
+                ("books", books.prefetch_related("author"), BookSerializer),
+                ("borrow-records", records, BorrowRecordSerializer),
+            ]
+            for name, queryset, serializer_class in cases:
+                regular = self.measure(
+                    options["rounds"],
+                    lambda: JSONRenderer().render(
+                        serializer_class(queryset[:page_size], many=True).data
+                    ),
+                )
+                values_serializer = ValuesSerializer.for_serializer(serializer_class)
+                fast = self.measure(
+                    options["rounds"],
+                    lambda: FastJSONRenderer().render(
+                        values_serializer.to_representation(
+                            values_serializer.get_values(queryset)[:page_size]
+                        )
+                    ),
+                )
+                self.stdout.write(
+                    f"{name}: ModelSerializer {regular:.2f} ms/page, "
+                    f"fast path {fast:.2f} ms/page ({regular / fast:.1f}x)"
+                )
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def measure(rounds, render):
+        render()
+        started = time.process_time()
+        for _ in range(rounds):
+            render()
+        return (time.process_time() - started) * 1000 / rounds
+
+    def create_sample(self, count):
+        category = Category.objects.create(name="Benchmark")
+        authors = Author.objects.bulk_create(
+            Author(name=f"Benchmark Author {index}") for index in range(5)
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Benchmark Book {index}",
+                isbn=f"BENCH{index:08d}",
+                category=category,
+                total_copies=3,
+                available_copies=3,
+            )
+            for index in range(count)
+        )
+        Book.author.through.objects.bulk_create(
+            Book.author.through(book_id=book.pk, author_id=author.pk)
+            for index, book in enumerate(books)
+            for author in authors[: index % 3 + 1]
+        )
+        user = User.objects.create_user(email="benchmark-serializers@example.com")
+        BorrowRecord.objects.bulk_create(
+            BorrowRecord(book=book, user=user, due_date="2030-01-01") for book in books
+        )
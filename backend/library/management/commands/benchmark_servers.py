@@ -0,0 +1,236 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library.models import Author, Book
+
+from .benchmark_routes import percentile
+
+User = get_user_model()
+
+EMAIL = "benchmark-servers@example.com"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn twice, once with threaded WSGI workers and once with "
+        "ASGI workers and async catalog reads, and drive both with the same "
+        "concurrent keep-alive load. Reports throughput and p50/p95/p99. "
+        "Uses the configured database and cache; seed it with seed_scale "
+        "first, and set a shared cache_backend for more than one worker. The "
+        "load generator is a Python process too, so run it on its own cores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            action="append",
+            choices=["wsgi", "asgi"],
+            help="Server to benchmark; repeat for both (the default).",
+        )
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--warmup", type=float, default=2.0)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument(
+            "--threads", type=int, default=8, help="Threads per WSGI worker."
+        )
+        parser.add_argument(
+            "--pool-size", type=int, default=10, help="Connections per ASGI worker."
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            default=[],
+            help="GET path to request instead of the default catalog mix.",
+        )
+        parser.add_argument("--output", help="Save the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        book = Book.objects.order_by("-times_borrowed", "-id").first()
+        author = Author.objects.first()
+        if book is None or author is None:
+            raise CommandError("No books to benchmark; run seed_scale first.")
+
+        user = User.objects.create_user(email=EMAIL)
+        try:
+            token = str(AccessToken.for_user(user))
+            self.headers = {"Authorization": f"JWT {token}"}
+            self.paths = options["path"] or [
+                "/api/v1/books/",
+                "/api/v1/books/?page=2&page_size=50",
+                f"/api/v1/books/{book.pk}/",
+                "/api/v1/authors/",
+                f"/api/v1/authors/{author.pk}/",
+                "/api/v1/categories/",
+            ]
+            results = {}
+            for mode in options["mode"] or ["wsgi", "asgi"]:
+                results[mode] = self.benchmark(mode)
+                self.report(mode, results[mode])
+        finally:
+            user.delete()
+
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(
+                    {
+                        "created": timezone.now().isoformat(),
+                        "concurrency": options["concurrency"],
+                        "paths": self.paths,
+                        "servers": results,
+                    },
+                    indent=2,
+                )
+            )
+            self.stdout.write(f"Saved results to {options['output']}.")
+
+    def server_env(self, mode, port):
+        options = self.options
+        env = {
+            **os.environ,
+            "gunicorn_bind": f"127.0.0.1:{port}",
+            "gunicorn_workers": str(options["workers"]),
+            # Recycling a worker mid-run would show up as a latency spike.
+            "gunicorn_max_requests": "0",
+        }
+        if mode == "asgi":
+            env.update(
+                gunicorn_asgi="True",
+                async_reads="True",
+                db_pool_max_size=str(options["pool_size"]),
+            )
+        else:
+            env.update(
+                gunicorn_asgi="False",
+                async_reads="False",
+                gunicorn_threads=str(options["threads"]),
+            )
+        return env
+
+    def benchmark(self, mode):
+        port = free_port()
+        # A file rather than a pipe: a full pipe would block the server.
+        log = tempfile.TemporaryFile()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn"],
+            cwd=settings.BASE_DIR,
+            env=self.server_env(mode, port),
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            self.wait_until_ready(server, port, log)
+            self.load(port, self.options["warmup"])
+            return self.load(port, self.options["duration"])
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+            log.close()
+
+    def wait_until_ready(self, server, port, log, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                output = log.read().decode(errors="replace")
+                raise CommandError(f"gunicorn exited:\n{output[-2000:]}")
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                connection.request("GET", self.paths[0], headers=self.headers)
+                connection.getresponse().read()
+                connection.close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"gunicorn did not answer on port {port}.")
+
+    def load(self, port, duration):
+        """Run ``concurrency`` keep-alive clients for ``duration`` seconds."""
+        deadline = time.monotonic() + duration
+        timings, statuses, errors = [], {}, []
+        lock = threading.Lock()
+
+        def client(offset):
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            own_timings, own_statuses, index = [], {}, offset
+            while time.monotonic() < deadline:
+                path = self.paths[index % len(self.paths)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    connection.request("GET", path, headers=self.headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as error:
+                    with lock:
+                        errors.append(repr(error))
+                    connection.close()
+                    continue
+                own_timings.append((time.perf_counter() - started) * 1000)
+                own_statuses[response.status] = own_statuses.get(response.status, 0) + 1
+            connection.close()
+            with lock:
+                timings.extend(own_timings)
+                for status, count in own_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+
+        started = time.monotonic()
+        clients = [
+            threading.Thread(target=client, args=(offset,))
+            for offset in range(self.options["concurrency"])
+        ]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        timings.sort()
+        if not timings:
+            raise CommandError(f"No request succeeded: {errors[:3]}")
+        return {
+            "requests": len(timings),
+            "errors": len(errors),
+            "status": {
+                str(status): count for status, count in sorted(statuses.items())
+            },
+            "throughput": round(len(timings) / elapsed, 1),
+            "p50": round(percentile(timings, 0.50), 3),
+            "p95": round(percentile(timings, 0.95), 3),
+            "p99": round(percentile(timings, 0.99), 3),
+        }
+
+    def report(self, mode, result):
+        line = (
+            f"{mode}: {result['throughput']:8.1f} req/s  p50 {result['p50']:8.2f} ms  "
+            f"p95 {result['p95']:8.2f} ms  p99 {result['p99']:8.2f} ms  "
+            f"status {result['status']}  errors {result['errors']}"
+        )
+        if result["errors"] or any(int(status) >= 400 for status in result["status"]):
+            line = self.style.WARNING(line)
+        self.stdout.write(line)
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.services import expire_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire ready holds that were not picked up in time and pass their "
+        "copies on to the next member in the queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of holds expired per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches to limit load.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        started = time.monotonic()
+
+        def report(total):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {total} holds expired so far")
+
+        total = expire_reservations(
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            on_batch=report,
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Expired {total} holds in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,104 @@
+import sys
+import time
+from itertools import chain
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library.cache import invalidate_related
+from library.importers import READERS, CatalogImporter
+
+EXTENSIONS = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+    ".mrk": "mrk",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream books into the catalog from JSON, NDJSON, CSV or MARC-like "
+        "(.mrk) files, or from Django fixtures of the library models."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="Input format; guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of books written per bulk insert.",
+        )
+        parser.add_argument(
+            "--single-transaction",
+            action="store_true",
+            help="Roll back everything on error instead of keeping committed chunks.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or EXTENSIONS.get(Path(path).suffix.lower())
+        if file_format is None:
+            raise CommandError("Cannot guess the input format; pass --format.")
+
+        started = time.monotonic()
+        if options["single_transaction"]:
+            with transaction.atomic():
+                importer = self.run(path, file_format, options, started)
+        else:
+            importer = self.run(path, file_format, options, started)
+        transaction.on_commit(invalidate_related)
+
+        elapsed = time.monotonic() - started
+        rate = importer.created / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {importer.created} books ({importer.skipped} skipped, "
+                f"{importer.ignored} unsupported objects) in {elapsed:.2f}s "
+                f"({rate:.0f} rows/s)."
+            )
+        )
+
+    def run(self, path, file_format, options, started):
+        importer = CatalogImporter(chunk_size=options["chunk_size"])
+        stream = (
+            self.stdin_stream()
+            if path == "-"
+            else open(path, encoding="utf-8", newline="")
+        )
+        with stream:
+            items = READERS[file_format](stream)
+            try:
+                first = next(items, None)
+                if first is None:
+                    return importer
+                add = importer.add_fixture if "model" in first else importer.add
+                for number, item in enumerate(chain([first], items), start=1):
+                    try:
+                        add(item)
+                    except KeyError as exc:
+                        raise CommandError(f"Item {number}: missing field {exc}")
+                    except (TypeError, ValueError) as exc:
+                        raise CommandError(f"Item {number}: {exc}")
+                    if number % options["chunk_size"] == 0 and options["verbosity"] > 1:
+                        elapsed = time.monotonic() - started
+                        self.stdout.write(
+                            f"  {number} items read, {importer.created} books "
+                            f"written ({number / elapsed:.0f} items/s)"
+                        )
+            except ValueError as exc:
+                raise CommandError(f"Cannot parse {path}: {exc}")
+            importer.flush()
+        return importer
+
+    @staticmethod
+    def stdin_stream():
+        return open(sys.stdin.fileno(), encoding="utf-8", newline="", closefd=False)
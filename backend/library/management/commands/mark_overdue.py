@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.services import mark_overdue_records
+
+
+class Command(BaseCommand):
+    help = "Mark active borrow records past their due date as overdue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of records updated per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches to limit load.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        started = time.monotonic()
+
+        def report(total):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {total} records marked overdue so far")
+
+        total = mark_overdue_records(
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            on_batch=report,
+        )
+
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Marked {total} records overdue in {elapsed:.2f}s "
+                f"({rate:.0f} rows/s)."
+            )
+        )
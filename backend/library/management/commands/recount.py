@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.services import recount_loans
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized loan counters on books and users from the "
+        "borrow records, fixing any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of rows updated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        started = time.monotonic()
+        books, users = recount_loans(batch_size=options["batch_size"])
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fixed loan counters on {books} books and {users} users "
+                f"in {elapsed:.2f}s."
+            )
+        )
@@ -0,0 +1,340 @@
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, batched
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from django.utils import timezone
+
+from library.cache import invalidate_books, invalidate_related
+from library.models import Author, Book, BorrowRecord, Category
+from library.search import refresh_author_search, refresh_book_search
+from library.services import recount_loans
+from reports.rollups import rebuild_rollups
+
+User = get_user_model()
+
+GENRES = [
+    "Fiction",
+    "Mystery",
+    "Science Fiction",
+    "Fantasy",
+    "History",
+    "Biography",
+    "Poetry",
+    "Philosophy",
+    "Science",
+    "Travel",
+    "Cooking",
+    "Art",
+    "Children",
+    "Romance",
+    "Horror",
+    "Economics",
+]
+FIRST_NAMES = [
+    "Ada",
+    "Alan",
+    "Chinua",
+    "Clarice",
+    "Doris",
+    "Gabriel",
+    "Haruki",
+    "Isabel",
+    "Jorge",
+    "Kazuo",
+    "Leo",
+    "Margaret",
+    "Naguib",
+    "Octavia",
+    "Toni",
+    "Ursula",
+    "Virginia",
+    "Wole",
+]
+LAST_NAMES = [
+    "Achebe",
+    "Atwood",
+    "Borges",
+    "Butler",
+    "Ishiguro",
+    "Lessing",
+    "Lispector",
+    "Mahfouz",
+    "Marquez",
+    "Morrison",
+    "Murakami",
+    "Allende",
+    "Soyinka",
+    "Tolstoy",
+    "Woolf",
+    "Le Guin",
+]
+TITLE_WORDS = [
+    "Silent",
+    "River",
+    "Night",
+    "Garden",
+    "Empire",
+    "Memory",
+    "Stone",
+    "Light",
+    "House",
+    "Winter",
+    "Secret",
+    "City",
+    "Shadow",
+    "Sea",
+    "Letters",
+    "Machine",
+    "Fire",
+    "Island",
+    "Names",
+    "Road",
+]
+
+
+def zipf_weights(count, skew, rng):
+    """Cumulative Zipf weights over ``count`` items in a shuffled rank order."""
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(accumulate(1 / rank**skew for rank in ranks))
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk inserts set ``auto_now_add`` fields to historical values."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with a large synthetic catalog for load tests: "
+        "authors, categories, books with authors, users, and borrow records "
+        "whose book popularity follows a Zipf distribution. The same --seed "
+        "produces the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--authors", type=int, default=2000)
+        parser.add_argument("--categories", type=int, default=40)
+        parser.add_argument("--books", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--borrow-records", type=int, default=500000)
+        parser.add_argument(
+            "--days", type=int, default=730, help="Length of the loan history."
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of book popularity; 0 makes every book equal.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--skip-rollups",
+            action="store_true",
+            help="Do not rebuild the daily report rollups afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        if Book.objects.exists():
+            raise CommandError("seed_scale fills an empty catalog; books exist.")
+        if options["books"] and not (options["categories"] and options["authors"]):
+            raise CommandError("Books need at least one category and one author.")
+
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.batch_size = options["batch_size"]
+        started = time.monotonic()
+
+        with explicit_timestamps(
+            Book._meta.get_field("created_at"),
+            BorrowRecord._meta.get_field("borrow_date"),
+        ):
+            categories = self.create_categories(options["categories"])
+            authors = self.create_authors(options["authors"])
+            books = self.create_books(options, categories, authors)
+            users = self.create_users(options["users"])
+            self.create_borrow_records(options, books, users)
+
+        recount_loans(batch_size=self.batch_size)
+        Book.objects.update(available_copies=F("total_copies") - F("active_loans"))
+        invalidate_books()
+        invalidate_related()
+        if not options["skip_rollups"]:
+            days = rebuild_rollups()
+            self.stdout.write(f"Rolled up {days} days of circulation.")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded the catalog in {time.monotonic() - started:.1f}s."
+            )
+        )
+
+    def new_id(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def insert(self, label, model, objects, total, after_batch=None):
+        inserted = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch)
+            if after_batch is not None:
+                after_batch(batch)
+            inserted += len(batch)
+            if inserted % (self.batch_size * 20) == 0 or inserted == total:
+                self.stdout.write(f"{label}: {inserted}/{total}")
+
+    def create_categories(self, count):
+        categories = [
+            Category(
+                name=GENRES[index % len(GENRES)]
+                + (f" {index // len(GENRES) + 1}" if index >= len(GENRES) else "")
+            )
+            for index in range(count)
+        ]
+        Category.objects.bulk_create(categories)
+        self.stdout.write(f"categories: {count}/{count}")
+        return [category.pk for category in categories]
+
+    def create_authors(self, count):
+        authors = [
+            Author(
+                id=self.new_id(),
+                name=f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}",
+            )
+            for _ in range(count)
+        ]
+        self.insert(
+            "authors",
+            Author,
+            authors,
+            count,
+            lambda batch: refresh_author_search(author.pk for author in batch),
+        )
+        return [author.pk for author in authors]
+
+    def create_books(self, options, categories, authors):
+        rng, count = self.rng, options["books"]
+        category_weights = zipf_weights(len(categories), 0.8, rng)
+        history = timedelta(days=options["days"])
+        books = []
+
+        def generate():
+            for index in range(count):
+                total_copies = rng.choice((1, 1, 2, 2, 3, 5))
+                created_at = self.now - history * rng.random()
+                books.append((self.new_id(), total_copies, created_at))
+                title = " ".join(rng.sample(TITLE_WORDS, rng.randint(2, 4)))
+                yield Book(
+                    id=books[-1][0],
+                    title=title.capitalize(),
+                    isbn=f"978{index:010d}",
+                    category_id=rng.choices(categories, cum_weights=category_weights)[
+                        0
+                    ],
+                    total_copies=total_copies,
+                    available_copies=total_copies,
+                    created_at=created_at,
+                )
+
+        def add_authors(batch):
+            Book.author.through.objects.bulk_create(
+                Book.author.through(book_id=book.pk, author_id=author_id)
+                for book in batch
+                for author_id in rng.sample(
+                    authors, min(len(authors), rng.randint(1, 3))
+                )
+            )
+            refresh_book_search(book.pk for book in batch)
+
+        self.insert("books", Book, generate(), count, add_authors)
+        return books
+
+    def create_users(self, count):
+        # An unusable password; hashing a real one per user would dominate.
+        password = make_password(None)
+        users = [
+            User(
+                id=self.new_id(),
+                email=f"reader{index}@example.com",
+                password=password,
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+            )
+            for index in range(count)
+        ]
+        member_group = Group.objects.filter(name="Member").first()
+
+        def add_group(batch):
+            if member_group is not None:
+                User.groups.through.objects.bulk_create(
+                    User.groups.through(user_id=user.pk, group_id=member_group.pk)
+                    for user in batch
+                )
+
+        self.insert("users", User, users, count, add_group)
+        return [user.pk for user in users]
+
+    def create_borrow_records(self, options, books, users):
+        rng, count = self.rng, options["borrow_records"]
+        if not books or not users:
+            return
+        book_weights = zipf_weights(len(books), options["skew"], rng)
+        user_weights = zipf_weights(len(users), options["skew"] / 2, rng)
+        loan_period = timedelta(days=settings.LIBRARY_LOAN_PERIOD_DAYS)
+        user_limit = settings.LIBRARY_LOAN_LIMITS.get("Member") or 5
+        book_loans, user_loans = {}, {}
+        today = timezone.localdate()
+
+        def generate():
+            for _ in range(count):
+                book_id, total_copies, created_at = rng.choices(
+                    books, cum_weights=book_weights
+                )[0]
+                user_id = rng.choices(users, cum_weights=user_weights)[0]
+                borrow_date = created_at + (self.now - created_at) * rng.random()
+                record = BorrowRecord(
+                    id=self.new_id(),
+                    book_id=book_id,
+                    user_id=user_id,
+                    borrow_date=borrow_date,
+                    due_date=timezone.localdate(borrow_date + loan_period),
+                )
+                # Loans from the last two loan periods may still be open, as
+                # long as the book has a copy left and the user is under limit.
+                still_open = (
+                    self.now - borrow_date < loan_period * 2
+                    and rng.random() < 0.6
+                    and book_loans.get(book_id, 0) < total_copies
+                    and user_loans.get(user_id, 0) < user_limit
+                )
+                if still_open:
+                    book_loans[book_id] = book_loans.get(book_id, 0) + 1
+                    user_loans[user_id] = user_loans.get(user_id, 0) + 1
+                    record.status = (
+                        BorrowRecord.OVERDUE
+                        if record.due_date < today
+                        else BorrowRecord.ACTIVE
+                    )
+                else:
+                    returned = borrow_date + timedelta(days=rng.uniform(1, 21))
+                    record.return_date = min(returned, self.now)
+                    record.status = BorrowRecord.RETURNED
+                yield record
+
+        self.insert("borrow records", BorrowRecord, generate(), count)
@@ -0,0 +1,70 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="book",
+            options={"ordering": ["-created_at", "-id"]},
+        ),
+        migrations.AlterModelOptions(
+            name="borrowrecord",
+            options={"ordering": ["-borrow_date", "-id"]},
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["-created_at", "-id"], name="book_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="book_category_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                fields=["book", "-borrow_date", "-id"], name="borrow_book_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                fields=["user", "-borrow_date", "-id"], name="borrow_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                fields=["user", "status", "-borrow_date"], name="borrow_user_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                fields=["status", "due_date"], name="borrow_status_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(fields=["due_date"], name="borrow_due_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                condition=models.Q(("status__in", ["Active", "Overdue"])),
+                fields=["due_date"],
+                name="borrow_open_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:05
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX book_search_vector_idx ON library_book USING gin (search_vector)",
+    "CREATE INDEX author_search_vector_idx ON library_author "
+    "USING gin (search_vector)",
+    "UPDATE library_author SET search_vector = to_tsvector('english', name)",
+    "UPDATE library_book b SET search_vector = "
+    "setweight(to_tsvector('english', b.title), 'A') || "
+    "setweight(to_tsvector('english', COALESCE(("
+    "SELECT string_agg(a.name, ' ') FROM library_book_author ba "
+    "JOIN library_author a ON a.id = ba.author_id "
+    "WHERE ba.book_id = b.id), '')), 'B')",
+]
+
+POSTGRES_TRIGRAM_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX book_title_trgm_idx ON library_book "
+    "USING gin (title gin_trgm_ops)",
+    "CREATE INDEX author_name_trgm_idx ON library_author "
+    "USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS author_name_trgm_idx",
+    "DROP INDEX IF EXISTS book_title_trgm_idx",
+    "DROP INDEX IF EXISTS author_search_vector_idx",
+    "DROP INDEX IF EXISTS book_search_vector_idx",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE library_book_fts USING fts5("
+    "book_id UNINDEXED, title, authors, tokenize = 'porter unicode61')",
+    "CREATE VIRTUAL TABLE library_author_fts USING fts5("
+    "author_id UNINDEXED, name, tokenize = 'porter unicode61')",
+    "INSERT INTO library_author_fts (author_id, name) "
+    "SELECT id, name FROM library_author",
+    "INSERT INTO library_book_fts (book_id, title, authors) "
+    "SELECT b.id, b.title, COALESCE(("
+    "SELECT group_concat(a.name, ' ') FROM library_book_author ba "
+    "JOIN library_author a ON a.id = ba.author_id "
+    "WHERE ba.book_id = b.id), '') FROM library_book b",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS library_author_fts",
+    "DROP TABLE IF EXISTS library_book_fts",
+]
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _execute(schema_editor, POSTGRES_FORWARD)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+            )
+            has_trigram = cursor.fetchone() is not None
+        if has_trigram:
+            _execute(schema_editor, POSTGRES_TRIGRAM_FORWARD)
+    elif vendor == "sqlite":
+        _execute(schema_editor, SQLITE_FORWARD)
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _execute(schema_editor, POSTGRES_BACKWARD)
+    elif vendor == "sqlite":
+        _execute(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0002_borrow_and_book_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="author",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_structures, drop_search_structures),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0003_search_vectors"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="borrowrecord",
+            name="borrow_due_idx",
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(fields=["-due_date", "-id"], name="borrow_due_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                fields=["book", "-due_date", "-id"], name="borrow_book_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                fields=["user", "-due_date", "-id"], name="borrow_user_due_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+OPEN_STATUSES = ["Active", "Overdue"]
+
+
+def loan_count(BorrowRecord, field, **filters):
+    counts = (
+        BorrowRecord.objects.filter(**{field: OuterRef("pk")}, **filters)
+        .order_by()
+        .values(field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    BorrowRecord = apps.get_model("library", "BorrowRecord")
+    User = apps.get_model("accounts", "User")
+    Book.objects.update(
+        times_borrowed=loan_count(BorrowRecord, "book"),
+        active_loans=loan_count(BorrowRecord, "book", status__in=OPEN_STATUSES),
+    )
+    User.objects.update(
+        active_loans=loan_count(BorrowRecord, "user", status__in=OPEN_STATUSES)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_user_active_loans"),
+        ("library", "0005_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="active_loans",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="times_borrowed",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["-times_borrowed", "-id"], name="book_popularity_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
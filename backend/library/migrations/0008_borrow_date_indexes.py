@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0007_reservation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(fields=["borrow_date"], name="borrow_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrecord",
+            index=models.Index(
+                condition=models.Q(("return_date__isnull", False)),
+                fields=["return_date"],
+                name="borrow_return_date_idx",
+            ),
+        ),
+    ]
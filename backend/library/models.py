@@ -1,6 +1,7 @@
 from uuid import uuid4
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 
 User = get_user_model()
 
@@ -9,7 +10,9 @@ class Author(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     name = models.CharField(max_length=200)
     bio = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self) -> str:
         return self.name
@@ -18,6 +21,7 @@ class Author(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -34,8 +38,23 @@ class Book(models.Model):
     )
     total_copies = models.PositiveIntegerField()
     available_copies = models.PositiveIntegerField()
+    # Maintained by library.services; repaired by the recount command.
+    times_borrowed = models.PositiveIntegerField(default=0, editable=False)
+    active_loans = models.PositiveIntegerField(default=0, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="book_created_idx"),
+            models.Index(fields=["-times_borrowed", "-id"], name="book_popularity_idx"),
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="book_category_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -63,3 +82,102 @@ class BorrowRecord(models.Model):
     due_date = models.DateField()
     return_date = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=ACTIVE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-borrow_date", "-id"]
+        indexes = [
+            models.Index(
+                fields=["book", "-borrow_date", "-id"], name="borrow_book_date_idx"
+            ),
+            models.Index(
+                fields=["user", "-borrow_date", "-id"], name="borrow_user_date_idx"
+            ),
+            models.Index(
+                fields=["user", "status", "-borrow_date"],
+                name="borrow_user_status_idx",
+            ),
+            models.Index(fields=["status", "due_date"], name="borrow_status_due_idx"),
+            models.Index(fields=["-due_date", "-id"], name="borrow_due_idx"),
+            models.Index(
+                fields=["book", "-due_date", "-id"], name="borrow_book_due_idx"
+            ),
+            models.Index(
+                fields=["user", "-due_date", "-id"], name="borrow_user_due_idx"
+            ),
+            models.Index(
+                fields=["due_date"],
+                name="borrow_open_due_idx",
+                condition=models.Q(status__in=["Active", "Overdue"]),
+            ),
+            # Date-range scans of the reporting rollups.
+            models.Index(fields=["borrow_date"], name="borrow_date_idx"),
+            models.Index(
+                fields=["return_date"],
+                name="borrow_return_date_idx",
+                condition=models.Q(return_date__isnull=False),
+            ),
+        ]
+
+
+class Reservation(models.Model):
+    """A member's place in the hold queue of a book.
+
+    Holds wait in ``created_at`` order. When a copy comes back it is set
+    aside for the oldest waiting hold, which becomes ``Ready`` until it is
+    borrowed, cancelled or expires.
+    """
+
+    WAITING = "Waiting"
+    READY = "Ready"
+    FULFILLED = "Fulfilled"
+    CANCELLED = "Cancelled"
+    EXPIRED = "Expired"
+
+    STATUS_CHOICES = [
+        (WAITING, "Waiting"),
+        (READY, "Ready"),
+        (FULFILLED, "Fulfilled"),
+        (CANCELLED, "Cancelled"),
+        (EXPIRED, "Expired"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="reservations"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="reservations"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            # Queue head lookups and position counts only touch waiting holds.
+            models.Index(
+                fields=["book", "created_at", "id"],
+                name="reservation_queue_idx",
+                condition=models.Q(status="Waiting"),
+            ),
+            models.Index(
+                fields=["expires_at"],
+                name="reservation_ready_expiry_idx",
+                condition=models.Q(status="Ready"),
+            ),
+            models.Index(fields=["user", "-created_at"], name="reservation_user_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "user"],
+                condition=models.Q(status__in=["Waiting", "Ready"]),
+                name="reservation_one_open_per_member",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.book} ({self.status})"
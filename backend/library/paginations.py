@@ -1,7 +1,190 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def approximate_count(queryset):
+    """Estimate the size of ``queryset`` from planner statistics.
+
+    Returns ``None`` when the database cannot provide an estimate cheaply.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a unique ordering, without COUNT or OFFSET.
+
+    Each page is fetched with a ``WHERE (ordering) < (last row)`` predicate,
+    bounded on the first column, so deep pages cost the same as the first
+    one, provided an index matches ``ordering``. The order is fixed, so
+    cursors cannot be combined with a requested ordering or search ranking.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    approximate_count_query_param = "approximate_count"
+    ordering = ("-created_at", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.count = None
+        if request.query_params.get(self.approximate_count_query_param) == "true":
+            self.count = approximate_count(queryset)
+
+        if queryset.query.order_by:
+            raise ValidationError(
+                {
+                    self.cursor_query_param: [
+                        "Cannot be combined with ordering or search."
+                    ]
+                }
+            )
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.build_filter(position))
+
+        results = list(queryset[: self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_fields(self):
+        return [field.lstrip("-") for field in self.ordering]
+
+    def build_filter(self, position):
+        """Match the rows after ``position`` in ``ordering``.
+
+        ``(a, b) < (x, y)`` is expanded to ``a < x OR (a = x AND b < y)``
+        (``>`` for ascending columns), with ``a <= x`` added so the index is
+        searched, not scanned.
+        """
+        fields = self.get_fields()
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            clause = Q(**{f"{name}__{lookup}": position[index]})
+            for previous, value in zip(fields[:index], position):
+                clause &= Q(**{previous: value})
+            condition |= clause
+        return Q(**{f"{fields[0]}__{bound}": position[0]}) & condition
+
+    @staticmethod
+    def encode_value(value):
+        # Keep full microsecond precision; DjangoJSONEncoder truncates it,
+        # which would make the cursor skip rows.
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
+
+    def encode_cursor(self, instance):
+        if isinstance(instance, dict):
+            values = [instance[name] for name in self.get_fields()]
+        else:
+            values = [getattr(instance, name) for name in self.get_fields()]
+        payload = json.dumps(values, default=self.encode_value).encode()
+        return urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            fields = [model._meta.get_field(name) for name in self.get_fields()]
+            if len(values) != len(fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound("Invalid cursor")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "next": self.get_next_link(),
+                "results": data,
+            }
+        )
+
+
+class BorrowRecordKeysetPagination(KeysetPagination):
+    ordering = ("-due_date", "-id")
 
 
 class DefaultPagination(PageNumberPagination):
+    """Page-number pagination that switches to keyset pagination on request.
+
+    Passing ``?cursor=`` (empty for the first page) to a view that declares a
+    ``keyset_pagination_class`` skips the COUNT/OFFSET queries entirely.
+    """
+
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+
+    keyset = None
+
+    def get_keyset_class(self, request, view):
+        keyset_class = getattr(view, "keyset_pagination_class", None)
+        if keyset_class and keyset_class.cursor_query_param in request.query_params:
+            return keyset_class
+        return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset_class = self.get_keyset_class(request, view)
+        if keyset_class is not None:
+            self.keyset = keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
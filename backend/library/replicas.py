@@ -0,0 +1,130 @@
+"""Route safe reads to read replicas.
+
+Reads only go to a replica inside a request that opted in through
+:class:`~library.mixins.ReplicaReadMixin`. Everything else, including any
+read after the request has written and every query inside a transaction,
+stays on the primary. After a user writes, their reads stay on the primary
+for ``LIBRARY_REPLICA_STICKY_SECONDS`` so they see their own changes despite
+replication lag. That window is kept in the cache, which must therefore be
+shared by all worker processes; the settings refuse a process-local one.
+"""
+
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@dataclass
+class ReplicaState:
+    use_replica: bool = False
+    replica: str | None = None
+    wrote: bool = False
+
+
+_state = ContextVar("replica_state", default=None)
+
+
+def sticky_key(user_pk):
+    return f"library:replica-sticky:{user_pk}"
+
+
+def recently_wrote(user):
+    return user.is_authenticated and cache.get(sticky_key(user.pk)) is not None
+
+
+def read_from_replica(request):
+    """Let the rest of the current request read from a replica, if any."""
+    state = _state.get()
+    if state is None or state.wrote or not settings.LIBRARY_REPLICAS:
+        return
+    if recently_wrote(request.user):
+        return
+    state.use_replica = True
+
+
+def read_from_primary():
+    """Send the rest of the current request's reads back to the primary."""
+    state = _state.get()
+    if state is not None:
+        state.use_replica = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is None
+            or not state.use_replica
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            # One replica per request keeps its reads consistent.
+            state.replica = random.choice(settings.LIBRARY_REPLICAS)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+class ReplicaMiddleware:
+    """Track replica use per request and start the sticky window on writes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _state.set(ReplicaState())
+        try:
+            response = self.get_response(request)
+        finally:
+            state = _state.get()
+            _state.reset(token)
+        user = self.sticky_user(request, state)
+        if user is not None:
+            cache.set(
+                sticky_key(user.pk), True, settings.LIBRARY_REPLICA_STICKY_SECONDS
+            )
+        return response
+
+    async def __acall__(self, request):
+        token = _state.set(ReplicaState())
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = _state.get()
+            _state.reset(token)
+        user = self.sticky_user(request, state)
+        if user is not None:
+            await cache.aset(
+                sticky_key(user.pk), True, settings.LIBRARY_REPLICA_STICKY_SECONDS
+            )
+        return response
+
+    @staticmethod
+    def sticky_user(request, state):
+        """The user whose reads must stay on the primary after this request."""
+        user = getattr(request, "user", None)
+        if state.wrote and user is not None and user.is_authenticated:
+            return user
+        return None
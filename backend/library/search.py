@@ -0,0 +1,187 @@
+"""Full-text search for books and authors.
+
+On PostgreSQL the maintained ``search_vector`` columns are matched with
+``websearch_to_tsquery`` through a GIN index, and when the ``pg_trgm``
+extension is installed titles/names are also matched by trigram similarity
+so small typos still find results. On SQLite (DEBUG) the same hooks keep
+FTS5 shadow tables in sync instead.
+"""
+
+import re
+from functools import lru_cache
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, StringAgg, Subquery, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .models import Author, Book
+
+SEARCH_CONFIG = "english"
+
+BOOK_FTS_TABLE = "library_book_fts"
+AUTHOR_FTS_TABLE = "library_author_fts"
+
+# SQLite caps the number of bound parameters per statement.
+SQLITE_BATCH_SIZE = 500
+
+
+@lru_cache(maxsize=None)
+def _has_trigram():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def _author_names():
+    through = Book.author.through
+    names = (
+        through.objects.filter(book_id=OuterRef("pk"))
+        .values("book_id")
+        .annotate(names=StringAgg("author__name", delimiter=Value(" ")))
+        .values("names")
+    )
+    return Coalesce(Subquery(names), Value(""), output_field=TextField())
+
+
+def _sqlite_execute(sql, ids):
+    ids = [pk.hex if hasattr(pk, "hex") else pk for pk in ids]
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), SQLITE_BATCH_SIZE):
+            batch = ids[start : start + SQLITE_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(sql.format(placeholders=placeholders), batch)
+
+
+def refresh_book_search(book_ids):
+    """Recompute the search document (title + author names) of the given books."""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+
+    if connection.vendor == "postgresql":
+        Book.objects.filter(pk__in=book_ids).update(
+            search_vector=SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector(_author_names(), weight="B", config=SEARCH_CONFIG)
+        )
+    elif connection.vendor == "sqlite":
+        book_table = Book._meta.db_table
+        author_table = Author._meta.db_table
+        through_table = Book.author.through._meta.db_table
+        _sqlite_execute(
+            f"DELETE FROM {BOOK_FTS_TABLE} WHERE book_id IN ({{placeholders}})",
+            book_ids,
+        )
+        _sqlite_execute(
+            f"INSERT INTO {BOOK_FTS_TABLE} (book_id, title, authors) "
+            f"SELECT b.id, b.title, COALESCE(("
+            f"SELECT group_concat(a.name, ' ') FROM {through_table} ba "
+            f"JOIN {author_table} a ON a.id = ba.author_id "
+            f"WHERE ba.book_id = b.id), '') "
+            f"FROM {book_table} b WHERE b.id IN ({{placeholders}})",
+            book_ids,
+        )
+
+
+def refresh_author_search(author_ids):
+    """Recompute the search document of the given authors."""
+    author_ids = list(author_ids)
+    if not author_ids:
+        return
+
+    if connection.vendor == "postgresql":
+        Author.objects.filter(pk__in=author_ids).update(
+            search_vector=SearchVector("name", config=SEARCH_CONFIG)
+        )
+    elif connection.vendor == "sqlite":
+        _sqlite_execute(
+            f"DELETE FROM {AUTHOR_FTS_TABLE} WHERE author_id IN ({{placeholders}})",
+            author_ids,
+        )
+        _sqlite_execute(
+            f"INSERT INTO {AUTHOR_FTS_TABLE} (author_id, name) "
+            f"SELECT id, name FROM {Author._meta.db_table} "
+            f"WHERE id IN ({{placeholders}})",
+            author_ids,
+        )
+
+
+def forget_book_search(book_ids):
+    """Drop deleted books from the SQLite index; PostgreSQL needs nothing."""
+    if connection.vendor == "sqlite":
+        _sqlite_execute(
+            f"DELETE FROM {BOOK_FTS_TABLE} WHERE book_id IN ({{placeholders}})",
+            book_ids,
+        )
+
+
+def forget_author_search(author_ids):
+    """Drop deleted authors from the SQLite index; PostgreSQL needs nothing."""
+    if connection.vendor == "sqlite":
+        _sqlite_execute(
+            f"DELETE FROM {AUTHOR_FTS_TABLE} WHERE author_id IN ({{placeholders}})",
+            author_ids,
+        )
+
+
+def _fts5_query(term):
+    tokens = re.findall(r"\w+", term)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _search(queryset, term, text_field, fts_table, key_column, weights):
+    term = term.strip()
+    if not term:
+        return queryset
+
+    if connection.vendor == "postgresql":
+        query = SearchQuery(term, search_type="websearch", config=SEARCH_CONFIG)
+        match = Q(search_vector=query)
+        rank = SearchRank(F("search_vector"), query)
+        if _has_trigram():
+            match |= Q(**{f"{text_field}__trigram_similar": term})
+            rank = rank + TrigramSimilarity(text_field, term)
+        return (
+            queryset.filter(match)
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "pk")
+        )
+
+    if connection.vendor == "sqlite":
+        match = _fts5_query(term)
+        if not match:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        ids = RawSQL(
+            f"SELECT {key_column} FROM {fts_table} WHERE {fts_table} MATCH %s",
+            [match],
+        )
+        rank = RawSQL(
+            f"SELECT -bm25({fts_table}, {weights}) FROM {fts_table} "
+            f'WHERE {fts_table} MATCH %s AND {key_column} = "{table}"."id"',
+            [match],
+        )
+        return (
+            queryset.filter(pk__in=ids)
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "pk")
+        )
+
+    return queryset.filter(**{f"{text_field}__icontains": term})
+
+
+def search_books(queryset, term):
+    """Filter ``queryset`` to books matching ``term``, best matches first."""
+    # Column weights mirror the A (title) and B (authors) weights on PostgreSQL.
+    return _search(queryset, term, "title", BOOK_FTS_TABLE, "book_id", "0, 1.0, 0.4")
+
+
+def search_authors(queryset, term):
+    """Filter ``queryset`` to authors matching ``term``, best matches first."""
+    return _search(queryset, term, "name", AUTHOR_FTS_TABLE, "author_id", "0, 1.0")
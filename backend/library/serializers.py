@@ -1,15 +1,64 @@
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Author, Book, BorrowRecord, Category
+from .models import Author, Book, BorrowRecord, Category, Reservation
 
 User = get_user_model()
 
 
+class ExpandableSerializerMixin:
+    """Render the relations named in ``expand`` as nested objects.
+
+    ``expand`` holds dotted paths such as ``{"book", "book.author"}``, and
+    ``Meta.expandable_fields`` maps each field to its nested serializer
+    class. Expanded fields are read-only.
+    """
+
+    def __init__(self, *args, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = getattr(self.Meta, "expandable_fields", {})
+        for name in {path.split(".")[0] for path in expand}:
+            serializer_class = expandable[name]
+            options = {
+                "many": isinstance(self.fields[name], serializers.ManyRelatedField)
+            }
+            nested = {
+                path.partition(".")[2] for path in expand if path.startswith(f"{name}.")
+            }
+            if nested:
+                options["expand"] = nested
+            self.fields[name] = serializer_class(read_only=True, **options)
+
+    @classmethod
+    def get_expandable_paths(cls):
+        """Return every dotted path that may be passed in ``expand``."""
+        paths = set()
+        for name, serializer_class in getattr(
+            cls.Meta, "expandable_fields", {}
+        ).items():
+            paths.add(name)
+            if issubclass(serializer_class, ExpandableSerializerMixin):
+                paths.update(
+                    f"{name}.{path}" for path in serializer_class.get_expandable_paths()
+                )
+        return paths
+
+
+class SparseFieldsSerializerMixin:
+    """Drop every field not named in ``only_fields``, when given."""
+
+    def __init__(self, *args, only_fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if only_fields is not None:
+            for name in set(self.fields) - set(only_fields):
+                self.fields.pop(name)
+
+
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
-        fields = "__all__"
+        exclude = ["search_vector"]
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -18,20 +67,236 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class BookSerializer(serializers.ModelSerializer):
+class UserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ["id"]
+        ref_name = "LibraryUser"
+
+
+class BookSerializer(
+    SparseFieldsSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = Book
-        fields = "__all__"
+        exclude = ["search_vector"]
+        expandable_fields = {"author": AuthorSerializer, "category": CategorySerializer}
+
 
+class BookBulkSerializer(serializers.ModelSerializer):
+    """Validates one item of a bulk book upload without touching the database.
+
+    ISBN uniqueness is not checked because the bulk endpoint upserts on it;
+    related ids and the copies of existing books are checked for the whole
+    batch in :meth:`validate_batch`. ``available_copies`` only applies to new
+    books.
+    """
+
+    isbn = serializers.CharField(max_length=13)
+    category = serializers.IntegerField()
+    author = serializers.ListField(child=serializers.UUIDField(), allow_empty=True)
 
-class BorrowRecordSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = [
+            "title",
+            "isbn",
+            "category",
+            "author",
+            "total_copies",
+            "available_copies",
+        ]
+
+    def validate(self, attrs):
+        if attrs["available_copies"] > attrs["total_copies"]:
+            raise serializers.ValidationError(
+                {"available_copies": ["Cannot exceed total copies."]}
+            )
+        return attrs
+
+    @staticmethod
+    def validate_batch(rows):
+        """Check a batch of ``(index, attrs)`` pairs against the database.
+
+        Returns the valid pairs and a ``{index: errors}`` mapping.
+        """
+        category_ids = {attrs["category"] for _, attrs in rows}
+        author_ids = {author for _, attrs in rows for author in attrs["author"]}
+        categories = set(
+            Category.objects.filter(pk__in=category_ids).values_list("pk", flat=True)
+        )
+        authors = set(
+            Author.objects.filter(pk__in=author_ids).values_list("pk", flat=True)
+        )
+
+        # Copies on loan or set aside for a hold, per existing ISBN.
+        out = {
+            isbn: total - available
+            for isbn, total, available in Book.objects.filter(
+                isbn__in={attrs["isbn"] for _, attrs in rows}
+            ).values_list("isbn", "total_copies", "available_copies")
+        }
+
+        last_by_isbn = {attrs["isbn"]: index for index, attrs in rows}
+        valid, errors = [], {}
+        for index, attrs in rows:
+            item_errors = {}
+            if attrs["category"] not in categories:
+                item_errors["category"] = ["Category does not exist."]
+            missing = [str(pk) for pk in attrs["author"] if pk not in authors]
+            if missing:
+                item_errors["author"] = [f"Unknown authors: {', '.join(missing)}."]
+            if attrs["total_copies"] < out.get(attrs["isbn"], 0):
+                item_errors["total_copies"] = [
+                    f"Cannot be less than the {out[attrs['isbn']]} copies "
+                    "on loan or on hold."
+                ]
+            if last_by_isbn[attrs["isbn"]] != index:
+                item_errors["isbn"] = ["Superseded by a later item with this ISBN."]
+            if item_errors:
+                errors[index] = item_errors
+            else:
+                valid.append((index, attrs))
+        return valid, errors
+
+
+class BorrowRecordSerializer(
+    SparseFieldsSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = BorrowRecord
         fields = "__all__"
+        expandable_fields = {"book": BookSerializer, "user": UserSerializer}
 
 
-class UserSerializer(serializers.ModelSerializer):
+class ReservationSerializer(serializers.ModelSerializer):
+    position = serializers.IntegerField(read_only=True, allow_null=True)
+
     class Meta:
-        model = User
-        fields = ["id"]
-        ref_name = "LibraryUser"
+        model = Reservation
+        fields = "__all__"
+        read_only_fields = ["book", "user", "status", "ready_at", "expires_at"]
+
+
+class BorrowSerializer(serializers.Serializer):
+    book = serializers.UUIDField(required=False)
+    due_date = serializers.DateField(required=False)
+
+    def validate_due_date(self, value):
+        if value < timezone.localdate():
+            raise serializers.ValidationError("Due date cannot be in the past.")
+        return value
+
+
+# Field types whose to_representation() leaves database values unchanged for
+# JSON purposes, so ValuesSerializer can skip calling it.
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+    serializers.UUIDField,
+)
+
+
+class ValuesSerializer:
+    """Read-only twin of a ``ModelSerializer`` that works on ``values()`` rows.
+
+    Produces the same dicts, in the same key order, as the model serializer
+    it is built from, but skips model instantiation and per-field attribute
+    lookups. Many-to-many ids are fetched for a whole page with one query.
+    Only concrete model fields, foreign keys and many-to-many ids are
+    supported; use :meth:`for_serializer` to get a cached instance.
+    """
+
+    _cache = {}
+
+    def __init__(self, serializer_class, only_fields=None):
+        if only_fields is None:
+            serializer = serializer_class()
+        else:
+            serializer = serializer_class(only_fields=only_fields)
+        opts = serializer.Meta.model._meta
+        self.pk_name = opts.pk.attname
+        self.columns = []
+        self.many_to_many = []
+        for name, field in serializer.fields.items():
+            model_field = opts.get_field(field.source)
+            if model_field.many_to_many:
+                self.columns.append((name, None, None))
+                self.many_to_many.append((name, model_field))
+                continue
+            convert = None
+            if not isinstance(field, PASSTHROUGH_FIELDS):
+                convert = field.to_representation
+            self.columns.append((name, model_field.attname, convert))
+
+    @classmethod
+    def for_serializer(cls, serializer_class, only_fields=None):
+        key = (serializer_class, only_fields and frozenset(only_fields))
+        if key not in cls._cache:
+            cls._cache[key] = cls(serializer_class, only_fields)
+        return cls._cache[key]
+
+    def get_values(self, queryset, extra=()):
+        """Return ``queryset`` as dict rows holding the needed columns."""
+        keys = {self.pk_name, *extra}
+        keys.update(key for _, key, _ in self.columns if key)
+        return queryset.select_related(None).prefetch_related(None).values(*keys)
+
+    def get_related_ids_query(self, model_field, pks):
+        through = model_field.remote_field.through
+        source = model_field.m2m_field_name()
+        target = model_field.m2m_reverse_field_name()
+        return (
+            through.objects.filter(**{f"{source}__in": pks})
+            .order_by(target)
+            .values_list(f"{source}_id", f"{target}_id")
+        )
+
+    def get_related_ids(self, model_field, pks):
+        related = {pk: [] for pk in pks}
+        for pk, related_pk in self.get_related_ids_query(model_field, pks):
+            related[pk].append(related_pk)
+        return related
+
+    async def aget_related_ids(self, model_field, pks):
+        related = {pk: [] for pk in pks}
+        async for pk, related_pk in self.get_related_ids_query(model_field, pks):
+            related[pk].append(related_pk)
+        return related
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        pks = [row[self.pk_name] for row in rows]
+        related = {
+            name: self.get_related_ids(model_field, pks)
+            for name, model_field in self.many_to_many
+        }
+        return self.build(rows, related)
+
+    async def ato_representation(self, rows):
+        """Like :meth:`to_representation`, with the async ORM."""
+        pks = [row[self.pk_name] for row in rows]
+        related = {
+            name: await self.aget_related_ids(model_field, pks)
+            for name, model_field in self.many_to_many
+        }
+        return self.build(rows, related)
+
+    def build(self, rows, related):
+        data = []
+        for row in rows:
+            item = {}
+            for name, key, convert in self.columns:
+                if key is None:
+                    item[name] = related[name][row[self.pk_name]]
+                    continue
+                value = row[key]
+                if convert is not None and value is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
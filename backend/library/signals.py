@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_books, invalidate_related
+from .models import Author, Book, Category
+from .search import (
+    forget_author_search,
+    forget_book_search,
+    refresh_author_search,
+    refresh_book_search,
+)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, update_fields=None, **kwargs):
+    transaction.on_commit(lambda: invalidate_books([instance.pk]))
+    if update_fields is not None and "title" not in update_fields:
+        return
+
+    refresh_book_search([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_books([instance.pk]))
+    forget_book_search([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.author.through)
+def book_authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._cleared_book_ids = list(instance.books.values_list("pk", flat=True))
+        return
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+
+    if not reverse:
+        book_ids = [instance.pk]
+    elif action == "post_clear":
+        book_ids = instance.__dict__.pop("_cleared_book_ids", [])
+    else:
+        book_ids = list(pk_set)
+
+    # Authorship is part of the book's representation, so move its
+    # Last-Modified/ETag forward as well.
+    Book.objects.filter(pk__in=book_ids).update(updated_at=timezone.now())
+    refresh_book_search(book_ids)
+    transaction.on_commit(lambda: invalidate_books(book_ids))
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, update_fields=None, **kwargs):
+    transaction.on_commit(invalidate_related)
+    if update_fields is not None and "name" not in update_fields:
+        return
+
+    refresh_author_search([instance.pk])
+    if not created:
+        refresh_book_search(instance.books.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+def author_deleting(sender, instance, **kwargs):
+    instance._deleted_book_ids = list(instance.books.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    book_ids = instance.__dict__.pop("_deleted_book_ids", [])
+    transaction.on_commit(lambda: invalidate_books(book_ids))
+    transaction.on_commit(invalidate_related)
+    forget_author_search([instance.pk])
+    refresh_book_search(book_ids)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_related)
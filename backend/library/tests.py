@@ -1,3 +1,1584 @@
-from django.test import TestCase
+import csv
+import json
+import re
+import tempfile
+import threading
+import tracemalloc
+from datetime import date
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import Count
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.test import (
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .async_views import async_read_urls, async_read_view
+from .checks import check_shared_cache
+from .cache import cache_stats
+from .exceptions import (
+    AlreadyReserved,
+    AlreadyReturned,
+    BookUnavailable,
+    CopiesAvailable,
+    LoanLimitExceeded,
+)
+from .filters import BookFilter, BorrowRecordFilter
+from .models import Author, Book, BorrowRecord, Category, Reservation
+from .paginations import KeysetPagination
+from .search import _has_trigram, search_authors, search_books
+from .services import (
+    borrow_book,
+    expire_reservations,
+    mark_overdue_records,
+    recount_loans,
+    reserve_book,
+    return_book,
+)
+from .views import AuthorViewSet, BookViewSet, BorrowRecordViewSet, CategoryViewSet
+
+User = get_user_model()
+
+
+class FilterIndexUsageTests(TestCase):
+    """Every filter combination the viewsets issue must be answered by an index."""
+
+    # PostgreSQL may pick the foreign key's own index over the composite one,
+    # and the partial index of open loans for status filters.
+    USER_INDEXES = r"borrow_user_\w+_idx|library_borrowrecord_user_id_\w+"
+    BOOK_INDEXES = r"borrow_book_\w+_idx|library_borrowrecord_book_id_\w+"
+    OPEN_INDEXES = "borrow_status_due_idx|borrow_open_due_idx"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Fiction")
+        cls.book = Book.objects.create(
+            title="1984",
+            isbn="9780451524935",
+            category=cls.category,
+            total_copies=3,
+            available_copies=3,
+        )
+        cls.user = User.objects.create_user(email="member@example.com")
+        BorrowRecord.objects.create(
+            book=cls.book, user=cls.user, due_date=date(2026, 1, 1)
+        )
+
+        # Enough spread-out rows that a cost-based planner picks indexes by
+        # selectivity rather than by which one saves a sort.
+        categories = Category.objects.bulk_create(
+            Category(name=f"Category {index}") for index in range(20)
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Book {index}",
+                isbn=f"{index:013d}",
+                category=categories[index % 20],
+                total_copies=1,
+                available_copies=1,
+            )
+            for index in range(400)
+        )
+        users = User.objects.bulk_create(
+            User(email=f"reader{index}@example.com") for index in range(20)
+        )
+        BorrowRecord.objects.bulk_create(
+            BorrowRecord(
+                book=books[index % 400],
+                user=users[index % 20],
+                due_date=date(2020, 1, 1) + timezone.timedelta(days=index * 2),
+                status=(
+                    BorrowRecord.ACTIVE if index % 10 == 0 else BorrowRecord.RETURNED
+                ),
+            )
+            for index in range(2000)
+        )
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Even so the tables fit in a few pages, so make the planner prove
+            # it *can* use an index instead of a cheaper sequential scan, and
+            # give it statistics of the rows this transaction sees.
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+                cursor.execute("ANALYZE library_book, library_borrowrecord")
+
+    def assertUsesIndex(self, queryset, index):
+        """Assert the plan looks rows up in ``index`` (a regex of index names).
+
+        A full walk of an index (SQLite's ``SCAN ... USING INDEX``, or an
+        index scan without an ``Index Cond``) does not count, unless it walks
+        a partial index, which holds only the rows its predicate selects.
+        """
+        plan = queryset.explain()
+        if connection.vendor == "sqlite":
+            self.assertRegex(plan, rf"SEARCH \w+ USING (COVERING )?INDEX ({index}) \(")
+            self.assertNotRegex(plan, r"\bSCAN \w+")
+        elif connection.vendor == "postgresql":
+            match = re.search(
+                rf"(Index|Index Only|Bitmap Index) Scan( Backward)? (using|on) ({index}) ",
+                plan,
+            )
+            self.assertIsNotNone(match, plan)
+            if "Index Cond:" not in plan:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT indexdef FROM pg_indexes WHERE indexname = %s",
+                        [match[4]],
+                    )
+                    self.assertIn(" WHERE ", cursor.fetchone()[0], plan)
+        else:
+            self.skipTest(f"No plan assertions for {connection.vendor}")
+
+    def test_borrow_record_filters(self):
+        cases = [
+            ({"status": BorrowRecord.ACTIVE}, self.OPEN_INDEXES),
+            ({"user_id": str(self.user.pk)}, self.USER_INDEXES),
+            ({"book_id": str(self.book.pk)}, self.BOOK_INDEXES),
+            (
+                {"user_id": str(self.user.pk), "status": BorrowRecord.ACTIVE},
+                self.USER_INDEXES,
+            ),
+            (
+                {"due_date_after": "2025-01-01", "due_date_before": "2026-12-31"},
+                "borrow_due_idx",
+            ),
+            (
+                {"status": BorrowRecord.ACTIVE, "due_date_before": "2026-12-31"},
+                self.OPEN_INDEXES,
+            ),
+        ]
+        for params, index in cases:
+            with self.subTest(params=params):
+                queryset = BorrowRecordFilter(
+                    params, queryset=BorrowRecord.objects.all()
+                ).qs
+                self.assertUsesIndex(queryset, index)
+
+    def test_nested_borrow_record_routes(self):
+        self.assertUsesIndex(
+            BorrowRecord.objects.filter(book_id=self.book.pk), self.BOOK_INDEXES
+        )
+        self.assertUsesIndex(
+            BorrowRecord.objects.filter(user_id=self.user.pk), self.USER_INDEXES
+        )
+
+    def test_book_filters(self):
+        cases = [
+            (
+                {"category_id": self.category.pk},
+                r"book_category_created_idx|library_book_category_id_\w+",
+            ),
+            # The unique constraint's index; PostgreSQL may use its _like twin.
+            (
+                {"isbn": self.book.isbn},
+                r"sqlite_autoindex_library_book_\d+|library_book_isbn_\w+",
+            ),
+        ]
+        for params, index in cases:
+            with self.subTest(params=params):
+                queryset = BookFilter(params, queryset=Book.objects.all()).qs
+                self.assertUsesIndex(queryset, index)
+
+
+class SearchTests(TestCase):
+    """Search documents follow titles, author names and authorship."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Fiction")
+        cls.herbert = Author.objects.create(name="Frank Herbert")
+        cls.lovecraft = Author.objects.create(name="Howard Lovecraft")
+        cls.dune = Book.objects.create(
+            title="Dune",
+            isbn="9780441013593",
+            category=category,
+            total_copies=1,
+            available_copies=1,
+        )
+        cls.dune.author.add(cls.herbert)
+        cls.west = Book.objects.create(
+            title="Herbert West",
+            isbn="9780000000002",
+            category=category,
+            total_copies=1,
+            available_copies=1,
+        )
+        cls.west.author.add(cls.lovecraft)
+
+    def books(self, term):
+        return list(search_books(Book.objects.all(), term))
+
+    def test_title_matches_rank_before_author_matches(self):
+        self.assertEqual(self.books("herbert"), [self.west, self.dune])
+        self.assertEqual(self.books("dune"), [self.dune])
+
+    def test_authors_by_name(self):
+        self.assertEqual(
+            list(search_authors(Author.objects.all(), "lovecraft")), [self.lovecraft]
+        )
+
+    def test_through_the_api(self):
+        client = APIClient()
+        results = client.get("/api/v1/books/?search=dune").json()["results"]
+        self.assertEqual([book["id"] for book in results], [str(self.dune.pk)])
+
+    def test_author_rename_reindexes_books(self):
+        self.herbert.name = "Brian Zappa"
+        self.herbert.save()
+        self.assertEqual(self.books("zappa"), [self.dune])
+        self.assertEqual(self.books("herbert"), [self.west])
+        self.assertEqual(
+            list(search_authors(Author.objects.all(), "zappa")), [self.herbert]
+        )
+
+    def test_authorship_changes_reindex_books(self):
+        self.dune.author.add(self.lovecraft)
+        self.assertIn(self.dune, self.books("lovecraft"))
+        self.dune.author.remove(self.lovecraft)
+        self.assertEqual(self.books("lovecraft"), [self.west])
+        self.herbert.books.clear()
+        self.assertEqual(self.books("herbert"), [self.west])
+
+    def test_deleted_author_leaves_the_index(self):
+        self.lovecraft.delete()
+        self.assertEqual(list(search_authors(Author.objects.all(), "lovecraft")), [])
+        self.assertEqual(self.books("lovecraft"), [])
+
+    def test_degenerate_queries(self):
+        # Blank terms leave the queryset alone; terms without words match nothing.
+        self.assertEqual(len(self.books("")), 2)
+        self.assertEqual(len(self.books("   ")), 2)
+        self.assertEqual(self.books("!!! ::"), [])
+        self.assertEqual(self.books("nosuchword"), [])
+
+    @skipUnless(connection.vendor == "postgresql", "websearch syntax is PostgreSQL's")
+    def test_websearch_syntax(self):
+        self.assertEqual(self.books('"herbert west"'), [self.west])
+        self.assertEqual(self.books("herbert -west"), [self.dune])
+
+    @skipUnless(connection.vendor == "postgresql", "trigram matching needs pg_trgm")
+    def test_typos_match_by_trigram(self):
+        if not _has_trigram():
+            self.skipTest("pg_trgm is not installed")
+        self.assertEqual(self.books("Herbret West"), [self.west])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Fiction")
+        Book.objects.bulk_create(
+            Book(
+                title=f"Book {index}",
+                isbn=f"{index:013d}",
+                category=category,
+                total_copies=1,
+                available_copies=1,
+            )
+            for index in range(25)
+        )
+        # Give most books the same timestamp so the id tiebreaker is exercised.
+        Book.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_walks_every_book_once_without_counting(self):
+        expected = [str(pk) for pk in Book.objects.values_list("pk", flat=True)]
+        seen = []
+        url = "/api/v1/books/?cursor=&page_size=10"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(
+                any("COUNT(" in query["sql"] for query in queries.captured_queries)
+            )
+            seen += [book["id"] for book in response.json()["results"]]
+            url = response.json()["next"]
+
+        self.assertEqual(seen, expected)
+
+    def page_query(self, pagination, queryset):
+        queryset = queryset.order_by(*pagination.ordering)
+        last = queryset[12]
+        position = [getattr(last, name) for name in pagination.get_fields()]
+        return queryset.filter(pagination.build_filter(position))[:10]
+
+    def test_deep_pages_seek_through_the_index(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        pagination = KeysetPagination()
+        plan = self.page_query(pagination, Book.objects.all()).explain()
+        if connection.vendor == "sqlite":
+            self.assertRegex(
+                plan, r"SEARCH library_book USING INDEX book_created_idx \("
+            )
+        elif connection.vendor == "postgresql":
+            self.assertIn("book_created_idx", plan)
+            self.assertIn("Index Cond: (created_at <=", plan)
+        else:
+            self.skipTest(f"No plan assertions for {connection.vendor}")
+
+    def test_mixed_directions(self):
+        class OldestFirst(KeysetPagination):
+            ordering = ("created_at", "-id")
+
+        pagination = OldestFirst()
+        queryset = Book.objects.order_by(*pagination.ordering)
+        expected = list(queryset)[13:23]
+        self.assertEqual(
+            list(self.page_query(pagination, Book.objects.all())), expected
+        )
+
+    def test_rejects_malformed_cursor(self):
+        response = self.client.get("/api/v1/books/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_rejects_ordering_and_search(self):
+        for query in ("ordering=-times_borrowed", "search=Book"):
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/v1/books/?cursor=&{query}")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("cursor", response.json())
+
+
+class LibraryDataTestCase(TestCase):
+    """A small catalog with authorship and one loan per book."""
+
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="member@example.com")
+        categories = Category.objects.bulk_create(
+            Category(name=f"Category {index}") for index in range(3)
+        )
+        authors = Author.objects.bulk_create(
+            Author(name=f"Author {index}") for index in range(4)
+        )
+        for index in range(12):
+            book = Book.objects.create(
+                title=f"Book {index}",
+                isbn=f"{index:013d}",
+                category=categories[index % 3],
+                total_copies=2,
+                available_copies=2,
+            )
+            book.author.set(authors[: index % 4 + 1])
+            BorrowRecord.objects.create(
+                book=book, user=cls.user, due_date=date(2026, 1, 1)
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+
+class ExpandTests(LibraryDataTestCase):
+    """Expanded responses cost the same number of queries for any page size."""
+
+    def assertConstantQueries(self, url):
+        counts = []
+        for page_size in (2, 12):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f"{url}&page_size={page_size}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["results"]), page_size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        return response.json()["results"]
+
+    def test_books(self):
+        results = self.assertConstantQueries("/api/v1/books/?expand=author,category")
+        self.assertIn("name", results[0]["category"])
+        self.assertTrue(all("name" in author for author in results[0]["author"]))
+
+    def test_borrow_records(self):
+        url = f"/api/v1/users/{self.user.pk}/borrow-records/"
+        results = self.assertConstantQueries(f"{url}?expand=book.author,user")
+        self.assertEqual(results[0]["user"], {"id": str(self.user.pk)})
+        self.assertTrue(
+            all("name" in author for author in results[0]["book"]["author"])
+        )
+        self.assertIsInstance(results[0]["book"]["category"], int)
+
+    def test_rejects_unknown_paths(self):
+        response = self.client.get("/api/v1/books/?expand=author.books")
+        self.assertEqual(response.status_code, 400)
+
+    def test_related_change_moves_etag(self):
+        url = "/api/v1/books/?expand=author"
+        etag = self.client.get(url)["ETag"]
+        Author.objects.filter(name="Author 0").update(
+            name="Renamed", updated_at=timezone.now()
+        )
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SparseFieldsTests(LibraryDataTestCase):
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), [query["sql"] for query in queries.captured_queries]
+
+    def test_fields_narrow_select_and_skip_author_prefetch(self):
+        data, queries = self.get("/api/v1/books/?fields=id,title,available_copies")
+        self.assertEqual(set(data["results"][0]), {"id", "title", "available_copies"})
+        page_query = queries[-1]
+        self.assertNotIn('"isbn"', page_query)
+        self.assertFalse(any("library_book_author" in sql for sql in queries))
+
+    def test_omit(self):
+        data, queries = self.get("/api/v1/books/?omit=author,isbn&cursor=")
+        self.assertNotIn("author", data["results"][0])
+        self.assertNotIn("isbn", data["results"][0])
+        self.assertFalse(any("library_book_author" in sql for sql in queries))
+
+    def test_combines_with_expand(self):
+        url = f"/api/v1/users/{self.user.pk}/borrow-records/"
+        data, _ = self.get(f"{url}?fields=id,book&expand=book.author,user")
+        record = data["results"][0]
+        self.assertEqual(set(record), {"id", "book"})
+        self.assertIn("name", record["book"]["author"][0])
+
+    def test_rejects_unknown_fields(self):
+        response = self.client.get("/api/v1/books/?fields=id,secret")
+        self.assertEqual(response.status_code, 400)
+
+
+class FastReadTests(LibraryDataTestCase):
+    """The values() read path must render exactly what the serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Book.objects.filter(isbn=f"{0:013d}").update(title="Æsop\u2028Fables ✓")
+        BorrowRecord.objects.filter(book__isbn=f"{1:013d}").update(
+            status=BorrowRecord.RETURNED, return_date=timezone.now()
+        )
+
+    def assertSameBytes(self, viewset, url):
+        with CaptureQueriesContext(connection) as queries:
+            fast = self.client.get(url)
+        # The regular path prefetches authors; the fast path only reads ids.
+        self.assertFalse(
+            any("library_author" in query["sql"] for query in queries.captured_queries)
+        )
+        cache.clear()
+        with patch.object(viewset, "fast_read", False):
+            regular = self.client.get(url)
+        cache.clear()
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, regular.content)
+
+    def test_books(self):
+        for query in ("", "?page_size=5&page=2", "?cursor=", "?fields=id,author"):
+            with self.subTest(query=query):
+                self.assertSameBytes(BookViewSet, f"/api/v1/books/{query}")
+
+    def test_borrow_records(self):
+        url = f"/api/v1/users/{self.user.pk}/borrow-records/"
+        for query in ("", "?cursor=&page_size=4", "?omit=user"):
+            with self.subTest(query=query):
+                self.assertSameBytes(BorrowRecordViewSet, f"{url}{query}")
+
+
+class AsyncReadTests(LibraryDataTestCase):
+    """Async reads must answer exactly like the views they wrap."""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        self.headers = {"authorization": f"JWT {AccessToken.for_user(self.user)}"}
+
+    async def get(self, viewset, action, path, headers=None, **kwargs):
+        view = async_read_view(viewset.as_view({"get": action}))
+        request = self.factory.get(path, headers=self.headers | (headers or {}))
+        return await view(request, **kwargs)
+
+    # Both paths build their response rather than reading the other's entry.
+    @override_settings(LIBRARY_CACHE_TIMEOUT=0)
+    async def test_matches_sync_views(self):
+        book = await Book.objects.afirst()
+        author = await Author.objects.afirst()
+        category = await Category.objects.afirst()
+        reads = [
+            (BookViewSet, "list", "/api/v1/books/", {}),
+            (BookViewSet, "list", "/api/v1/books/?page_size=5&page=2", {}),
+            (BookViewSet, "retrieve", f"/api/v1/books/{book.pk}/", {"pk": book.pk}),
+            (AuthorViewSet, "list", "/api/v1/authors/?page_size=3", {}),
+            (
+                AuthorViewSet,
+                "retrieve",
+                f"/api/v1/authors/{author.pk}/",
+                {"pk": author.pk},
+            ),
+            (CategoryViewSet, "list", "/api/v1/categories/", {}),
+            (
+                CategoryViewSet,
+                "retrieve",
+                f"/api/v1/categories/{category.pk}/",
+                {"pk": category.pk},
+            ),
+        ]
+        for viewset, action, path, kwargs in reads:
+            with self.subTest(path=path, viewset=viewset.__name__):
+                response = await self.get(viewset, action, path, **kwargs)
+                self.assertNotIsInstance(response, Response)
+                view = viewset.as_view({"get": action})
+                request = self.factory.get(path, headers=self.headers)
+                expected = (await sync_to_async(view)(request, **kwargs)).render()
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+                for header in ("Content-Type", "ETag", "Last-Modified", "Vary"):
+                    self.assertEqual(response.get(header), expected.get(header))
+
+                revalidated = await self.get(
+                    viewset,
+                    action,
+                    path,
+                    headers={"if-none-match": response["ETag"]},
+                    **kwargs,
+                )
+                self.assertEqual(revalidated.status_code, 304)
+                await cache.aclear()
+
+    def test_wraps_read_routes_of_flagged_viewsets(self):
+        from api.urls import router
+
+        views = {
+            pattern.name: pattern.callback for pattern in async_read_urls(router.urls)
+        }
+        for name in ("book-list", "book-detail", "author-list", "category-detail"):
+            self.assertTrue(iscoroutinefunction(views[name]), name)
+        for name in ("book-export", "book-bulk", "user-list", "report-list"):
+            self.assertFalse(iscoroutinefunction(views[name]), name)
+
+    async def test_runs_throttles(self):
+        class OnePerMinute(UserRateThrottle):
+            rate = "1/minute"
+
+        viewset = type(
+            "Throttled", (BookViewSet,), {"throttle_classes": [OnePerMinute]}
+        )
+        await cache.aclear()
+        first = await self.get(viewset, "list", "/api/v1/books/")
+        self.assertEqual(first.status_code, 200)
+        second = await self.get(viewset, "list", "/api/v1/books/")
+        self.assertEqual(second.status_code, 429)
+        self.assertIn("Retry-After", second)
+
+    async def test_falls_back_to_sync_view(self):
+        fallbacks = [
+            (BookViewSet, "/api/v1/books/?expand=author", None, 200),
+            (BookViewSet, "/api/v1/books/?page=9", None, 404),
+            (BookViewSet, "/api/v1/books/?format=api", {"accept": "text/html"}, 200),
+            (AuthorViewSet, "/api/v1/authors/", {"authorization": ""}, 401),
+        ]
+        for viewset, path, headers, status in fallbacks:
+            with self.subTest(path=path, headers=headers):
+                response = await self.get(viewset, "list", path, headers=headers)
+                self.assertIsInstance(response, Response)
+                self.assertEqual(response.status_code, status)
+
+
+class LoanCounterTests(LibraryDataTestCase):
+    """Borrow counters follow every write path and can be rebuilt."""
+
+    def assertCounters(self, book, times_borrowed, active_loans):
+        book.refresh_from_db()
+        self.assertEqual(
+            (book.times_borrowed, book.active_loans), (times_borrowed, active_loans)
+        )
+
+    def test_recount_repairs_drift(self):
+        # The fixture writes borrow records directly, bypassing the counters.
+        self.assertEqual(recount_loans(batch_size=5), (12, 1))
+        self.assertEqual(recount_loans(), (0, 0))
+        self.assertCounters(Book.objects.first(), 1, 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_loans, 12)
+
+    def test_recount_rejects_empty_batches(self):
+        with self.assertRaises(CommandError):
+            call_command("recount", "--batch-size=0", stdout=StringIO())
+        with self.assertRaises(ValueError):
+            recount_loans(batch_size=-1)
+
+    def test_service_and_api_writes_keep_counters(self):
+        recount_loans()
+        book = Book.objects.get(isbn=f"{0:013d}")
+        record = borrow_book(book.pk, self.user)
+        self.assertCounters(book, 2, 2)
+        return_book(record)
+        self.assertCounters(book, 2, 1)
+
+        admin = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_authenticate(admin)
+        url = f"/api/v1/books/{book.pk}/borrow-records/{record.pk}/"
+        response = self.client.patch(url, {"status": BorrowRecord.ACTIVE})
+        self.assertEqual(response.status_code, 200)
+        self.assertCounters(book, 2, 2)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertCounters(book, 1, 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_loans, 12)
+
+    def test_create_takes_a_copy(self):
+        recount_loans()
+        book = Book.objects.get(isbn=f"{0:013d}")
+        admin = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_authenticate(admin)
+        url = f"/api/v1/books/{book.pk}/borrow-records/"
+        data = {"book": book.pk, "user": self.user.pk, "due_date": "2030-01-01"}
+        response = self.client.post(url, {**data, "status": BorrowRecord.OVERDUE})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], BorrowRecord.OVERDUE)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+        self.assertCounters(book, 2, 2)
+
+        # A closed record is history: it frees no copy and takes none.
+        response = self.client.post(url, {**data, "status": BorrowRecord.RETURNED})
+        self.assertEqual(response.status_code, 201)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+        self.assertCounters(book, 3, 2)
+
+        self.client.post(url, data)
+        self.assertEqual(self.client.post(url, data).status_code, 409)
+
+    def test_update_and_delete_move_copies(self):
+        recount_loans()
+        book = Book.objects.get(isbn=f"{0:013d}")
+        other = Book.objects.exclude(pk=book.pk).first()
+        shelved = book.available_copies
+        record = borrow_book(book.pk, self.user)
+        admin = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_authenticate(admin)
+        url = f"/api/v1/books/{book.pk}/borrow-records/{record.pk}/"
+
+        def available():
+            book.refresh_from_db()
+            return book.available_copies
+
+        response = self.client.patch(url, {"status": BorrowRecord.RETURNED})
+        self.assertIsNotNone(response.json()["return_date"])
+        self.assertEqual(available(), shelved)
+        response = self.client.patch(url, {"status": BorrowRecord.ACTIVE})
+        self.assertIsNone(response.json()["return_date"])
+        self.assertEqual(available(), shelved - 1)
+        self.assertEqual(self.client.patch(url, {"book": other.pk}).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(available(), shelved)
+        self.assertCounters(book, 1, 1)
+
+        # Reopening needs a copy on the shelf.
+        record = borrow_book(book.pk, self.user)
+        return_book(record)
+        Book.objects.filter(pk=book.pk).update(available_copies=0)
+        url = f"/api/v1/books/{book.pk}/borrow-records/{record.pk}/"
+        response = self.client.patch(url, {"status": BorrowRecord.ACTIVE})
+        self.assertEqual(response.status_code, 409)
+        self.assertCounters(book, 2, 1)
+
+    def test_borrow_on_user_route(self):
+        book = Book.objects.first()
+        other = User.objects.create_user(email="other@example.com")
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="add_borrowrecord")
+        )
+        data = {"book": book.pk}
+        url = "/api/v1/users/{}/borrow-records/borrow/"
+        response = self.client.post(url.format(other.pk), data)
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(url.format(self.user.pk), data)
+        self.assertEqual(response.json()["user"], str(self.user.pk))
+
+        admin = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_authenticate(admin)
+        response = self.client.post(url.format(other.pk), data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["user"], str(other.pk))
+        self.assertEqual(book.borrow_records.filter(user=other).count(), 1)
+
+    @override_settings(LIBRARY_DEFAULT_LOAN_LIMIT=13)
+    def test_default_loan_limit(self):
+        recount_loans()
+        borrow_book(Book.objects.first().pk, self.user)
+        book = Book.objects.last()
+        with self.assertRaises(LoanLimitExceeded):
+            borrow_book(book.pk, self.user)
+
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="add_borrowrecord")
+        )
+        response = self.client.post(f"/api/v1/books/{book.pk}/borrow-records/borrow/")
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("maximum number", response.json()["detail"])
+        self.assertCounters(book, 1, 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_loans, 13)
+
+    def test_order_books_by_popularity(self):
+        recount_loans()
+        book = Book.objects.get(isbn=f"{5:013d}")
+        borrow_book(book.pk, self.user)
+        response = self.client.get("/api/v1/books/?ordering=-times_borrowed")
+        results = response.json()["results"]
+        self.assertEqual(results[0]["id"], str(book.pk))
+        response = self.client.get("/api/v1/books/?times_borrowed_min=2")
+        self.assertEqual(response.json()["count"], 1)
+
+
+class CatalogCacheTests(LibraryDataTestCase):
+    """Catalog reads come from the cache until a write bumps their version."""
+
+    def setUp(self):
+        super().setUp()
+        self.book = Book.objects.get(isbn=f"{3:013d}")
+        self.detail = f"/api/v1/books/{self.book.pk}/"
+
+    def test_hit_and_miss(self):
+        self.client.get("/api/v1/books/?page_size=2&category=1")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/v1/books/?category=1&page_size=2")
+        self.assertEqual(response.status_code, 200)
+        self.client.get("/api/v1/books/?page_size=3")
+        self.assertEqual(cache_stats("books"), {"hits": 1, "misses": 2})
+
+    def test_write_invalidates(self):
+        self.client.get(self.detail)
+        self.client.get("/api/v1/books/")
+        admin = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.detail, {"title": "Renamed"})
+        self.assertEqual(self.client.get(self.detail).json()["title"], "Renamed")
+        titles = [
+            row["title"] for row in self.client.get("/api/v1/books/").json()["results"]
+        ]
+        self.assertIn("Renamed", titles)
+
+    def test_borrow_invalidates(self):
+        self.assertEqual(self.client.get(self.detail).json()["available_copies"], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            borrow_book(self.book.pk, self.user)
+        self.assertEqual(self.client.get(self.detail).json()["available_copies"], 1)
+
+    def test_author_rename_invalidates(self):
+        url = f"{self.detail}?expand=author"
+        self.client.get(url)
+        author = self.book.author.first()
+        author.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        names = [row["name"] for row in self.client.get(url).json()["author"]]
+        self.assertIn("Renamed", names)
+
+    def test_links_follow_the_request_origin(self):
+        url = "/api/v1/books/?page_size=2"
+        first = self.client.get(url, HTTP_HOST="a.example.com").json()
+        second = self.client.get(url, HTTP_HOST="b.example.com", secure=True).json()
+        self.assertTrue(first["next"].startswith("http://a.example.com/"))
+        self.assertTrue(second["next"].startswith("https://b.example.com/"))
+
+
+class ConditionalGetTests(LibraryDataTestCase):
+    """Conditional reads answer 304 until the response would change."""
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        return etag, last_modified
+
+    def test_catalog_validators_come_from_versions(self):
+        url = "/api/v1/authors/?page_size=2"
+        etag, last_modified = self.assertRevalidates(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE="Thu, 01 Jan 1970 00:00:00 GMT"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        author = Author.objects.first()
+        author.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_borrow_moves_book_validators(self):
+        book = Book.objects.first()
+        urls = ["/api/v1/books/", f"/api/v1/books/{book.pk}/"]
+        etags = [self.assertRevalidates(url)[0] for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            borrow_book(book.pk, self.user)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_borrow_records_fingerprint_the_queryset(self):
+        url = f"/api/v1/users/{self.user.pk}/borrow-records/?expand=book.author"
+        etag, _ = self.assertRevalidates(url)
+        return_book(BorrowRecord.objects.first())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    shared = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+
+    def assertCheck(self, expected):
+        self.assertEqual([error.id for error in check_shared_cache(None)], expected)
+
+    def test_production_needs_shared_cache(self):
+        with override_settings(DEBUG=True):
+            self.assertCheck([])
+            with override_settings(LIBRARY_REPLICAS=["replica"]):
+                self.assertCheck(["library.E002"])
+        with override_settings(DEBUG=False):
+            self.assertCheck(["library.E001"])
+            with override_settings(CACHES=self.shared):
+                self.assertCheck([])
+
+
+class ReservationTests(TestCase):
+    """Holds queue FIFO and returned copies go to the head of the queue."""
+
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(
+            title="Popular",
+            isbn="9780000000001",
+            category=Category.objects.create(name="Fiction"),
+            total_copies=1,
+            available_copies=1,
+        )
+        cls.members = [
+            User.objects.create_user(email=f"member{index}@example.com")
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.url = f"/api/v1/books/{self.book.pk}/reservations/"
+
+    def reserve(self, member):
+        member.user_permissions.add(Permission.objects.get(codename="add_reservation"))
+        self.client.force_authenticate(User.objects.get(pk=member.pk))
+        return self.client.post(self.url)
+
+    def test_queue_allocation_and_expiry(self):
+        first, second, third = self.members
+        with self.assertRaises(CopiesAvailable):
+            reserve_book(self.book.pk, second)
+        loan = borrow_book(self.book.pk, first)
+
+        self.assertEqual(self.reserve(second).json()["position"], 1)
+        response = self.reserve(third)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["position"], 2)
+        self.assertEqual(self.reserve(third).status_code, 409)
+
+        # The returned copy is held for the head of the queue, not shelved.
+        return_book(loan)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        hold = Reservation.objects.get(user=second)
+        self.assertEqual(hold.status, Reservation.READY)
+        with self.assertRaises(BookUnavailable):
+            borrow_book(self.book.pk, third)
+        self.assertEqual(self.client.get(self.url).json()["results"][1]["position"], 1)
+
+        # Nobody collects it: the hold expires and the copy moves on.
+        later = hold.expires_at + timezone.timedelta(seconds=1)
+        self.assertEqual(expire_reservations(now=later), 1)
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, Reservation.EXPIRED)
+        self.assertEqual(Reservation.objects.get(user=third).status, Reservation.READY)
+
+        borrow_book(self.book.pk, third)
+        self.assertEqual(
+            Reservation.objects.get(user=third).status, Reservation.FULFILLED
+        )
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.book.active_loans), (0, 1))
+
+    def test_borrow_collects_own_ready_hold(self):
+        first, second, third = self.members
+        self.book.total_copies = self.book.available_copies = 2
+        self.book.save()
+        loans = [borrow_book(self.book.pk, first), borrow_book(self.book.pk, third)]
+        hold = reserve_book(self.book.pk, second)
+        for loan in loans:
+            return_book(loan)
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, Reservation.READY)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+        # A copy is also on the shelf, but the member takes the one kept for them.
+        borrow_book(self.book.pk, second)
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, Reservation.FULFILLED)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.book.active_loans), (1, 1))
+
+    def test_cancel_ready_hold_shelves_copy(self):
+        first, second, _ = self.members
+        loan = borrow_book(self.book.pk, first)
+        hold = reserve_book(self.book.pk, second)
+        with self.assertRaises(AlreadyReserved):
+            reserve_book(self.book.pk, second)
+        return_book(loan)
+
+        self.client.force_authenticate(first)
+        self.assertEqual(
+            self.client.post(f"{self.url}{hold.pk}/cancel/").status_code, 403
+        )
+        self.client.force_authenticate(second)
+        response = self.client.post(f"{self.url}{hold.pk}/cancel/")
+        self.assertEqual(response.json()["status"], Reservation.CANCELLED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_rejects_empty_batches(self):
+        with self.assertRaises(CommandError):
+            call_command("expire_reservations", "--batch-size=0", stdout=StringIO())
+        with self.assertRaises(ValueError):
+            expire_reservations(batch_size=-1)
+
+
+class MarkOverdueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email="member@example.com")
+        book = Book.objects.create(
+            title="Popular",
+            isbn="9780000000001",
+            category=Category.objects.create(name="Fiction"),
+            total_copies=10,
+            available_copies=10,
+        )
+        today = timezone.localdate()
+        rows = [(-3, BorrowRecord.ACTIVE)] * 5 + [
+            (1, BorrowRecord.ACTIVE),
+            (-3, BorrowRecord.RETURNED),
+        ]
+        for days, status in rows:
+            BorrowRecord.objects.create(
+                book=book,
+                user=user,
+                due_date=today + timezone.timedelta(days=days),
+                status=status,
+            )
+
+    def test_marks_past_due_loans_in_batches(self):
+        out = StringIO()
+        call_command("mark_overdue", "--batch-size=2", verbosity=2, stdout=out)
+        self.assertEqual(out.getvalue().count("so far"), 3)
+        self.assertIn("Marked 5 records overdue", out.getvalue())
+        counts = dict(BorrowRecord.objects.values_list("status").annotate(Count("pk")))
+        self.assertEqual(
+            counts,
+            {BorrowRecord.ACTIVE: 1, BorrowRecord.OVERDUE: 5, BorrowRecord.RETURNED: 1},
+        )
+        self.assertEqual(mark_overdue_records(batch_size=2), 0)
+
+    def test_rejects_empty_batches(self):
+        with self.assertRaises(CommandError):
+            call_command("mark_overdue", "--batch-size=0", stdout=StringIO())
+        with self.assertRaises(ValueError):
+            mark_overdue_records(batch_size=0)
+
+
+class BulkUpsertTests(TestCase):
+    client_class = APIClient
+    url = "/api/v1/books/bulk/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Fiction")
+        cls.author = Author.objects.create(name="Frank Herbert")
+        cls.book = Book.objects.create(
+            title="Dune",
+            isbn="9780000000001",
+            category=cls.category,
+            total_copies=3,
+            available_copies=3,
+        )
+        cls.clerk = User.objects.create_user(email="clerk@example.com")
+        cls.clerk.user_permissions.add(Permission.objects.get(codename="add_book"))
+        cls.editor = User.objects.create_user(email="editor@example.com")
+        cls.editor.user_permissions.add(
+            *Permission.objects.filter(codename__in=["add_book", "change_book"])
+        )
+
+    def setUp(self):
+        cache.clear()
+        borrow_book(self.book.pk, self.clerk)
+        self.client.force_authenticate(self.editor)
+
+    def item(self, isbn, **fields):
+        return {
+            "title": f"Book {isbn}",
+            "isbn": isbn,
+            "category": self.category.pk,
+            "author": [str(self.author.pk)],
+            "total_copies": 2,
+            "available_copies": 2,
+            **fields,
+        }
+
+    def test_reports_a_result_per_item(self):
+        items = [
+            self.item("9780000000002"),
+            self.item(self.book.isbn, title="Dune Messiah", total_copies=5),
+            self.item("9780000000003", category=0),
+            self.item("9780000000004"),
+            self.item("9780000000004", title="Children of Dune"),
+        ]
+        response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, 207)
+        results = response.json()["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "updated", "invalid", "invalid", "created"],
+        )
+        self.assertEqual(
+            results[1], {"index": 1, "status": "updated", "id": str(self.book.pk)}
+        )
+        self.assertEqual(
+            results[2],
+            {
+                "index": 2,
+                "status": "invalid",
+                "errors": {"category": ["Category does not exist."]},
+            },
+        )
+        self.assertIn("isbn", results[3]["errors"])
+        self.assertEqual(
+            Book.objects.get(isbn="9780000000004").title, "Children of Dune"
+        )
+
+        # The loan survives the update: two more copies, both on the shelf.
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Dune Messiah")
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (5, 4))
+
+    def test_total_cannot_drop_below_copies_out(self):
+        items = [self.item(self.book.isbn, total_copies=0, available_copies=0)]
+        response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, 207)
+        self.assertIn("total_copies", response.json()["results"][0]["errors"])
+
+        items = [self.item(self.book.isbn, total_copies=1, available_copies=1)]
+        self.assertEqual(
+            self.client.post(self.url, items, format="json").status_code, 200
+        )
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (1, 0))
+
+    def test_updates_need_change_permission(self):
+        self.client.force_authenticate(self.clerk)
+        items = [self.item("9780000000002"), self.item(self.book.isbn)]
+        response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Book.objects.filter(isbn="9780000000002").exists())
+        response = self.client.post(self.url, items[:1], format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_accepts_only_bounded_lists(self):
+        for body in ({"title": "Dune"}, "Dune", 1):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, format="json")
+                self.assertEqual(response.status_code, 400)
+
+        items = [self.item(f"978000000001{index}") for index in range(3)]
+        with patch.object(BookViewSet, "bulk_max_items", 2):
+            response = self.client.post(self.url, items, format="json")
+            self.assertEqual(response.status_code, 400)
+            stream = "\n".join(json.dumps(item) for item in items)
+            response = self.client.post(
+                self.url, stream, content_type="application/x-ndjson"
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Book.objects.count(), 1)
+
+        response = self.client.post(
+            self.url, stream, content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Book.objects.count(), 4)
+
+
+class ExportTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Fiction")
+        cls.author = Author.objects.create(name="George Orwell")
+        cls.book = Book.objects.create(
+            title="1984",
+            isbn="9780451524935",
+            category=cls.category,
+            total_copies=3,
+            available_copies=3,
+        )
+        cls.book.author.add(cls.author)
+        cls.user = User.objects.create_user(email="member@example.com")
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def create_records(self, count):
+        BorrowRecord.objects.bulk_create(
+            (
+                BorrowRecord(book=self.book, user=self.user, due_date=date(2026, 1, 1))
+                for _ in range(count)
+            ),
+            batch_size=1000,
+        )
+
+    def export_peak(self, url):
+        """Consume an export and return (row count, peak traced bytes)."""
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        rows = 0
+        tracemalloc.start()
+        try:
+            for _ in response.streaming_content:
+                rows += 1
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return rows, peak
+
+    def test_exports_catalog_with_authors(self):
+        response = self.client.get("/api/v1/books/export/")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        content = b"".join(response.streaming_content).decode()
+        header, row = list(csv.reader(content.splitlines()))
+        self.assertEqual(row[header.index("author")], str(self.author.pk))
+
+        response = self.client.get("/api/v1/books/export/?output=ndjson")
+        (line,) = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(line)["author"], [str(self.author.pk)])
+
+    def test_honors_filters(self):
+        self.create_records(3)
+        BorrowRecord.objects.filter(pk=BorrowRecord.objects.values("pk")[:1]).update(
+            status=BorrowRecord.RETURNED
+        )
+        response = self.client.get(
+            f"/api/v1/users/{self.user.pk}/borrow-records/export/"
+            f"?output=ndjson&status={BorrowRecord.ACTIVE}"
+        )
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_rejects_unknown_output(self):
+        response = self.client.get("/api/v1/books/export/?output=xml")
+        self.assertEqual(response.status_code, 400)
+
+    def test_memory_does_not_grow_with_row_count(self):
+        url = f"/api/v1/books/{self.book.pk}/borrow-records/export/?output=ndjson"
+        # Start above two chunks so both runs are past the warm-up allocations.
+        self.create_records(5000)
+        small_rows, small_peak = self.export_peak(url)
+        self.create_records(15000)
+        large_rows, large_peak = self.export_peak(url)
+
+        self.assertEqual((small_rows, large_rows), (5000, 20000))
+        # Four times the rows must cost about the same memory; only one
+        # iterator chunk is ever held at once.
+        self.assertLess(large_peak, small_peak * 1.2)
+
+
+class ImportCatalogTests(TestCase):
+    fixture_path = Path(settings.BASE_DIR) / "fixtures" / "library_fixtures.json"
+
+    def import_file(self, name, content, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / name
+            path.write_text(content)
+            call_command("import_catalog", str(path), *args, stdout=StringIO())
+
+    def test_imports_fixture_file_idempotently(self):
+        fixture = json.loads(self.fixture_path.read_text())
+        for _ in range(2):
+            call_command(
+                "import_catalog",
+                str(self.fixture_path),
+                "--chunk-size=4",
+                stdout=StringIO(),
+            )
+
+        counts = {
+            model: sum(item["model"] == model for item in fixture)
+            for model in ("library.book", "library.author", "library.category")
+        }
+        self.assertEqual(Book.objects.count(), counts["library.book"])
+        self.assertEqual(Author.objects.count(), counts["library.author"])
+        self.assertEqual(Category.objects.count(), counts["library.category"])
+        book = Book.objects.get(isbn="9780451524935")
+        self.assertEqual(
+            list(book.author.values_list("name", flat=True)), ["George Orwell"]
+        )
+
+    def test_flat_formats_share_authors_and_categories(self):
+        self.import_file(
+            "books.csv",
+            "title,isbn,category,authors,total_copies\n"
+            "Good Omens,9780060853983,Fantasy,Terry Pratchett|Neil Gaiman,2\n"
+            "Mort,9780062225719,Fantasy,Terry Pratchett,1\n",
+        )
+        self.import_file(
+            "books.ndjson",
+            json.dumps(
+                {
+                    "title": "Coraline",
+                    "isbn": "9780380807345",
+                    "category": "Fantasy",
+                    "authors": ["Neil Gaiman"],
+                    "total_copies": 1,
+                }
+            ),
+        )
+        self.import_file(
+            "books.mrk",
+            "=LDR  00000nam\n"
+            "=020  \\\\$a9780552131063\n"
+            "=100  1\\$aTerry Pratchett\n"
+            "=245  10$aSourcery /\n"
+            "=650  \\0$aFantasy\n"
+            "=999  \\\\$t3$a2\n",
+        )
+
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Book.objects.filter(author__name="Terry Pratchett").count(), 3)
+        sourcery = Book.objects.get(isbn="9780552131063")
+        self.assertEqual(
+            (sourcery.title, sourcery.total_copies, sourcery.available_copies),
+            ("Sourcery", 3, 2),
+        )
+        self.assertEqual(Book.objects.get(isbn="9780060853983").available_copies, 2)
+
+    def test_rejects_invalid_rows(self):
+        header = "title,isbn,category,authors,total_copies\n"
+        rows = [
+            (
+                "Mort,9780062225719,Fantasy,Terry Pratchett,\n",
+                "total_copies is required",
+            ),
+            ("Mort,97800622257190000,Fantasy,,1\n", "not a 10 or 13 character ISBN"),
+            ("Mort,97800622257AB,Fantasy,,1\n", "not a 10 or 13 character ISBN"),
+            ("Mort,9780062225719,Fantasy,,many\n", "must be a whole number"),
+            (f"{'M' * 201},9780062225719,Fantasy,,1\n", "book title"),
+            (f"Mort,9780062225719,{'F' * 101},,1\n", "category name"),
+        ]
+        for row, message in rows:
+            with self.subTest(message=message):
+                with self.assertRaises(CommandError) as raised:
+                    self.import_file("books.csv", header + row)
+                self.assertIn("Item 1: ", str(raised.exception))
+                self.assertIn(message, str(raised.exception))
+        self.assertFalse(Book.objects.exists())
+
+        self.import_file("books.csv", header + "Eric,0-575-04636-8,Fantasy,,1\n")
+        self.assertEqual(Book.objects.get().isbn, "0575046368")
+
+    def test_rejects_malformed_json(self):
+        for content in ("[,,{}]", "[{}, ]", "[{} {}]", "[] []"):
+            with self.subTest(content=content):
+                with self.assertRaises(CommandError):
+                    self.import_file("books.json", content)
+
+    def test_rejects_dangling_fixture_references(self):
+        category = {"model": "library.category", "pk": 1, "fields": {"name": "SF"}}
+        book = {
+            "model": "library.book",
+            "pk": "5f0c5f38-3b1a-4a3b-9a6e-2f0f6d7b1c01",
+            "fields": {
+                "title": "Dune",
+                "isbn": "9780441013593",
+                "category": 2,
+                "total_copies": 1,
+                "available_copies": 1,
+            },
+        }
+        with self.assertRaises(CommandError) as raised:
+            self.import_file("books.json", json.dumps([category, book]))
+        self.assertIn(f"Item 2: book {book['pk']}: category 2", str(raised.exception))
+
+        book["fields"].update(category=1, author=[book["pk"]])
+        with self.assertRaises(CommandError) as raised:
+            self.import_file("books.json", json.dumps([category, book]))
+        self.assertIn("author", str(raised.exception))
+        # Nothing was written, not even the category.
+        self.assertFalse(Category.objects.exists())
+
+
+class LoadToolsTests(TestCase):
+    def seed(self, **counts):
+        options = [
+            f"--{name.replace('_', '-')}={value}" for name, value in counts.items()
+        ]
+        call_command("seed_scale", *options, "--seed=7", stdout=StringIO())
+
+    def test_seed_scale_builds_consistent_catalog(self):
+        self.seed(authors=5, categories=3, books=30, users=8, borrow_records=400)
+
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(BorrowRecord.objects.count(), 400)
+        self.assertFalse(Book.objects.filter(author=None).exists())
+        self.assertEqual(recount_loans(), (0, 0))
+        for book in Book.objects.all():
+            self.assertEqual(
+                book.available_copies, book.total_copies - book.active_loans
+            )
+        borrow_dates = BorrowRecord.objects.dates("borrow_date", "month")
+        self.assertGreater(len(borrow_dates), 1)
+        with self.assertRaises(CommandError):
+            self.seed(books=1)
+
+    def test_benchmark_routes_saves_and_compares_results(self):
+        self.seed(authors=3, categories=2, books=10, users=4, borrow_records=50)
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "routes.json"
+            options = ["--requests=1", "--warmup=0", "--auth-requests=1", "--writes"]
+            call_command(
+                "benchmark_routes", *options, f"--output={output}", stdout=StringIO()
+            )
+            routes = json.loads(output.read_text())["routes"]
+            call_command(
+                "benchmark_routes",
+                *options,
+                f"--compare={output}",
+                "--max-regression=1000",
+                stdout=StringIO(),
+            )
+
+        self.assertIn("GET /api/v1/books/{book_pk}/borrow-records/{pk}/", routes)
+        self.assertIn("GET /api/v1/users/{user_pk}/borrow-records/", routes)
+        self.assertIn("POST /api/v1/auth/jwt/create", routes)
+        for label, result in routes.items():
+            self.assertLess(max(result["status"]), 400, label)
+        self.assertFalse(User.objects.filter(email__startswith="benchmark").exists())
+
+
+@override_settings(LIBRARY_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Safe reads go to the replica; writes and their aftermath do not.
+
+    The replica is a second, separate test database that never receives the
+    primary's rows, so a read served by it visibly comes back empty.
+    """
+
+    client_class = APIClient
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(
+            title="Primary only",
+            isbn="9780000000001",
+            category=Category.objects.create(name="Fiction"),
+            total_copies=2,
+            available_copies=2,
+        )
+        self.member = User.objects.create_user(email="member@example.com")
+        self.member.user_permissions.add(
+            Permission.objects.get(codename="add_borrowrecord")
+        )
+
+    @override_settings(LIBRARY_REPLICA_STICKY_SECONDS=0)
+    def test_reads_use_replica(self):
+        response = self.client.get("/api/v1/books/")
+        self.assertEqual(response.json()["count"], 0)
+        response = self.client.get(f"/api/v1/books/{self.book.pk}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_cache_fill_after_change_uses_primary(self):
+        # The book was just created: the replica may not have it yet, so
+        # the new catalog entry is built from the primary.
+        response = self.client.get("/api/v1/books/")
+        self.assertEqual(response.json()["count"], 1)
+        response = self.client.get(f"/api/v1/books/{self.book.pk}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_and_sticky_window_use_primary(self):
+        self.client.force_authenticate(self.member)
+        response = self.client.post(
+            f"/api/v1/books/{self.book.pk}/borrow-records/borrow/"
+        )
+        self.assertEqual(response.status_code, 201)
+
+        # The borrower reads their own write back from the primary...
+        url = f"/api/v1/users/{self.member.pk}/borrow-records/"
+        self.assertEqual(self.client.get(url).json()["count"], 1)
+
+        # ...while everyone else keeps reading from the replica.
+        other = User.objects.create_user(email="other@example.com")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url).json()["count"], 0)
+
+        with override_settings(LIBRARY_REPLICA_STICKY_SECONDS=0):
+            cache.clear()
+            self.client.force_authenticate(self.member)
+            self.assertEqual(self.client.get(url).json()["count"], 0)
+
+
+class ConcurrentBorrowTests(TransactionTestCase):
+    """Many parallel checkouts of one title must never oversell it."""
+
+    copies = 5
+    borrowers = 20
+
+    def setUp(self):
+        category = Category.objects.create(name="Fiction")
+        self.book = Book.objects.create(
+            title="Popular",
+            isbn="9780000000001",
+            category=category,
+            total_copies=self.copies,
+            available_copies=self.copies,
+        )
+        self.users = [
+            User.objects.create_user(email=f"member{index}@example.com")
+            for index in range(self.borrowers)
+        ]
+
+    def test_no_oversell_under_contention(self):
+        barrier = threading.Barrier(self.borrowers)
+        outcomes = []
+
+        def attempt(user):
+            try:
+                barrier.wait()
+                borrow_book(self.book.pk, user)
+                outcomes.append("borrowed")
+            except BookUnavailable:
+                outcomes.append("unavailable")
+            except OperationalError:
+                # SQLite serialises writers and may time out instead of
+                # waiting; that is a failed checkout, never an oversell.
+                outcomes.append("error")
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=attempt, args=(user,)) for user in self.users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        borrowed = outcomes.count("borrowed")
+        self.book.refresh_from_db()
+        self.assertEqual(len(outcomes), self.borrowers)
+        self.assertLessEqual(borrowed, self.copies)
+        self.assertEqual(self.book.available_copies, self.copies - borrowed)
+        self.assertEqual(BorrowRecord.objects.filter(book=self.book).count(), borrowed)
+        self.assertEqual(
+            (self.book.times_borrowed, self.book.active_loans), (borrowed, borrowed)
+        )
+        if connection.vendor == "postgresql":
+            self.assertEqual(borrowed, self.copies)
+
+    @override_settings(LIBRARY_LOAN_LIMITS={"Member": 3})
+    def test_loan_limit_under_same_user_contention(self):
+        Group.objects.create(name="Member")
+        member = User.objects.create_user(email="limited@example.com")
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Title {index}",
+                isbn=f"97811{index:08d}",
+                category=self.book.category,
+                total_copies=1,
+                available_copies=1,
+            )
+            for index in range(self.borrowers)
+        )
+        barrier = threading.Barrier(self.borrowers)
+        outcomes = []
+
+        def attempt(book):
+            try:
+                barrier.wait()
+                borrow_book(book.pk, member)
+                outcomes.append("borrowed")
+            except LoanLimitExceeded:
+                outcomes.append("limited")
+            except OperationalError:
+                outcomes.append("error")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(book,)) for book in books]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        borrowed = outcomes.count("borrowed")
+        member.refresh_from_db()
+        self.assertLessEqual(borrowed, 3)
+        self.assertEqual(member.active_loans, borrowed)
+        self.assertEqual(BorrowRecord.objects.filter(user=member).count(), borrowed)
+        if connection.vendor == "postgresql":
+            self.assertEqual(borrowed, 3)
+            self.assertEqual(outcomes.count("limited"), self.borrowers - 3)
+
+        # Returning a book frees a slot again.
+        return_book(BorrowRecord.objects.filter(user=member).first())
+        borrow_book(self.book.pk, member)
+
+    def test_return_releases_copy_once(self):
+        record = borrow_book(self.book.pk, self.users[0])
+        return_book(record)
+        with self.assertRaises(AlreadyReturned):
+            return_book(record)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, self.copies)
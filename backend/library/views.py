@@ -1,33 +1,119 @@
+from itertools import batched
+
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
-from rest_framework import viewsets
-from rest_framework.permissions import AllowAny
+from django.db import transaction
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.permissions import DjangoModelPermissions
-from drf_yasg.utils import swagger_auto_schema
-
-from .filters import AuthorFilter, BookFilter, BorrowRecordFilter, CategoryFilter
-from .models import Author, Book, BorrowRecord, Category
-from .paginations import DefaultPagination
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from drf_yasg import openapi
+from drf_yasg.utils import no_body, swagger_auto_schema
+
+from api.querymonitor import QueryBudget
+
+from .cache import RELATED
+from .filters import (
+    AuthorFilter,
+    BookFilter,
+    BorrowRecordFilter,
+    CategoryFilter,
+    StableOrderingFilter,
+)
+from .mixins import (
+    BulkCreateMixin,
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    ExpandMixin,
+    ExportMixin,
+    FastReadMixin,
+    ReplicaReadMixin,
+    SerializerMetricsMixin,
+    SparseFieldsMixin,
+)
+from .models import Author, Book, BorrowRecord, Category, Reservation
+from .paginations import (
+    BorrowRecordKeysetPagination,
+    DefaultPagination,
+    KeysetPagination,
+)
 from .serializers import (
     AuthorSerializer,
+    BookBulkSerializer,
     BookSerializer,
     BorrowRecordSerializer,
+    BorrowSerializer,
     CategorySerializer,
+    ReservationSerializer,
     UserSerializer,
 )
+from .services import (
+    apply_loan_change,
+    borrow_book,
+    bulk_create_authors,
+    bulk_create_categories,
+    bulk_upsert_books,
+    cancel_reservation,
+    delete_loan,
+    OPEN_STATUSES,
+    loan_state,
+    reserve_book,
+    return_book,
+    update_loan,
+    with_queue_position,
+)
 
 User = get_user_model()
 
+# Query budget of filtered list and detail reads.
+READ_BUDGET = QueryBudget(max_queries=12, max_seconds=0.2)
+
+
+def query_parameter(name, description):
+    return openapi.Parameter(
+        name, openapi.IN_QUERY, description=description, type=openapi.TYPE_STRING
+    )
+
 
-class AuthorViewSet(viewsets.ModelViewSet):
+SPARSE_FIELDS = [
+    query_parameter("fields", "Comma-separated fields to return."),
+    query_parameter("omit", "Comma-separated fields to leave out."),
+]
+BOOK_PARAMETERS = [
+    query_parameter("expand", "Comma-separated relations to nest: author, category."),
+    *SPARSE_FIELDS,
+]
+BORROW_RECORD_PARAMETERS = [
+    query_parameter(
+        "expand",
+        "Comma-separated relations to nest: book, book.author, book.category, user.",
+    ),
+    *SPARSE_FIELDS,
+]
+
+
+class AuthorViewSet(
+    SerializerMetricsMixin,
+    ReplicaReadMixin,
+    BulkCreateMixin,
+    ConditionalGetMixin,
+    viewsets.ModelViewSet,
+):
     """Manage authors (list, retrieve, create, update, delete)."""
 
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
+    bulk_serializer_class = AuthorSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = AuthorFilter
     pagination_class = DefaultPagination
     permission_classes = [DjangoModelPermissions]
+    async_reads = True
+    version_scopes = [RELATED]
 
     @swagger_auto_schema(operation_summary="List authors")
     def list(self, request, *args, **kwargs):
@@ -78,16 +164,28 @@ class AuthorViewSet(viewsets.ModelViewSet):
         """Delete an author."""
         return super().destroy(request, *args, **kwargs)
 
+    def perform_bulk_create(self, rows):
+        return bulk_create_authors(rows)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+
+class CategoryViewSet(
+    SerializerMetricsMixin,
+    ReplicaReadMixin,
+    BulkCreateMixin,
+    ConditionalGetMixin,
+    viewsets.ModelViewSet,
+):
     """Manage categories (list, retrieve, create, update, delete)."""
 
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    bulk_serializer_class = CategorySerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = CategoryFilter
     pagination_class = DefaultPagination
     permission_classes = [DjangoModelPermissions]
+    async_reads = True
+    version_scopes = [RELATED]
 
     @swagger_auto_schema(operation_summary="List categories")
     def list(self, request, *args, **kwargs):
@@ -138,15 +236,66 @@ class CategoryViewSet(viewsets.ModelViewSet):
         """Delete a category."""
         return super().destroy(request, *args, **kwargs)
 
+    def perform_bulk_create(self, rows):
+        return bulk_create_categories(rows)
+
+
+class BookViewSet(
+    SerializerMetricsMixin,
+    ReplicaReadMixin,
+    BulkCreateMixin,
+    CachedResponseMixin,
+    SparseFieldsMixin,
+    ExpandMixin,
+    ConditionalGetMixin,
+    FastReadMixin,
+    ExportMixin,
+    viewsets.ModelViewSet,
+):
+    """Manage books (public list/retrieve; create/update/delete for permitted users).
+
+    Public list/retrieve responses are served from the catalog cache.
+    """
 
-class BookViewSet(viewsets.ModelViewSet):
-    """Manage books (public list/retrieve; create/update/delete for permitted users)."""
-
-    queryset = Book.objects.select_related("category").prefetch_related("author")
+    queryset = Book.objects.all()
     serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend]
+    bulk_serializer_class = BookBulkSerializer
+    filter_backends = [DjangoFilterBackend, StableOrderingFilter]
     filterset_class = BookFilter
+    ordering_fields = ["times_borrowed", "active_loans", "created_at"]
     pagination_class = DefaultPagination
+    keyset_pagination_class = KeysetPagination
+    cache_namespace = "books"
+    fast_read = True
+    async_reads = True
+    # Catalog filters should stay index-backed; flag them once they are not.
+    # Writes get the project defaults; bulk and export scale with their input.
+    query_budgets = {
+        "list": READ_BUDGET,
+        "retrieve": READ_BUDGET,
+        "bulk": None,
+        "export": None,
+    }
+    export_fields = (
+        "id",
+        "title",
+        "isbn",
+        "category",
+        "author",
+        "total_copies",
+        "available_copies",
+        "created_at",
+        "updated_at",
+    )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.wants_field("author") and "author" not in self.get_expand():
+            # Ordered like the id lists of the fast read path.
+            queryset = queryset.prefetch_related(
+                Prefetch("author", queryset=Author.objects.only("id").order_by("pk"))
+            )
+        return self.expand_queryset(self.sparse_queryset(queryset))
 
     def get_permissions(self):
         if self.action in {"list", "retrieve"}:
@@ -155,12 +304,16 @@ class BookViewSet(viewsets.ModelViewSet):
             permission_classes = [DjangoModelPermissions]
         return [permission() for permission in permission_classes]
 
-    @swagger_auto_schema(operation_summary="List books")
+    @swagger_auto_schema(
+        operation_summary="List books", manual_parameters=BOOK_PARAMETERS
+    )
     def list(self, request, *args, **kwargs):
         """Retrieve all books."""
         return super().list(request, *args, **kwargs)
 
-    @swagger_auto_schema(operation_summary="Retrieve a book")
+    @swagger_auto_schema(
+        operation_summary="Retrieve a book", manual_parameters=BOOK_PARAMETERS
+    )
     def retrieve(self, request, *args, **kwargs):
         """Retrieve a single book by ID."""
         return super().retrieve(request, *args, **kwargs)
@@ -204,8 +357,50 @@ class BookViewSet(viewsets.ModelViewSet):
         """Delete a book."""
         return super().destroy(request, *args, **kwargs)
 
-
-class BorrowRecordViewSet(viewsets.ModelViewSet):
+    def check_bulk_permissions(self, request, items):
+        # Upserts on an existing ISBN are updates.
+        isbns = {
+            item["isbn"]
+            for item in items
+            if isinstance(item, dict) and isinstance(item.get("isbn"), str)
+        }
+        if (
+            not request.user.has_perm("library.change_book")
+            and Book.objects.filter(isbn__in=isbns).exists()
+        ):
+            raise PermissionDenied()
+
+    def perform_bulk_create(self, rows):
+        return bulk_upsert_books(rows)
+
+    def get_export_rows(self, queryset, fields=None):
+        # Author ids are gathered per chunk with one grouped query instead of
+        # joining the M2M table, which would repeat each book per author.
+        fields = fields or self.export_fields
+        position = fields.index("author")
+        fields = [field for field in fields if field != "author"]
+        rows = super().get_export_rows(queryset.select_related(None), fields)
+        through = Book.author.through
+        for chunk in batched(rows, self.export_chunk_size):
+            authors = {}
+            for book_id, author_id in through.objects.filter(
+                book_id__in=[row[0] for row in chunk]
+            ).values_list("book_id", "author_id"):
+                authors.setdefault(book_id, []).append(author_id)
+            for row in chunk:
+                yield row[:position] + (authors.get(row[0], []),) + row[position:]
+
+
+class BorrowRecordViewSet(
+    SerializerMetricsMixin,
+    ReplicaReadMixin,
+    SparseFieldsMixin,
+    ExpandMixin,
+    ConditionalGetMixin,
+    FastReadMixin,
+    ExportMixin,
+    viewsets.ModelViewSet,
+):
     """Manage borrow records (list, retrieve, create, update, delete).
 
     Supports nested routes by book and by user for filtered access.
@@ -215,14 +410,33 @@ class BorrowRecordViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = BorrowRecordFilter
     pagination_class = DefaultPagination
+    keyset_pagination_class = BorrowRecordKeysetPagination
     permission_classes = [DjangoModelPermissions]
+    fast_read = True
+    query_budgets = {"list": READ_BUDGET, "retrieve": READ_BUDGET, "export": None}
+    export_fields = (
+        "id",
+        "book",
+        "user",
+        "borrow_date",
+        "due_date",
+        "return_date",
+        "status",
+        "updated_at",
+    )
 
-    @swagger_auto_schema(operation_summary="List borrow records")
+    @swagger_auto_schema(
+        operation_summary="List borrow records",
+        manual_parameters=BORROW_RECORD_PARAMETERS,
+    )
     def list(self, request, *args, **kwargs):
         """Retrieve all borrow records."""
         return super().list(request, *args, **kwargs)
 
-    @swagger_auto_schema(operation_summary="Retrieve a borrow record")
+    @swagger_auto_schema(
+        operation_summary="Retrieve a borrow record",
+        manual_parameters=BORROW_RECORD_PARAMETERS,
+    )
     def retrieve(self, request, *args, **kwargs):
         """Retrieve a single borrow record by ID."""
         return super().retrieve(request, *args, **kwargs)
@@ -239,9 +453,17 @@ class BorrowRecordViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         operation_summary="Update a borrow record",
-        operation_description="Only users with borrow record change permission can update.",
+        operation_description=(
+            "Only users with borrow record change permission can update. "
+            "Closing an open loan puts the copy back on the shelf; reopening a "
+            "closed one takes a copy. Open loans cannot move to another book."
+        ),
         request_body=BorrowRecordSerializer,
-        responses={200: BorrowRecordSerializer, 400: "Bad Request"},
+        responses={
+            200: BorrowRecordSerializer,
+            400: "Bad Request",
+            409: "No copies available",
+        },
     )
     def update(self, request, *args, **kwargs):
         """Update a borrow record."""
@@ -249,9 +471,17 @@ class BorrowRecordViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         operation_summary="Partially update a borrow record",
-        operation_description="Only users with borrow record change permission can update.",
+        operation_description=(
+            "Only users with borrow record change permission can update. "
+            "Closing an open loan puts the copy back on the shelf; reopening a "
+            "closed one takes a copy. Open loans cannot move to another book."
+        ),
         request_body=BorrowRecordSerializer,
-        responses={200: BorrowRecordSerializer, 400: "Bad Request"},
+        responses={
+            200: BorrowRecordSerializer,
+            400: "Bad Request",
+            409: "No copies available",
+        },
     )
     def partial_update(self, request, *args, **kwargs):
         """Partially update a borrow record."""
@@ -259,15 +489,108 @@ class BorrowRecordViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         operation_summary="Delete a borrow record",
-        operation_description="Only users with borrow record delete permission can delete.",
+        operation_description=(
+            "Only users with borrow record delete permission can delete. "
+            "Deleting an open loan puts the copy back on the shelf."
+        ),
         responses={204: "No Content"},
     )
     def destroy(self, request, *args, **kwargs):
         """Delete a borrow record."""
         return super().destroy(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        operation_summary="Borrow a book",
+        operation_description=(
+            "Checks out one copy for the current user and decrements the "
+            "book's available copies atomically. On the nested book route the "
+            "book is taken from the URL. On the nested user route the copy is "
+            "borrowed for that user, which for anyone else requires the borrow "
+            "record change permission. Fails with 409 once the member holds "
+            "as many open loans as their group allows."
+        ),
+        request_body=BorrowSerializer,
+        responses={
+            201: BorrowRecordSerializer,
+            400: "Bad Request",
+            403: "Borrowing for another user",
+            409: "No copies available or loan limit reached",
+        },
+    )
+    @action(detail=False, methods=["post"])
+    def borrow(self, request, *args, **kwargs):
+        """Borrow a copy of a book."""
+        serializer = BorrowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        book_id = self.kwargs.get("book_pk") or serializer.validated_data.get("book")
+        if not book_id:
+            raise ValidationError({"book": ["This field is required."]})
+
+        borrower = request.user
+        user_pk = self.kwargs.get("user_pk")
+        if user_pk:
+            borrower = get_object_or_404(User, pk=user_pk)
+            if borrower.pk != request.user.pk and not request.user.has_perm(
+                "library.change_borrowrecord"
+            ):
+                raise PermissionDenied()
+
+        record = borrow_book(
+            book_id, borrower, serializer.validated_data.get("due_date")
+        )
+        return Response(
+            BorrowRecordSerializer(record).data, status=status.HTTP_201_CREATED
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Return a borrowed book",
+        operation_description="Marks the loan returned and releases the copy.",
+        request_body=no_body,
+        responses={200: BorrowRecordSerializer, 409: "Already returned"},
+    )
+    @action(detail=True, methods=["post"], url_path="return", url_name="return")
+    def return_record(self, request, *args, **kwargs):
+        """Return a borrowed book."""
+        record = return_book(self.get_object())
+        return Response(BorrowRecordSerializer(record).data)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        data = dict(serializer.validated_data)
+        if data.get("status", BorrowRecord.ACTIVE) not in OPEN_STATUSES:
+            apply_loan_change(after=loan_state(serializer.save()))
+            return
+        # An open loan takes a copy off the shelf, like any other checkout.
+        record = borrow_book(
+            data.pop("book").pk, data.pop("user"), data.pop("due_date")
+        )
+        if data:
+            BorrowRecord.objects.filter(pk=record.pk).update(**data)
+            record.refresh_from_db()
+        serializer.instance = record
+
+    def perform_update(self, serializer):
+        record, changes = serializer.instance, dict(serializer.validated_data)
+        book = changes.get("book")
+        is_open = changes.get("status", record.status) in OPEN_STATUSES
+        if book is not None and book.pk != record.book_id:
+            if is_open or record.status in OPEN_STATUSES:
+                raise ValidationError(
+                    {
+                        "book": [
+                            "An open loan cannot move to another book; return "
+                            "it and borrow the other book instead."
+                        ]
+                    }
+                )
+        update_loan(record, changes)
+
+    def perform_destroy(self, instance):
+        delete_loan(instance)
+
     def get_queryset(self):
-        queryset = BorrowRecord.objects.select_related("book", "user")
+        queryset = BorrowRecord.objects.all()
 
         book_pk = self.kwargs.get("book_pk")
         if book_pk:
@@ -277,10 +600,90 @@ class BorrowRecordViewSet(viewsets.ModelViewSet):
         if user_pk:
             queryset = queryset.filter(user_id=user_pk)
 
-        return queryset
+        return self.expand_queryset(self.sparse_queryset(queryset))
+
+
+class ReservationViewSet(
+    SerializerMetricsMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet
+):
+    """The hold queue of a book, oldest first.
+
+    Members join the queue while no copies are on the shelf; a returned copy
+    is set aside for the head of the queue.
+    """
+
+    serializer_class = ReservationSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["status"]
+    pagination_class = DefaultPagination
+    permission_classes = [DjangoModelPermissions]
 
+    def get_queryset(self):
+        queryset = Reservation.objects.filter(book_id=self.kwargs.get("book_pk"))
+        return with_queue_position(queryset)
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+    def get_permissions(self):
+        if self.action == "cancel":
+            # Ownership is checked in the action itself.
+            permission_classes = [IsAuthenticated]
+        else:
+            permission_classes = [DjangoModelPermissions]
+        return [permission() for permission in permission_classes]
+
+    @swagger_auto_schema(operation_summary="List reservations of a book")
+    def list(self, request, *args, **kwargs):
+        """Retrieve the hold queue of a book."""
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_summary="Retrieve a reservation")
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a single reservation with its queue position."""
+        return super().retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Reserve a book",
+        operation_description=(
+            "Joins the hold queue for the current user. Only possible while no "
+            "copies are available."
+        ),
+        request_body=no_body,
+        responses={
+            201: ReservationSerializer,
+            409: "Copies available or already reserved",
+        },
+    )
+    def create(self, request, *args, **kwargs):
+        """Reserve a book for the current user."""
+        reservation = reserve_book(self.kwargs["book_pk"], request.user)
+        reservation = self.get_queryset().get(pk=reservation.pk)
+        return Response(
+            self.get_serializer(reservation).data, status=status.HTTP_201_CREATED
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Cancel a reservation",
+        operation_description=(
+            "Members can cancel their own reservations; cancelling others "
+            "requires the reservation change permission."
+        ),
+        request_body=no_body,
+        responses={200: ReservationSerializer, 409: "Reservation not open"},
+    )
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, *args, **kwargs):
+        """Cancel a reservation."""
+        reservation = self.get_object()
+        if reservation.user_id != request.user.pk and not request.user.has_perm(
+            "library.change_reservation"
+        ):
+            raise PermissionDenied()
+        cancel_reservation(reservation)
+        return Response(self.get_serializer(self.get_object()).data)
+
+
+class UserViewSet(
+    SerializerMetricsMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet
+):
     """Read-only access to users for administrative views."""
     serializer_class = UserSerializer
     pagination_class = DefaultPagination
@@ -1,12 +1,16 @@
 #!/usr/bin/env python
 """Django's command-line utility for administrative tasks."""
+
 import os
 import sys
 
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    os.environ.setdefault(
+        "DJANGO_SETTINGS_MODULE",
+        "config.test_settings" if sys.argv[1:2] == ["test"] else "config.settings",
+    )
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,58 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.rollups import first_day, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the daily circulation rollups behind /reports/. By default "
+        "only the days since the last run are rolled up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="First day to roll up (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--end",
+            type=date.fromisoformat,
+            help="Last day to roll up (YYYY-MM-DD); defaults to today.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Roll up everything since the first borrow record.",
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=31,
+            help="Number of days replaced per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+        started = time.monotonic()
+
+        def report(day, total):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  rolled up to {day} ({total} days)")
+
+        start = first_day() if options["full"] else options["start"]
+        total = rebuild_rollups(
+            start=start,
+            end=options["end"],
+            chunk_days=options["chunk_days"],
+            on_chunk=report,
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Rolled up {total} days in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,105 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("library", "0008_borrow_date_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyCirculation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("loans", models.PositiveIntegerField(default=0)),
+                ("returns", models.PositiveIntegerField(default=0)),
+                ("late_returns", models.PositiveIntegerField(default=0)),
+                ("open_loans", models.PositiveIntegerField(default=0)),
+                ("overdue_loans", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["day"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyAuthorCirculation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("loans", models.PositiveIntegerField(default=0)),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_circulation",
+                        to="library.author",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["day", "author"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "author"), name="author_circulation_day_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyCategoryCirculation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("loans", models.PositiveIntegerField(default=0)),
+                ("returns", models.PositiveIntegerField(default=0)),
+                ("late_returns", models.PositiveIntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_circulation",
+                        to="library.category",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["day", "category"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "category"), name="category_circulation_day_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
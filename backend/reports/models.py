@@ -0,0 +1,65 @@
+from django.db import models
+
+from library.models import Author, Category
+
+
+class DailyCirculation(models.Model):
+    """Library-wide loan activity for one day.
+
+    ``open_loans`` and ``overdue_loans`` are a snapshot at the end of the day.
+    """
+
+    day = models.DateField(unique=True)
+    loans = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    late_returns = models.PositiveIntegerField(default=0)
+    open_loans = models.PositiveIntegerField(default=0)
+    overdue_loans = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["day"]
+
+    def __str__(self):
+        return str(self.day)
+
+
+class DailyCategoryCirculation(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="daily_circulation"
+    )
+    loans = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    late_returns = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["day", "category"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "category"], name="category_circulation_day_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}"
+
+
+class DailyAuthorCirculation(models.Model):
+    """Loans per author and day; a book with several authors counts for each."""
+
+    day = models.DateField()
+    author = models.ForeignKey(
+        Author, on_delete=models.CASCADE, related_name="daily_circulation"
+    )
+    loans = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["day", "author"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "author"], name="author_circulation_day_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.author_id}"
@@ -0,0 +1,179 @@
+"""Incremental daily rollups of borrow records for the report endpoints.
+
+Loans are attributed to the day they were borrowed and returns to the day
+they came back, in the current time zone. Rolling up a range replaces the
+rows for those days, so re-running it is always safe.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from library.models import BorrowRecord
+
+from .models import DailyAuthorCirculation, DailyCategoryCirculation, DailyCirculation
+
+
+def start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def days_between(start, end):
+    for offset in range((end - start).days + 1):
+        yield start + timedelta(days=offset)
+
+
+def first_day():
+    """Return the day of the oldest borrow record, or today."""
+    first = BorrowRecord.objects.aggregate(at=Min("borrow_date"))["at"]
+    return timezone.localtime(first).date() if first else timezone.localdate()
+
+
+def default_start():
+    """Return the first day that still needs rolling up.
+
+    The last rolled-up day is redone because it may have been rolled up
+    before it was over.
+    """
+    latest = DailyCirculation.objects.aggregate(day=Max("day"))["day"]
+    return latest if latest is not None else first_day()
+
+
+def _count_by_day(queryset, date_field, *fields, **counts):
+    return (
+        queryset.annotate(day=TruncDate(date_field))
+        .values("day", *fields)
+        .order_by()
+        .annotate(**counts)
+    )
+
+
+def _snapshots(start, end):
+    """Return ``{day: (open_loans, overdue_loans)}`` at the end of each day.
+
+    A loan is open at the end of every day from the one it was borrowed on
+    up to the day before it came back, and overdue on those of them after
+    its due date. So one grouped query over the loans overlapping the range
+    gives where each count goes up and down, and a running sum the rest.
+    """
+    since, until = start_of(start), start_of(end + timedelta(days=1))
+    rows = (
+        BorrowRecord.objects.filter(
+            Q(return_date__isnull=True) | Q(return_date__gte=since),
+            borrow_date__lt=until,
+        )
+        .annotate(borrowed=TruncDate("borrow_date"), returned=TruncDate("return_date"))
+        .values("borrowed", "returned", "due_date")
+        .order_by()
+        .annotate(count=Count("pk"))
+    )
+    after = end + timedelta(days=1)
+    open_changes, overdue_changes = defaultdict(int), defaultdict(int)
+    for row in rows:
+        first = max(row["borrowed"], start)
+        closed = min(row["returned"] or after, after)
+        overdue = max(row["due_date"] + timedelta(days=1), first)
+        for changes, opened in ((open_changes, first), (overdue_changes, overdue)):
+            if opened < closed:
+                changes[opened] += row["count"]
+                changes[closed] -= row["count"]
+
+    snapshots, open_loans, overdue_loans = {}, 0, 0
+    for day in days_between(start, end):
+        open_loans += open_changes[day]
+        overdue_loans += overdue_changes[day]
+        snapshots[day] = open_loans, overdue_loans
+    return snapshots
+
+
+def rollup_range(start, end):
+    """Recompute the rollups of the days from ``start`` to ``end`` inclusive."""
+    since, until = start_of(start), start_of(end + timedelta(days=1))
+    borrowed = BorrowRecord.objects.filter(
+        borrow_date__gte=since, borrow_date__lt=until
+    )
+    returned = BorrowRecord.objects.filter(
+        return_date__gte=since, return_date__lt=until
+    )
+    late = Q(return_date__date__gt=F("due_date"))
+
+    per_category = defaultdict(lambda: {"loans": 0, "returns": 0, "late_returns": 0})
+    for row in _count_by_day(
+        borrowed, "borrow_date", "book__category", loans=Count("pk")
+    ):
+        per_category[row["day"], row["book__category"]]["loans"] = row["loans"]
+    for row in _count_by_day(
+        returned,
+        "return_date",
+        "book__category",
+        returns=Count("pk"),
+        late_returns=Count("pk", filter=late),
+    ):
+        counts = per_category[row["day"], row["book__category"]]
+        counts["returns"] = row["returns"]
+        counts["late_returns"] = row["late_returns"]
+
+    per_author = _count_by_day(
+        borrowed.filter(book__author__isnull=False),
+        "borrow_date",
+        "book__author",
+        loans=Count("pk"),
+    )
+
+    totals = defaultdict(lambda: {"loans": 0, "returns": 0, "late_returns": 0})
+    for (day, _), counts in per_category.items():
+        for name, value in counts.items():
+            totals[day][name] += value
+
+    # Loans still out when each day ended, and those already past due.
+    daily = [
+        DailyCirculation(
+            day=day, **totals[day], open_loans=open_loans, overdue_loans=overdue_loans
+        )
+        for day, (open_loans, overdue_loans) in _snapshots(start, end).items()
+    ]
+
+    with transaction.atomic():
+        for model in (
+            DailyCirculation,
+            DailyCategoryCirculation,
+            DailyAuthorCirculation,
+        ):
+            model.objects.filter(day__range=(start, end)).delete()
+        DailyCirculation.objects.bulk_create(daily)
+        DailyCategoryCirculation.objects.bulk_create(
+            DailyCategoryCirculation(day=day, category_id=category_id, **counts)
+            for (day, category_id), counts in per_category.items()
+        )
+        DailyAuthorCirculation.objects.bulk_create(
+            DailyAuthorCirculation(
+                day=row["day"], author_id=row["book__author"], loans=row["loans"]
+            )
+            for row in per_author
+        )
+    return len(daily)
+
+
+def rebuild_rollups(start=None, end=None, chunk_days=31, on_chunk=None):
+    """Roll up every day from ``start`` to ``end`` in chunks of ``chunk_days``.
+
+    ``start`` defaults to :func:`default_start` and ``end`` to today. Each
+    chunk is replaced in its own short transaction. Returns the number of
+    days rolled up.
+    """
+    if chunk_days < 1:
+        raise ValueError("chunk_days must be at least 1.")
+    start = start or default_start()
+    end = end or timezone.localdate()
+    total = 0
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        total += rollup_range(start, chunk_end)
+        if on_chunk is not None:
+            on_chunk(chunk_end, total)
+        start = chunk_end + timedelta(days=1)
+    return total
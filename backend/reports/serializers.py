@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import DailyCirculation
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    default_days = 30
+
+    def validate(self, attrs):
+        attrs.setdefault("end", timezone.localdate())
+        attrs.setdefault("start", attrs["end"] - timedelta(days=self.default_days - 1))
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError({"start": ["Must not be after end."]})
+        return attrs
+
+
+class CategoryReportQuerySerializer(ReportQuerySerializer):
+    period = serializers.ChoiceField(choices=["day", "month"], default="month")
+
+
+class TopAuthorsQuerySerializer(ReportQuerySerializer):
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class DailyCirculationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyCirculation
+        exclude = ["id"]
+
+
+class CategoryCirculationSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    category = serializers.IntegerField()
+    category_name = serializers.CharField()
+    loans = serializers.IntegerField()
+    returns = serializers.IntegerField()
+    late_returns = serializers.IntegerField()
+
+
+class AuthorCirculationSerializer(serializers.Serializer):
+    author = serializers.UUIDField()
+    author_name = serializers.CharField()
+    loans = serializers.IntegerField()
+
+
+class OverdueRateSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    returns = serializers.IntegerField()
+    late_returns = serializers.IntegerField()
+    late_return_rate = serializers.FloatField(allow_null=True)
+    open_loans = serializers.IntegerField()
+    overdue_loans = serializers.IntegerField()
+    overdue_rate = serializers.FloatField(allow_null=True)
@@ -0,0 +1,159 @@
+from datetime import date, datetime, time, timedelta, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from library.models import Author, Book, BorrowRecord, Category
+
+from .models import DailyCirculation
+from .rollups import rebuild_rollups
+
+User = get_user_model()
+
+
+def at(day, hour=12):
+    return datetime.combine(day, time(hour), tzinfo=timezone.utc)
+
+
+class RollupReportTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="librarian@example.com")
+        cls.user.user_permissions.add(
+            Permission.objects.get(codename="view_dailycirculation")
+        )
+        fiction = Category.objects.create(name="Fiction")
+        poetry = Category.objects.create(name="Poetry")
+        cls.first, second = Author.objects.bulk_create(
+            [Author(name="First"), Author(name="Second")]
+        )
+        books = []
+        for index, category in enumerate([fiction, poetry]):
+            book = Book.objects.create(
+                title=f"Book {index}",
+                isbn=f"{index:013d}",
+                category=category,
+                total_copies=1,
+                available_copies=0,
+            )
+            book.author.set([cls.first, second][: 2 - index])
+            books.append(book)
+
+        # Both borrowed on the 1st and due on the 2nd; one comes back late
+        # on the 3rd, the other is still out.
+        for book in books:
+            BorrowRecord.objects.create(
+                book=book, user=cls.user, due_date=date(2026, 3, 2)
+            )
+        BorrowRecord.objects.update(borrow_date=at(date(2026, 3, 1)))
+        BorrowRecord.objects.filter(book=books[0]).update(
+            status=BorrowRecord.RETURNED, return_date=at(date(2026, 3, 3))
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        rebuild_rollups(date(2026, 3, 1), date(2026, 3, 3), chunk_days=2)
+
+    def get(self, report):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f"/api/v1/reports/{report}/?start=2026-03-01&end=2026-03-03"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            any("borrowrecord" in query["sql"] for query in queries.captured_queries)
+        )
+        return response.json()
+
+    def test_rollups_are_idempotent(self):
+        rebuild_rollups(date(2026, 3, 3), date(2026, 3, 3))
+        days = DailyCirculation.objects.values_list(
+            "day", "loans", "returns", "late_returns", "open_loans", "overdue_loans"
+        )
+        self.assertEqual(
+            list(days),
+            [
+                (date(2026, 3, 1), 2, 0, 0, 2, 0),
+                (date(2026, 3, 2), 0, 0, 0, 2, 0),
+                (date(2026, 3, 3), 0, 1, 1, 1, 1),
+            ],
+        )
+
+    def test_rejects_empty_chunks(self):
+        with self.assertRaises(CommandError):
+            call_command("rebuild_rollups", "--chunk-days=0", stdout=StringIO())
+        with self.assertRaises(ValueError):
+            rebuild_rollups(chunk_days=-1)
+
+    def test_snapshots_match_end_of_day_counts(self):
+        book = Book.objects.first()
+        start = date(2026, 3, 1)
+        # Borrowed from a week before the range to its end, due after 0-4
+        # days, back after 0-9 days (or still out), in a fixed mix.
+        for index in range(60):
+            borrowed = start + timedelta(days=index % 27 - 7)
+            returned = index % 11 != 0 and at(borrowed + timedelta(days=index % 10))
+            record = BorrowRecord.objects.create(
+                book=book, user=self.user, due_date=borrowed + timedelta(days=index % 5)
+            )
+            BorrowRecord.objects.filter(pk=record.pk).update(
+                borrow_date=at(borrowed, hour=index % 24),
+                return_date=returned or None,
+            )
+
+        with CaptureQueriesContext(connection) as short:
+            rebuild_rollups(start, start + timedelta(days=1))
+        with CaptureQueriesContext(connection) as long:
+            rebuild_rollups(start, start + timedelta(days=19))
+        self.assertEqual(len(short), len(long))
+
+        for row in DailyCirculation.objects.all():
+            end_of_day = at(row.day + timedelta(days=1), hour=0)
+            out = BorrowRecord.objects.filter(
+                Q(return_date__isnull=True) | Q(return_date__gte=end_of_day),
+                borrow_date__lt=end_of_day,
+            )
+            with self.subTest(day=row.day):
+                self.assertEqual(row.open_loans, out.count())
+                self.assertEqual(
+                    row.overdue_loans, out.filter(due_date__lt=row.day).count()
+                )
+
+    def test_reports_read_rollups_only(self):
+        self.assertEqual(len(self.get("circulation")), 3)
+        categories = self.get("loans-by-category")
+        self.assertEqual(
+            [(row["category_name"], row["loans"]) for row in categories],
+            [("Fiction", 1), ("Poetry", 1)],
+        )
+        self.assertEqual(categories[0]["period"], "2026-03-01")
+
+        authors = self.get("top-authors")
+        self.assertEqual(
+            authors[0],
+            {"author": str(self.first.pk), "author_name": "First", "loans": 2},
+        )
+
+        overdue = self.get("overdue-rate")
+        self.assertEqual(overdue["late_return_rate"], 1.0)
+        self.assertEqual(overdue["overdue_rate"], 1.0)
+
+    def test_validates_access_and_range(self):
+        response = self.client.get(
+            "/api/v1/reports/top-authors/?start=2026-03-02&end=2026-03-01"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        member = User.objects.create_user(email="member@example.com")
+        self.client.force_authenticate(member)
+        response = self.client.get("/api/v1/reports/circulation/")
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,141 @@
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from .models import DailyAuthorCirculation, DailyCategoryCirculation, DailyCirculation
+from .serializers import (
+    AuthorCirculationSerializer,
+    CategoryCirculationSerializer,
+    CategoryReportQuerySerializer,
+    DailyCirculationSerializer,
+    OverdueRateSerializer,
+    ReportQuerySerializer,
+    TopAuthorsQuerySerializer,
+)
+
+
+class CanViewReports(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.has_perm("reports.view_dailycirculation")
+
+
+def rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+class ReportViewSet(viewsets.ViewSet):
+    """Circulation reports served from the daily rollup tables.
+
+    Every report takes an optional ``start``/``end`` date range (the last 30
+    days by default). The rollups are refreshed by ``manage.py
+    rebuild_rollups``; today's figures are only as fresh as its last run.
+    """
+
+    permission_classes = [CanViewReports]
+
+    def get_params(self, serializer_class=ReportQuerySerializer):
+        serializer = serializer_class(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @swagger_auto_schema(operation_summary="List available reports")
+    def list(self, request, *args, **kwargs):
+        """Link to every report."""
+        names = ["circulation", "loans-by-category", "top-authors", "overdue-rate"]
+        return Response(
+            {
+                name: reverse(
+                    f"report-{name}", request=request, format=kwargs.get("format")
+                )
+                for name in names
+            }
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Daily circulation",
+        query_serializer=ReportQuerySerializer,
+        responses={200: DailyCirculationSerializer(many=True)},
+    )
+    @action(detail=False)
+    def circulation(self, request, *args, **kwargs):
+        """Loans, returns and open loans for every day in the range."""
+        params = self.get_params()
+        days = DailyCirculation.objects.filter(
+            day__range=(params["start"], params["end"])
+        )
+        return Response(DailyCirculationSerializer(days, many=True).data)
+
+    @swagger_auto_schema(
+        operation_summary="Loans per category",
+        query_serializer=CategoryReportQuerySerializer,
+        responses={200: CategoryCirculationSerializer(many=True)},
+    )
+    @action(detail=False, url_path="loans-by-category")
+    def loans_by_category(self, request, *args, **kwargs):
+        """Loans and returns per category, by day or by month."""
+        params = self.get_params(CategoryReportQuerySerializer)
+        period = TruncMonth("day") if params["period"] == "month" else F("day")
+        rows = (
+            DailyCategoryCirculation.objects.filter(
+                day__range=(params["start"], params["end"])
+            )
+            .values("category", period=period, category_name=F("category__name"))
+            .annotate(
+                loans=Sum("loans"),
+                returns=Sum("returns"),
+                late_returns=Sum("late_returns"),
+            )
+            .order_by("period", "category")
+        )
+        return Response(CategoryCirculationSerializer(rows, many=True).data)
+
+    @swagger_auto_schema(
+        operation_summary="Most borrowed authors",
+        query_serializer=TopAuthorsQuerySerializer,
+        responses={200: AuthorCirculationSerializer(many=True)},
+    )
+    @action(detail=False, url_path="top-authors")
+    def top_authors(self, request, *args, **kwargs):
+        """Authors ranked by loans of their books in the range."""
+        params = self.get_params(TopAuthorsQuerySerializer)
+        rows = (
+            DailyAuthorCirculation.objects.filter(
+                day__range=(params["start"], params["end"])
+            )
+            .values("author", author_name=F("author__name"))
+            .annotate(loans=Sum("loans"))
+            .order_by("-loans", "author_name")[: params["limit"]]
+        )
+        return Response(AuthorCirculationSerializer(rows, many=True).data)
+
+    @swagger_auto_schema(
+        operation_summary="Overdue rate",
+        query_serializer=ReportQuerySerializer,
+        responses={200: OverdueRateSerializer},
+    )
+    @action(detail=False, url_path="overdue-rate")
+    def overdue_rate(self, request, *args, **kwargs):
+        """Share of returns that came back late, and of loans out past due."""
+        params = self.get_params()
+        days = DailyCirculation.objects.filter(
+            day__range=(params["start"], params["end"])
+        )
+        totals = days.aggregate(
+            returns=Coalesce(Sum("returns"), 0),
+            late_returns=Coalesce(Sum("late_returns"), 0),
+        )
+        last = days.order_by("-day").values("open_loans", "overdue_loans").first()
+        last = last or {"open_loans": 0, "overdue_loans": 0}
+        data = {
+            **params,
+            **totals,
+            "late_return_rate": rate(totals["late_returns"], totals["returns"]),
+            **last,
+            "overdue_rate": rate(last["overdue_loans"], last["open_loans"]),
+        }
+        return Response(OverdueRateSerializer(data).data)